@@ -0,0 +1,18 @@
+from django.apps import AppConfig
+from django.db.models.signals import post_delete, post_save
+
+
+class ApiConfig(AppConfig):
+    name = 'api'
+
+    def ready(self):
+        from .dataset import dataset_version
+        from .models import Herb
+        from .suggest import herb_deleted, herb_saved
+
+        # 通过Django修改中药数据后，搜索索引在下一次查询时重建
+        post_save.connect(dataset_version.bump, sender=Herb, dispatch_uid='herb_dataset_saved')
+        post_delete.connect(dataset_version.bump, sender=Herb, dispatch_uid='herb_dataset_deleted')
+        # 搜索建议索引增删单条记录（必须在 bump 之后连接：两者都在事务提交后按连接顺序执行）
+        post_save.connect(herb_saved, sender=Herb, dispatch_uid='herb_suggest_saved')
+        post_delete.connect(herb_deleted, sender=Herb, dispatch_uid='herb_suggest_deleted')
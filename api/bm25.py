@@ -0,0 +1,208 @@
+import re
+import math
+import heapq
+import logging
+from array import array
+from collections import defaultdict
+from operator import itemgetter
+
+from .dataset import DatasetIndex
+from .models import Herb
+
+logger = logging.getLogger(__name__)
+
+# 参与全文检索的字段及权重
+FIELD_BOOSTS = {
+    'name': 5.0,
+    'alias': 3.0,
+    'effect_class': 2.0,
+    'effect': 2.0,
+    'indication': 1.5,
+    'taste': 1.0,
+    'meridian': 1.0,
+    'pharmacology': 0.5,
+}
+FIELDS = tuple(FIELD_BOOSTS)
+
+# 单字查询使用的单字倒排表的得分权重（多词查询中单字的匹配不如两字词可靠）
+UNIGRAM_WEIGHT = 0.5
+
+# 连续的汉字，或连续的字母数字
+_TOKEN_PATTERN = re.compile(r'[一-鿿]+|[a-z0-9]+')
+_HAN_PATTERN = re.compile(r'[一-鿿]')
+
+
+def tokenize(text):
+    """
+    中文按相邻两字切分（单个汉字保留为一个词），字母数字按整词切分
+    Args:
+        text: 原始文本
+    Returns:
+        list: 词列表（保留重复，用于计算词频）
+    """
+    tokens = []
+    for run in _TOKEN_PATTERN.findall((text or '').lower()):
+        if len(run) == 1 or not '一' <= run[0] <= '鿿':
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+def unigrams(text):
+    """
+    逐个汉字切分，用于单字查询（如 "参" 匹配人参、党参）
+    Returns:
+        list: 汉字列表（保留重复）
+    """
+    return _HAN_PATTERN.findall(text or '')
+
+
+def _is_unigram(token):
+    return len(token) == 1 and '一' <= token <= '鿿'
+
+
+class BM25Index:
+    """
+    带字段权重的BM25（BM25F）倒排索引
+
+    构建时把每个词在各字段中的词频按字段权重和字段长度归一化后合并，
+    预先计算好每个 (词, 文档) 的得分，查询时只需按词累加，再用堆取前k个。
+    中文按两字词建索引；另有一张按单字建的倒排表，查询中的单个汉字在其中检索（得分乘以 UNIGRAM_WEIGHT）。
+    """
+
+    def __init__(self, names, postings, idf, k1, b, unigram_postings=None, unigram_idf=None,
+                 unigram_weight=UNIGRAM_WEIGHT):
+        self.names = names
+        self.postings = postings
+        self.idf = idf
+        self.k1 = k1
+        self.b = b
+        self.unigram_postings = unigram_postings or {}
+        self.unigram_idf = unigram_idf or {}
+        self.unigram_weight = unigram_weight
+
+    def __len__(self):
+        return len(self.names)
+
+    @classmethod
+    def build(cls, rows=None, boosts=None, k1=1.2, b=0.75):
+        """
+        构建索引
+        Args:
+            rows: 可选的与 FIELDS 顺序一致的元组序列，默认从数据库读取
+            boosts: 字段权重，默认为 FIELD_BOOSTS
+            k1: 词频饱和参数
+            b: 长度归一化参数
+        """
+        boosts = boosts or FIELD_BOOSTS
+        if rows is None:
+            rows = Herb.objects.values_list(*FIELDS).iterator()
+
+        names = []
+        documents = []  # 每个文档：{字段: (词频dict, 长度)}
+        char_documents = []  # 同上，按单字切分
+        for row in rows:
+            values = dict(zip(FIELDS, row))
+            names.append(values['name'])
+            documents.append(cls._field_frequencies(values, tokenize))
+            char_documents.append(cls._field_frequencies(values, unigrams))
+
+        postings, idf = cls._score(documents, boosts, k1, b)
+        unigram_postings, unigram_idf = cls._score(char_documents, boosts, k1, b)
+        return cls(names, postings, idf, k1, b, unigram_postings, unigram_idf)
+
+    @staticmethod
+    def _field_frequencies(values, split):
+        """各字段的词频和长度"""
+        fields = {}
+        for field in FIELDS:
+            tokens = split(values.get(field))
+            if tokens:
+                frequencies = defaultdict(int)
+                for token in tokens:
+                    frequencies[token] += 1
+                fields[field] = (frequencies, len(tokens))
+        return fields
+
+    @staticmethod
+    def _score(documents, boosts, k1, b):
+        """
+        计算每个 (词, 文档) 的BM25F得分（不含idf）
+        Returns:
+            tuple: ({词: (文档编号数组, 得分数组)}, {词: idf})
+        """
+        count = len(documents)
+        length_totals = defaultdict(int)
+        for fields in documents:
+            for field, (_, length) in fields.items():
+                length_totals[field] += length
+        average_lengths = {field: (length_totals[field] / count if count else 0) or 1 for field in FIELDS}
+        doc_lists = defaultdict(lambda: array('i'))
+        weight_lists = defaultdict(lambda: array('f'))
+        for doc, fields in enumerate(documents):
+            # BM25F：先合并各字段归一化后的加权词频，再做一次饱和
+            combined = defaultdict(float)
+            for field, (frequencies, length) in fields.items():
+                norm = 1 - b + b * length / average_lengths[field]
+                boost = boosts.get(field, 1.0)
+                for token, frequency in frequencies.items():
+                    combined[token] += boost * frequency / norm
+            for token, tf in combined.items():
+                doc_lists[token].append(doc)
+                weight_lists[token].append(tf * (k1 + 1) / (tf + k1))
+            documents[doc] = None
+
+        idf = {
+            token: math.log(1 + (count - len(docs) + 0.5) / (len(docs) + 0.5))
+            for token, docs in doc_lists.items()
+        }
+        postings = {token: (doc_lists[token], weight_lists[token]) for token in doc_lists}
+        return postings, idf
+
+    def search(self, query, top_k=20):
+        """
+        检索与查询最相关的文档
+        Args:
+            query: 查询文本
+            top_k: 返回数量
+        Returns:
+            list: (药名, 得分) 列表，按得分降序
+        """
+        # 只用大小为k的堆取前k个，不对全部匹配结果排序
+        top = heapq.nlargest(top_k, self.score(query).items(), key=itemgetter(1))
+        return [(self.names[doc], score) for doc, score in top]
+
+    def score(self, query):
+        """
+        累加查询中各词的得分；单个汉字在单字倒排表中检索，因此 "参" 也能匹配 "人参"
+        Returns:
+            dict: {文档编号: 得分}
+        """
+        scores = {}
+        for token in set(tokenize(query)):
+            if _is_unigram(token):
+                posting = self.unigram_postings.get(token)
+                idf = self.unigram_idf.get(token, 0.0) * self.unigram_weight
+            else:
+                posting = self.postings.get(token)
+                idf = self.idf.get(token, 0.0)
+            if posting is None:
+                continue
+            docs, weights = posting
+            get = scores.get
+            for doc, weight in zip(docs, weights):
+                scores[doc] = get(doc, 0.0) + idf * weight
+        return scores
+
+    def stats(self):
+        return {
+            'documents': len(self.names),
+            'terms': len(self.postings),
+            'postings': sum(len(docs) for docs, _ in self.postings.values()),
+            'unigram_terms': len(self.unigram_postings),
+            'unigram_postings': sum(len(docs) for docs, _ in self.unigram_postings.values()),
+        }
+
+
+bm25_index = DatasetIndex('bm25', BM25Index.build)
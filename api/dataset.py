@@ -0,0 +1,194 @@
+import re
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DatabaseError, connection, transaction
+
+from .models import Herb
+
+logger = logging.getLogger(__name__)
+
+# 当前请求中 DatasetIndex.get() 实际返回的索引的数据版本（由 served_versions 开启记录）
+_served = ContextVar('herb_served_versions', default=None)
+
+# 别名之间的分隔符
+_ALIAS_SEPARATOR = re.compile(r'[,，、;；\s]+')
+
+
+def split_aliases(text):
+    """别名字段按逗号、顿号、分号拆分为单个别名"""
+    return [alias for alias in _ALIAS_SEPARATOR.split(text or '') if alias]
+
+
+class DatasetVersion:
+    """
+    中药数据表的版本标识
+
+    由记录数、MySQL表更新时间（information_schema.TABLES.UPDATE_TIME，查询前关闭统计缓存）和本进程内的修改计数组成。
+    通过Django保存或删除记录时由信号立即更新计数；直接修改数据库时由定期检查发现变化。
+    """
+
+    def __init__(self, check_interval=30):
+        self.check_interval = check_interval
+        self._generation = 0
+        self._previous = None
+        self._probed = None
+        self._next_check = 0.0
+        self._stats_expiry_supported = True
+        self._lock = threading.Lock()
+
+    def bump(self, **kwargs):
+        """数据已修改（post_save / post_delete 信号处理函数）：事务提交后才更新版本，回滚的修改不改变版本"""
+        transaction.on_commit(self._bump)
+
+    def _bump(self):
+        with self._lock:
+            self._previous = f'{self._probed}:{self._generation}'
+            self._generation += 1
+            self._next_check = 0.0
+
+    def _probe(self):
+        """查询记录数和表更新时间"""
+        count = Herb.objects.count()
+        updated = None
+        if connection.vendor == 'mysql':
+            with connection.cursor() as cursor:
+                if self._stats_expiry_supported:
+                    # MySQL 8 默认把 information_schema 中的表统计缓存 86400 秒（information_schema_stats_expiry），
+                    # 不关闭时直接 UPDATE（记录数不变）的修改在一天内都发现不了
+                    try:
+                        cursor.execute('SET SESSION information_schema_stats_expiry = 0')
+                    except DatabaseError:
+                        # MySQL 5.7 没有该变量，UPDATE_TIME 不缓存
+                        self._stats_expiry_supported = False
+                cursor.execute(
+                    'SELECT UPDATE_TIME FROM information_schema.TABLES '
+                    'WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s',
+                    [Herb._meta.db_table]
+                )
+                row = cursor.fetchone()
+                updated = str(row[0]) if row and row[0] else None
+        return f'{count}:{updated}'
+
+    def current(self):
+        """
+        当前数据版本（按 check_interval 限制查询数据库的频率）
+        Returns:
+            str: 版本标识，数据变化后改变
+        """
+        now = time.monotonic()
+        if self._probed is None or now >= self._next_check:
+            probed = self._probe()
+            with self._lock:
+                if self._probed is not None and probed != self._probed:
+                    logger.info(f'Herb dataset changed: {self._probed} -> {probed}')
+                self._probed = probed
+                self._next_check = now + self.check_interval
+        return f'{self._probed}:{self._generation}'
+
+    @property
+    def previous(self):
+        """最近一次 bump 之前的版本标识"""
+        return self._previous
+
+
+dataset_version = DatasetVersion(getattr(settings, 'SEARCH_DATASET_CHECK_INTERVAL', 30))
+
+
+class DatasetIndex:
+    """
+    由中药数据构建、按数据版本自动重建的内存索引
+
+    数据变化后由第一个发现的请求重建索引，重建期间其他请求继续使用旧索引。
+    """
+
+    def __init__(self, name, builder):
+        """
+        Args:
+            name: 索引名称（用于日志和统计）
+            builder: 构建函数，返回索引对象
+        """
+        self.name = name
+        self.builder = builder
+        self.build_seconds = None
+        self._state = (None, None)  # (索引, 构建或最后修改时的数据版本)，整体替换以便无锁读取
+        self._lock = threading.Lock()
+
+    @property
+    def version(self):
+        return self._state[1]
+
+    def get(self):
+        """
+        获取与当前数据版本一致的索引
+        Returns:
+            索引对象。其他线程重建期间返回旧索引，served_versions 范围内会记录实际返回的版本
+        """
+        version = dataset_version.current()
+        state = self._state
+        if state[0] is None or state[1] != version:
+            # 已有旧索引时不等待正在进行的重建
+            if not self._lock.acquire(blocking=state[0] is None):
+                return self._serve(state)
+            try:
+                state = self._state
+                if state[0] is None or state[1] != version:
+                    started = time.perf_counter()
+                    state = self._state = (self.builder(), version)
+                    self.build_seconds = time.perf_counter() - started
+                    logger.info(f'Search index "{self.name}" built in {self.build_seconds:.3f}s (version {version})')
+            finally:
+                self._lock.release()
+        return self._serve(state)
+
+    @staticmethod
+    def _serve(state):
+        served = _served.get()
+        if served is not None:
+            served.add(state[1])
+        return state[0]
+
+    def apply_change(self, apply):
+        """
+        在已构建的索引上就地应用一条记录的修改（在 dataset_version.bump 之后调用）
+        Args:
+            apply: 接收索引对象并修改它的函数
+        Returns:
+            bool: 是否已应用。索引尚未构建或修改前已过期时不应用，由下一次查询整体重建
+        """
+        with self._lock:
+            index, version = self._state
+            if index is None or version != dataset_version.previous:
+                return False
+            apply(index)
+            self._state = (index, dataset_version.current())
+            return True
+
+    def preload(self):
+        """在后台线程中构建索引"""
+        def _target():
+            try:
+                self.get()
+            except Exception as e:
+                logger.error(f'Failed to build search index "{self.name}": {str(e)}')
+        threading.Thread(target=_target, name=f'search-index-{self.name}', daemon=True).start()
+
+
+@contextmanager
+def served_versions():
+    """
+    记录范围内各 DatasetIndex.get() 返回的索引的数据版本
+    （重建期间返回的旧索引版本与 dataset_version.current() 不同，响应缓存据此不保存用旧索引得到的结果）
+    Yields:
+        set: 数据版本集合
+    """
+    versions = set()
+    token = _served.set(versions)
+    try:
+        yield versions
+    finally:
+        _served.reset(token)
@@ -0,0 +1,181 @@
+import logging
+
+from .dataset import DatasetIndex
+from .models import Herb
+
+logger = logging.getLogger(__name__)
+
+# 性味：五味（含淡、涩）、四气（含平）及毒性
+FLAVORS = ('酸', '苦', '甘', '辛', '咸', '淡', '涩')
+NATURES = ('寒', '热', '温', '凉', '平')
+TOXICITY = ('大毒', '小毒', '有毒', '无毒')
+# 程度修饰，如 微苦、大寒
+_MODIFIERS = ('微', '大')
+
+# 归经：先匹配较长的名称，避免 心包 被识别为 心
+MERIDIANS = ('心包', '三焦', '大肠', '小肠', '膀胱', '肝', '心', '脾', '肺', '肾', '胃', '胆')
+
+FACETS = ('taste', 'meridian')
+
+# 分类浏览结果中返回的字段
+CATEGORY_FIELDS = ('name', 'alias', 'taste', 'meridian', 'effect', 'indication', 'usage', 'contraindication')
+
+
+def parse_taste(text):
+    """
+    把性味字段解析为规范化的词
+    Args:
+        text: 如 "甘、微苦，微寒；有小毒"
+    Returns:
+        set: 如 {'甘', '苦', '微苦', '寒', '微寒', '小毒'}。带修饰的味同时计入基本的味
+    """
+    tokens = set()
+    if not text:
+        return tokens
+    for i, char in enumerate(text):
+        if char in FLAVORS or char in NATURES:
+            tokens.add(char)
+            if i and text[i - 1] in _MODIFIERS:
+                tokens.add(text[i - 1] + char)
+    for toxicity in TOXICITY:
+        if toxicity in text:
+            tokens.add(toxicity)
+    # "有小毒" 同时包含 小毒 和 有毒 的写法
+    if '小毒' in tokens or '大毒' in tokens:
+        tokens.add('有毒')
+    return tokens
+
+
+def parse_meridian(text):
+    """
+    把归经字段解析为规范化的经名
+    Args:
+        text: 如 "归肝、胆经" 或 "入心包、三焦经"
+    Returns:
+        set: 如 {'肝经', '胆经'}
+    """
+    tokens = set()
+    i = 0
+    text = text or ''
+    while i < len(text):
+        for meridian in MERIDIANS:
+            if text.startswith(meridian, i):
+                tokens.add(meridian + '经')
+                i += len(meridian)
+                break
+        else:
+            i += 1
+    return tokens
+
+
+PARSERS = {'taste': parse_taste, 'meridian': parse_meridian}
+
+
+class FacetIndex:
+    """
+    性味和归经的分面索引
+
+    每味药的性味、归经只解析一次，每个词对应一个药材编号集合；
+    药材按药名排序编号，多个条件的查询即集合求交后按编号排序。
+    """
+
+    def __init__(self, rows, postings):
+        self.rows = rows
+        self.postings = postings
+
+    def __len__(self):
+        return len(self.rows)
+
+    @classmethod
+    def build(cls, rows=None):
+        """
+        构建索引
+        Args:
+            rows: 可选的与 CATEGORY_FIELDS 顺序一致的元组序列，默认从数据库按药名顺序读取
+        """
+        if rows is None:
+            rows = Herb.objects.order_by('name').values_list(*CATEGORY_FIELDS).iterator()
+        else:
+            rows = sorted(rows, key=lambda row: row[0])
+        records = []
+        postings = {facet: {} for facet in FACETS}
+        for doc, row in enumerate(rows):
+            record = dict(zip(CATEGORY_FIELDS, row))
+            records.append(record)
+            for facet in FACETS:
+                for token in PARSERS[facet](record[facet]):
+                    postings[facet].setdefault(token, set()).add(doc)
+        return cls(records, {
+            facet: {token: frozenset(docs) for token, docs in tokens.items()}
+            for facet, tokens in postings.items()
+        })
+
+    def select(self, filters):
+        """
+        多条件查询（各条件之间为“与”）
+        Args:
+            filters: {分面: [词, ...]}，如 {'taste': ['苦'], 'meridian': ['肝经']}
+        Returns:
+            list: 按药名排序的药材编号；没有条件时返回 None
+        """
+        sets = []
+        for facet, tokens in filters.items():
+            for token in tokens:
+                sets.append(self.postings[facet].get(token, frozenset()))
+        if not sets:
+            return None
+        sets.sort(key=len)
+        docs = set(sets[0])
+        for other in sets[1:]:
+            docs.intersection_update(other)
+            if not docs:
+                break
+        return sorted(docs)
+
+    def records(self, docs):
+        return [self.rows[doc] for doc in docs]
+
+    def counts(self, docs=None):
+        """
+        每个分面下各个词的药材数
+        Args:
+            docs: 可选的药材编号集合，只统计其中的药材（用于在已选条件下继续筛选）
+        Returns:
+            dict: {分面: {词: 数量}}，按数量降序
+        """
+        selected = None if docs is None else set(docs)
+        counts = {}
+        for facet, tokens in self.postings.items():
+            facet_counts = {
+                token: len(postings) if selected is None else len(selected.intersection(postings))
+                for token, postings in tokens.items()
+            }
+            counts[facet] = dict(sorted(
+                ((token, count) for token, count in facet_counts.items() if count),
+                key=lambda item: (-item[1], item[0])
+            ))
+        return counts
+
+
+facet_index = DatasetIndex('facets', FacetIndex.build)
+
+
+def parse_filters(values):
+    """
+    把请求中的分类条件解析为规范化的词（与数据解析规则相同，如 "肝" 与 "肝经" 等价）
+    Args:
+        values: {分面: 字符串或字符串列表}
+    Returns:
+        dict: {分面: [词, ...]}；无法识别的分面会被忽略，无法识别的值返回空列表
+    """
+    filters = {}
+    for facet, value in values.items():
+        if facet not in PARSERS or not value:
+            continue
+        if isinstance(value, str):
+            value = [value]
+        tokens = set()
+        for item in value:
+            tokens.update(PARSERS[facet](str(item)))
+        filters[facet] = sorted(tokens)
+    return filters
@@ -0,0 +1,115 @@
+import json
+import time
+import random
+from operator import itemgetter
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.bm25 import FIELDS, BM25Index
+from api.synthetic import EFFECTS, MERIDIANS, PHARMACOLOGY, SYMPTOMS, synthetic_herbs
+
+
+def _percentile(values, pct):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(round(pct / 100.0 * (len(values) - 1))))]
+
+
+def _full_sort_search(index, query, top_k):
+    """对照实现：累加得分后对全部匹配结果排序再截取前k个"""
+    ranked = sorted(index.score(query).items(), key=itemgetter(1), reverse=True)[:top_k]
+    return [(index.names[doc], score) for doc, score in ranked]
+
+
+def _sample_queries(count, seed=0):
+    """由功效、主治、归经、药理词汇组合出查询"""
+    rng = random.Random(seed)
+    pools = [EFFECTS, SYMPTOMS, [f'归{meridian}经' for meridian in MERIDIANS], PHARMACOLOGY]
+    queries = []
+    for _ in range(count):
+        words = [rng.choice(rng.choice(pools)) for _ in range(rng.randint(1, 3))]
+        queries.append(' '.join(words))
+    return queries
+
+
+class Command(BaseCommand):
+    help = '在合成中药数据上测试BM25索引的构建时间、内存规模和检索延迟'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--documents', type=int, default=100000,
+                            help='合成记录数')
+        parser.add_argument('--queries', type=int, default=200,
+                            help='查询数')
+        parser.add_argument('--top-k', type=int, default=20,
+                            help='每次查询返回的结果数')
+        parser.add_argument('--seed', type=int, default=0,
+                            help='随机种子')
+        parser.add_argument('--json', action='store_true',
+                            help='以JSON格式输出报告')
+
+    def handle(self, *args, **options):
+        if options['documents'] <= 0:
+            raise CommandError('--documents 必须大于0')
+        top_k = max(1, options['top_k'])
+
+        started = time.perf_counter()
+        herbs = synthetic_herbs(options['documents'], seed=options['seed'])
+        rows = [tuple(herb.get(field) for field in FIELDS) for herb in herbs]
+        generate_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        index = BM25Index.build(rows=rows)
+        build_seconds = time.perf_counter() - started
+        del herbs, rows
+
+        queries = _sample_queries(options['queries'], seed=options['seed'])
+        heap_timings, sort_timings, mismatches = [], [], 0
+        for query in queries:
+            t0 = time.perf_counter()
+            actual = index.search(query, top_k)
+            t1 = time.perf_counter()
+            expected = _full_sort_search(index, query, top_k)
+            t2 = time.perf_counter()
+            heap_timings.append((t1 - t0) * 1000)
+            sort_timings.append((t2 - t1) * 1000)
+            # 得分相同时两种实现的顺序可能不同，只比较得分序列
+            if [round(score, 6) for _, score in actual] != [round(score, 6) for _, score in expected]:
+                mismatches += 1
+
+        report = {
+            'documents': len(index),
+            'generate_seconds': generate_seconds,
+            'build_seconds': build_seconds,
+            'index': index.stats(),
+            'queries': len(queries),
+            'top_k': top_k,
+            'mismatches': mismatches,
+            'heap_topk': {
+                'mean_ms': sum(heap_timings) / len(heap_timings),
+                'p50_ms': _percentile(heap_timings, 50),
+                'p95_ms': _percentile(heap_timings, 95),
+            },
+            'full_sort': {
+                'mean_ms': sum(sort_timings) / len(sort_timings),
+                'p50_ms': _percentile(sort_timings, 50),
+                'p95_ms': _percentile(sort_timings, 95),
+            },
+        }
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, ensure_ascii=False, indent=2))
+        else:
+            stats = report['index']
+            self.stdout.write(
+                f'{report["documents"]} 条合成记录（生成 {generate_seconds:.1f}s），索引构建 {build_seconds:.1f}s，'
+                f'{stats["terms"]} 个词，{stats["postings"]} 条倒排记录'
+            )
+            for name in ('heap_topk', 'full_sort'):
+                timings = report[name]
+                self.stdout.write(
+                    f'  {name:<9} mean={timings["mean_ms"]:.2f}ms '
+                    f'p50={timings["p50_ms"]:.2f}ms p95={timings["p95_ms"]:.2f}ms'
+                )
+        if mismatches:
+            raise CommandError(f'{mismatches} 个查询的堆取前k结果与全排序结果不一致')
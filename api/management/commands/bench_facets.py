@@ -0,0 +1,86 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.facets import FACETS, FacetIndex, parse_filters
+from api.models import Herb
+
+
+def _percentile(values, pct):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(round(pct / 100.0 * (len(values) - 1))))]
+
+
+class Command(BaseCommand):
+    help = '对比分类浏览的数据库子串查询与分面索引：延迟以及子串匹配的误匹配'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=5,
+                            help='每个分类的计时次数')
+        parser.add_argument('--json', action='store_true',
+                            help='以JSON格式输出报告')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        index = FacetIndex.build()
+        build_seconds = time.perf_counter() - started
+        if not len(index):
+            raise CommandError('中药数据表为空')
+
+        iterations = max(1, options['iterations'])
+        rows = []
+        db_timings, index_timings = [], []
+        for facet in FACETS:
+            for token in index.postings[facet]:
+                # 数据库查询使用用户在分类页选择的值（归经去掉“经”字，与原有前端一致）
+                value = token[:-1] if facet == 'meridian' else token
+                filters = parse_filters({facet: value})
+                expected = [row['name'] for row in index.records(index.select(filters))]
+                substring = list(
+                    Herb.objects.filter(**{f'{facet}__icontains': value}).order_by('name').values_list('name', flat=True)
+                )
+                for _ in range(iterations):
+                    t0 = time.perf_counter()
+                    list(Herb.objects.filter(**{f'{facet}__icontains': value}).order_by('name').values(
+                        'name', 'alias', 'taste', 'meridian', 'effect', 'indication', 'usage', 'contraindication'
+                    ))
+                    t1 = time.perf_counter()
+                    index.records(index.select(filters))
+                    t2 = time.perf_counter()
+                    db_timings.append((t1 - t0) * 1000)
+                    index_timings.append((t2 - t1) * 1000)
+                rows.append({
+                    'facet': facet,
+                    'value': value,
+                    'index': len(expected),
+                    'substring': len(substring),
+                    'substring_only': len(set(substring) - set(expected)),
+                    'index_only': len(set(expected) - set(substring)),
+                })
+
+        report = {
+            'documents': len(index),
+            'build_seconds': build_seconds,
+            'categories': rows,
+            'database_p50_ms': _percentile(db_timings, 50),
+            'database_p95_ms': _percentile(db_timings, 95),
+            'index_p50_ms': _percentile(index_timings, 50),
+            'index_p95_ms': _percentile(index_timings, 95),
+        }
+        if options['json']:
+            self.stdout.write(json.dumps(report, ensure_ascii=False, indent=2))
+            return
+        self.stdout.write(f'{report["documents"]} 条记录，分面索引构建 {build_seconds:.3f}s')
+        self.stdout.write(f'{"分面":<10} {"值":<6} {"索引":>6} {"子串":>6} {"仅子串":>6} {"仅索引":>6}')
+        for row in rows:
+            self.stdout.write(
+                f'{row["facet"]:<10} {row["value"]:<6} {row["index"]:>6} {row["substring"]:>6} '
+                f'{row["substring_only"]:>6} {row["index_only"]:>6}'
+            )
+        self.stdout.write(
+            f'数据库 p50={report["database_p50_ms"]:.2f}ms p95={report["database_p95_ms"]:.2f}ms；'
+            f'分面索引 p50={report["index_p50_ms"]:.3f}ms p95={report["index_p95_ms"]:.3f}ms'
+        )
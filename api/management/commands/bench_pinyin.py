@@ -0,0 +1,114 @@
+import json
+import time
+import random
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+
+from api.models import Herb
+from api.pinyin import PinyinIndex, herb_texts, pinyin_table
+from api.synthetic import synthetic_herbs
+
+
+def _percentile(values, pct):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(round(pct / 100.0 * (len(values) - 1))))]
+
+
+def _sample_queries(rows, count, seed=0):
+    """抽取药名或别名，生成全拼前缀（至少两个字母）和首字母查询，记录期望命中的药名"""
+    rng = random.Random(seed)
+    queries = []
+    for name, alias in rng.sample(rows, min(len(rows), count)):
+        text = rng.choice(herb_texts(name, alias))
+        variants = pinyin_table.variants(text)
+        if not variants:
+            continue
+        full, initials = rng.choice(variants)
+        queries.append((full[:rng.randint(min(2, len(full)), len(full))], name))
+        queries.append((initials, name))
+    return queries
+
+
+class Command(BaseCommand):
+    help = '测试拼音前缀索引的构建时间、查询延迟和召回，并与数据库 icontains 查询对比'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--synthetic', type=int, default=0,
+                            help='使用指定数量的合成数据代替数据库')
+        parser.add_argument('--sample', type=int, default=200,
+                            help='抽样的药材数')
+        parser.add_argument('--json', action='store_true',
+                            help='以JSON格式输出报告')
+
+    def handle(self, *args, **options):
+        if options['synthetic']:
+            rows = [(herb['name'], herb['alias']) for herb in synthetic_herbs(options['synthetic'])]
+        else:
+            rows = list(Herb.objects.values_list('name', 'alias'))
+        if not rows:
+            raise CommandError('中药数据表为空')
+
+        started = time.perf_counter()
+        index = PinyinIndex.build(rows=rows)
+        build_seconds = time.perf_counter() - started
+        if not index.full_keys:
+            raise CommandError('没有可用的拼音：请先运行 build_pinyin_index 或安装 pypinyin')
+
+        queries = _sample_queries(rows, options['sample'])
+        timings, hits = [], 0
+        for query, expected in queries:
+            t0 = time.perf_counter()
+            results = index.search(query)
+            timings.append((time.perf_counter() - t0) * 1000)
+            if any(name == expected for name, _ in results):
+                hits += 1
+
+        # 对照：原有的数据库 icontains 查询无法匹配拼音
+        database = {}
+        if not options['synthetic']:
+            db_timings, db_hits = [], 0
+            for query, expected in queries[:50]:
+                t0 = time.perf_counter()
+                names = list(
+                    Herb.objects.filter(Q(name__icontains=query) | Q(alias__icontains=query)).values_list('name', flat=True)
+                )
+                db_timings.append((time.perf_counter() - t0) * 1000)
+                db_hits += expected in names
+            database = {
+                'queries': len(db_timings),
+                'recall': db_hits / len(db_timings) if db_timings else 0.0,
+                'p50_ms': _percentile(db_timings, 50),
+                'p95_ms': _percentile(db_timings, 95),
+            }
+
+        report = {
+            'index': index.stats(),
+            'build_seconds': build_seconds,
+            'queries': len(queries),
+            'recall': hits / len(queries) if queries else 0.0,
+            'mean_ms': sum(timings) / len(timings) if timings else 0.0,
+            'p50_ms': _percentile(timings, 50),
+            'p95_ms': _percentile(timings, 95),
+            'p99_ms': _percentile(timings, 99),
+            'database': database,
+        }
+        if options['json']:
+            self.stdout.write(json.dumps(report, ensure_ascii=False, indent=2))
+            return
+        stats = report['index']
+        self.stdout.write(
+            f'{stats["documents"]} 味药材，{stats["texts"]} 个药名/别名，'
+            f'{stats["full_keys"]} 个全拼键，索引构建 {build_seconds:.3f}s'
+        )
+        self.stdout.write(
+            f'拼音索引: {report["queries"]} 次查询 召回={report["recall"]:.1%} '
+            f'p50={report["p50_ms"]:.3f}ms p95={report["p95_ms"]:.3f}ms p99={report["p99_ms"]:.3f}ms'
+        )
+        if database:
+            self.stdout.write(
+                f'数据库 icontains: {database["queries"]} 次查询 召回={database["recall"]:.1%} '
+                f'p50={database["p50_ms"]:.3f}ms p95={database["p95_ms"]:.3f}ms'
+            )
@@ -0,0 +1,126 @@
+import json
+import time
+import random
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from api.search_index import NgramIndex, search_names_database
+
+
+def _percentile(values, pct):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(round(pct / 100.0 * (len(values) - 1))))]
+
+
+def _sample_keywords(index, count, seed=0):
+    """从数据中抽取关键词：药名及其前缀、别名片段、其他字段中的高频和低频两字词，以及不存在的词"""
+    rng = random.Random(seed)
+    keywords = set()
+    names = [name for name in index.names if name]
+    for name in rng.sample(names, min(len(names), count)):
+        keywords.update({name, name[:1], name[:2]})
+    aliases = [text for text in index.texts['alias'] if text]
+    for alias in rng.sample(aliases, min(len(aliases), count // 2)):
+        part = alias.replace('、', ',').replace('，', ',').split(',')[0].strip()
+        if part:
+            keywords.add(part[:3])
+    bigrams = sorted(
+        (gram for gram in index.postings['other'] if len(gram) == 2 and gram.strip() and '\x00' not in gram),
+        key=lambda gram: len(index.postings['other'][gram]),
+        reverse=True,
+    )
+    keywords.update(bigrams[:count // 2])
+    keywords.update(rng.sample(bigrams, min(len(bigrams), count // 2)))
+    keywords.update({'清热解毒', '不存在的药材'})
+    return sorted(keywords)
+
+
+class Command(BaseCommand):
+    help = '对比数据库分层搜索（LIKE）与内存n-gram索引的结果顺序、查询次数和延迟'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--keywords', default=None,
+                            help='逗号分隔的关键词，默认从数据中抽取')
+        parser.add_argument('--sample', type=int, default=40,
+                            help='自动抽取关键词时抽样的药材数')
+        parser.add_argument('--iterations', type=int, default=5,
+                            help='每个关键词的计时次数')
+        parser.add_argument('--json', action='store_true',
+                            help='以JSON格式输出报告')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        index = NgramIndex.build()
+        build_seconds = time.perf_counter() - started
+        if not len(index):
+            raise CommandError('中药数据表为空')
+
+        if options['keywords']:
+            keywords = [keyword for keyword in options['keywords'].split(',') if keyword]
+        else:
+            keywords = _sample_keywords(index, options['sample'])
+
+        iterations = max(1, options['iterations'])
+        db_timings, index_timings, db_queries = [], [], []
+        mismatches = []
+        for keyword in keywords:
+            with CaptureQueriesContext(connection) as captured:
+                expected = search_names_database(keyword)
+            db_queries.append(len(captured.captured_queries))
+            actual = index.search(keyword)
+            if actual != expected:
+                mismatches.append({'keyword': keyword, 'database': expected[:10], 'index': actual[:10]})
+            for _ in range(iterations):
+                t0 = time.perf_counter()
+                search_names_database(keyword)
+                t1 = time.perf_counter()
+                index.search(keyword)
+                t2 = time.perf_counter()
+                db_timings.append((t1 - t0) * 1000)
+                index_timings.append((t2 - t1) * 1000)
+
+        db_mean = sum(db_timings) / len(db_timings)
+        index_mean = sum(index_timings) / len(index_timings)
+        report = {
+            'documents': len(index),
+            'build_seconds': build_seconds,
+            'keywords': len(keywords),
+            'mismatches': mismatches,
+            'database': {
+                'queries_per_search': sum(db_queries) / len(db_queries),
+                'mean_ms': db_mean,
+                'p50_ms': _percentile(db_timings, 50),
+                'p95_ms': _percentile(db_timings, 95),
+            },
+            'index': {
+                'queries_per_search': 0,
+                'mean_ms': index_mean,
+                'p50_ms': _percentile(index_timings, 50),
+                'p95_ms': _percentile(index_timings, 95),
+            },
+            'speedup': db_mean / index_mean if index_mean else None,
+        }
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, ensure_ascii=False, indent=2))
+        else:
+            self.stdout.write(
+                f'{report["documents"]} 条记录，索引构建 {build_seconds:.3f}s，{len(keywords)} 个关键词'
+            )
+            for name in ('database', 'index'):
+                stats = report[name]
+                self.stdout.write(
+                    f'  {name:<9} 查询次数={stats["queries_per_search"]:.1f} mean={stats["mean_ms"]:.3f}ms '
+                    f'p50={stats["p50_ms"]:.3f}ms p95={stats["p95_ms"]:.3f}ms'
+                )
+            self.stdout.write(f'  加速比: {report["speedup"]:.1f}x')
+            for mismatch in mismatches[:10]:
+                self.stdout.write(self.style.ERROR(f'  结果不一致: {mismatch["keyword"]}'))
+        if mismatches:
+            raise CommandError(f'{len(mismatches)} 个关键词的结果与数据库查询不一致')
+        if not options['json']:
+            self.stdout.write(self.style.SUCCESS('所有关键词的结果及顺序与数据库查询一致'))
@@ -0,0 +1,120 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory
+
+from api.search_index import search_names
+from api.views import HERB_FIELDS, HerbSearchView, _fetch_herbs
+
+DEFAULT_KEYWORDS = '清热,解毒,活血,止痛,补气,甘,肝经,人参'
+
+
+def _percentile(values, pct):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(round(pct / 100.0 * (len(values) - 1))))]
+
+
+def _full_response(keyword):
+    """分页之前的响应：全部匹配记录的全部字段"""
+    names = [name for name, _ in search_names(keyword)]
+    herbs_list = _fetch_herbs(names, HERB_FIELDS)
+    return JSONRenderer().render({'success': True, 'data': herbs_list, 'count': len(herbs_list)})
+
+
+class Command(BaseCommand):
+    help = '对比搜索接口分页和字段裁剪前后的响应大小和延迟'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--keywords', default=DEFAULT_KEYWORDS,
+                            help='逗号分隔的关键词')
+        parser.add_argument('--page-size', type=int, default=None,
+                            help='分页后每页条数，默认使用 SEARCH_PAGE_SIZE')
+        parser.add_argument('--fields', default=None,
+                            help='分页后返回的字段（逗号分隔），默认使用列表字段')
+        parser.add_argument('--iterations', type=int, default=5,
+                            help='每个关键词的计时次数')
+        parser.add_argument('--json', action='store_true',
+                            help='以JSON格式输出报告')
+
+    def handle(self, *args, **options):
+        keywords = [keyword for keyword in options['keywords'].split(',') if keyword]
+        if not keywords:
+            raise CommandError('请提供关键词')
+        payload = {}
+        if options['page_size']:
+            payload['page_size'] = options['page_size']
+        if options['fields']:
+            payload['fields'] = options['fields']
+
+        factory = APIRequestFactory()
+        view = HerbSearchView.as_view()
+
+        def paged_response(keyword):
+            request = factory.post('/api/search/', dict(payload, keyword=keyword), format='json')
+            response = view(request)
+            response.render()
+            return response
+
+        # 预热：构建搜索索引
+        search_names(keywords[0])
+
+        iterations = max(1, options['iterations'])
+        rows = []
+        for keyword in keywords:
+            response = paged_response(keyword)
+            if response.status_code != 200:
+                rows.append({'keyword': keyword, 'status': response.status_code})
+                continue
+            matched = json.loads(response.content)['count']
+            before_timings, after_timings = [], []
+            for _ in range(iterations):
+                t0 = time.perf_counter()
+                before = _full_response(keyword)
+                t1 = time.perf_counter()
+                after = paged_response(keyword).content
+                t2 = time.perf_counter()
+                before_timings.append((t1 - t0) * 1000)
+                after_timings.append((t2 - t1) * 1000)
+            rows.append({
+                'keyword': keyword,
+                'status': 200,
+                'matched': matched,
+                'before_bytes': len(before),
+                'after_bytes': len(after),
+                'before_p50_ms': _percentile(before_timings, 50),
+                'after_p50_ms': _percentile(after_timings, 50),
+            })
+
+        measured = [row for row in rows if row['status'] == 200]
+        if not measured:
+            raise CommandError('所有关键词都没有匹配结果')
+        report = {
+            'page_size': payload.get('page_size'),
+            'fields': payload.get('fields'),
+            'keywords': rows,
+            'before_bytes_total': sum(row['before_bytes'] for row in measured),
+            'after_bytes_total': sum(row['after_bytes'] for row in measured),
+            'before_p50_ms_mean': sum(row['before_p50_ms'] for row in measured) / len(measured),
+            'after_p50_ms_mean': sum(row['after_p50_ms'] for row in measured) / len(measured),
+        }
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, ensure_ascii=False, indent=2))
+            return
+        self.stdout.write(f'{"关键词":<8} {"匹配":>6} {"分页前":>12} {"分页后":>10} {"分页前p50":>10} {"分页后p50":>10}')
+        for row in rows:
+            if row['status'] != 200:
+                self.stdout.write(f'{row["keyword"]:<8} 状态码 {row["status"]}')
+                continue
+            self.stdout.write(
+                f'{row["keyword"]:<8} {row["matched"]:>6} {row["before_bytes"]:>11}B {row["after_bytes"]:>9}B '
+                f'{row["before_p50_ms"]:>8.2f}ms {row["after_p50_ms"]:>8.2f}ms'
+            )
+        self.stdout.write(
+            f'合计 {report["before_bytes_total"]}B -> {report["after_bytes_total"]}B，'
+            f'平均p50 {report["before_p50_ms_mean"]:.2f}ms -> {report["after_p50_ms_mean"]:.2f}ms'
+        )
@@ -0,0 +1,179 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Q
+from django.test.utils import CaptureQueriesContext
+
+from api.models import Herb
+from api.search_index import FULLTEXT_INDEX_NAME, fulltext_columns, fulltext_status, search_names_database
+from api.synthetic import synthetic_herbs
+from api.views import LIST_FIELDS, _fetch_herbs
+
+DEFAULT_KEYWORDS = '清热解毒,活血,止痛,补气,肝经,金银,不存在的药材'
+
+
+def _percentile(values, pct):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(round(pct / 100.0 * (len(values) - 1))))]
+
+
+def _legacy_search(keyword):
+    """原有搜索视图的查询方式：三个查询集各自 count() 和遍历，exclude 使用已取出的药名列表，最后重新取出全部记录"""
+    name_results = Herb.objects.filter(name__icontains=keyword)
+    name_results.count()
+    for _ in name_results:
+        pass
+    alias_results = Herb.objects.filter(alias__icontains=keyword).exclude(
+        name__in=name_results.values_list('name', flat=True)
+    )
+    alias_results.count()
+    for _ in alias_results:
+        pass
+    other_query = (
+        Q(effect__icontains=keyword) |
+        Q(indication__icontains=keyword) |
+        Q(effect_class__icontains=keyword) |
+        Q(taste__icontains=keyword) |
+        Q(meridian__icontains=keyword)
+    )
+    excluded_names = list(name_results.values_list('name', flat=True)) + list(alias_results.values_list('name', flat=True))
+    other_results = Herb.objects.filter(other_query).exclude(name__in=excluded_names)
+    other_results.count()
+    for _ in other_results:
+        pass
+    all_results = list(name_results) + list(alias_results) + list(other_results)
+    return [herb.name for herb in all_results]
+
+
+def _single_query_search(keyword, page_size, use_fulltext):
+    """新的方式：一条SQL完成分层排序，再只取第一页需要的字段"""
+    matches = search_names_database(keyword, use_fulltext=use_fulltext)
+    names = [name for name, _ in matches]
+    _fetch_herbs(names[:page_size], LIST_FIELDS)
+    return names
+
+
+class Command(BaseCommand):
+    help = '对比原有的多查询搜索与单条SQL分层搜索（可选全文索引）的查询次数和延迟'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--keywords', default=DEFAULT_KEYWORDS,
+                            help='逗号分隔的关键词')
+        parser.add_argument('--seed', type=int, default=0,
+                            help='在临时测试数据库中创建中药表并写入指定数量的合成数据，不使用现有数据')
+        parser.add_argument('--fulltext', action='store_true',
+                            help='与 --seed 一起使用：在临时表上创建 FULLTEXT(ngram) 索引')
+        parser.add_argument('--page-size', type=int, default=20,
+                            help='单条SQL方式取出的第一页条数')
+        parser.add_argument('--iterations', type=int, default=5,
+                            help='每个关键词的计时次数')
+        parser.add_argument('--json', action='store_true',
+                            help='以JSON格式输出报告')
+
+    def handle(self, *args, **options):
+        if options['fulltext'] and not options['seed']:
+            raise CommandError('--fulltext 需要与 --seed 一起使用（现有数据库请使用 create_search_fulltext_index）')
+        old_name = None
+        if options['seed']:
+            old_name = connection.settings_dict['NAME']
+            connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            if options['seed']:
+                self._seed(options['seed'], options['fulltext'])
+            report = self._run(options)
+        finally:
+            if old_name is not None:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, ensure_ascii=False, indent=2))
+        else:
+            self.stdout.write(
+                f'{report["documents"]} 条记录（{"合成数据" if report["seeded"] else "现有数据"}），'
+                f'全文索引{"可用" if report["fulltext"] else "不可用"}，{len(report["keywords"])} 个关键词'
+            )
+            for name in ('legacy', 'single_query', 'fulltext'):
+                stats = report.get(name)
+                if stats:
+                    self.stdout.write(
+                        f'  {name:<13} 查询次数={stats["queries_per_search"]:.1f} '
+                        f'p50={stats["p50_ms"]:.2f}ms p95={stats["p95_ms"]:.2f}ms'
+                    )
+        if report['errors']:
+            for error in report['errors'][:10]:
+                self.stderr.write(self.style.ERROR(f'  {error}'))
+            raise CommandError(f'{len(report["errors"])} 项检查未通过')
+
+    def _seed(self, count, fulltext):
+        """在临时数据库中创建中药表（模型为 managed=False，需手动建表）并写入合成数据"""
+        with connection.schema_editor() as editor:
+            editor.create_model(Herb)
+        herbs = [Herb(**values) for values in synthetic_herbs(count)]
+        Herb.objects.bulk_create(herbs, batch_size=1000)
+        if fulltext:
+            if connection.vendor != 'mysql':
+                raise CommandError('FULLTEXT(ngram) 索引只支持 MySQL')
+            quote = connection.ops.quote_name
+            columns = ', '.join(quote(column) for column in fulltext_columns())
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f'ALTER TABLE {quote(Herb._meta.db_table)} ADD FULLTEXT INDEX {quote(FULLTEXT_INDEX_NAME)} '
+                    f'({columns}) WITH PARSER ngram'
+                )
+
+    def _run(self, options):
+        keywords = [keyword for keyword in options['keywords'].split(',') if keyword]
+        if not keywords:
+            raise CommandError('请提供关键词')
+        status = fulltext_status(refresh=True)
+        iterations = max(1, options['iterations'])
+        page_size = options['page_size']
+        paths = {
+            'legacy': _legacy_search,
+            'single_query': lambda keyword: _single_query_search(keyword, page_size, False),
+        }
+        if status['available']:
+            paths['fulltext'] = lambda keyword: _single_query_search(keyword, page_size, True)
+        # 单条SQL方式：一条分层排序查询，加上有结果时的一条取第一页查询
+        expected_queries = {'single_query': (1, 2), 'fulltext': (1, 2)}
+
+        timings = {name: [] for name in paths}
+        query_counts = {name: [] for name in paths}
+        errors = []
+        for keyword in keywords:
+            results = {}
+            for name, search in paths.items():
+                with CaptureQueriesContext(connection) as captured:
+                    results[name] = search(keyword)
+                queries = len(captured.captured_queries)
+                query_counts[name].append(queries)
+                allowed = expected_queries.get(name)
+                if allowed is not None and queries != allowed[1 if results[name] else 0]:
+                    errors.append(f'{name} 搜索 {keyword} 执行了 {queries} 条SQL')
+                for _ in range(iterations):
+                    started = time.perf_counter()
+                    search(keyword)
+                    timings[name].append((time.perf_counter() - started) * 1000)
+            for name in paths:
+                if name != 'legacy' and results[name] != results['legacy']:
+                    errors.append(f'{name} 搜索 {keyword} 的结果或顺序与原有方式不一致')
+
+        report = {
+            'documents': Herb.objects.count(),
+            'seeded': bool(options['seed']),
+            'fulltext': status['available'],
+            'keywords': keywords,
+            'errors': errors,
+        }
+        for name in paths:
+            report[name] = {
+                'queries_per_search': sum(query_counts[name]) / len(query_counts[name]),
+                'mean_ms': sum(timings[name]) / len(timings[name]),
+                'p50_ms': _percentile(timings[name], 50),
+                'p95_ms': _percentile(timings[name], 95),
+            }
+        return report
@@ -0,0 +1,89 @@
+import json
+import time
+import random
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.dataset import split_aliases
+from api.pinyin import to_pinyin
+from api.suggest import SUGGEST_FIELDS, SuggestIndex
+from api.synthetic import synthetic_herbs
+
+
+def _percentile(values, pct):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(round(pct / 100.0 * (len(values) - 1))))]
+
+
+def _sample_inputs(index, count, seed=0):
+    """模拟逐字输入：药名、别名和拼音的每个前缀"""
+    rng = random.Random(seed)
+    names = sorted(index.details)
+    inputs = []
+    for name in rng.sample(names, min(len(names), count)):
+        texts = [name] + split_aliases(index.details[name]['alias'])[:1]
+        converted = to_pinyin(name)
+        if converted:
+            texts.extend(converted)
+        for text in texts:
+            inputs.extend(text[:i] for i in range(1, len(text) + 1))
+    return inputs
+
+
+class Command(BaseCommand):
+    help = '测试搜索建议前缀索引的构建时间和逐字输入的查询延迟'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--synthetic', type=int, default=0,
+                            help='使用指定数量的合成数据代替数据库')
+        parser.add_argument('--sample', type=int, default=200,
+                            help='抽样的药材数（每个药材生成逐字输入的全部前缀）')
+        parser.add_argument('--limit', type=int, default=10,
+                            help='每次查询返回的建议数')
+        parser.add_argument('--json', action='store_true',
+                            help='以JSON格式输出报告')
+
+    def handle(self, *args, **options):
+        rows = None
+        if options['synthetic']:
+            herbs = synthetic_herbs(options['synthetic'])
+            rows = [tuple(herb.get(field) for field in SUGGEST_FIELDS) for herb in herbs]
+
+        started = time.perf_counter()
+        index = SuggestIndex.build(rows=rows)
+        build_seconds = time.perf_counter() - started
+        if not len(index):
+            raise CommandError('中药数据表为空')
+
+        inputs = _sample_inputs(index, options['sample'])
+        timings = []
+        for keyword in inputs:
+            t0 = time.perf_counter()
+            index.search(keyword, options['limit'])
+            timings.append((time.perf_counter() - t0) * 1000)
+
+        report = {
+            'documents': len(index),
+            'entries': {kind: len(array) for kind, array in index.arrays.items()},
+            'pinyin': bool(index.arrays['pinyin']),
+            'build_seconds': build_seconds,
+            'queries': len(inputs),
+            'mean_ms': sum(timings) / len(timings),
+            'p50_ms': _percentile(timings, 50),
+            'p95_ms': _percentile(timings, 95),
+            'p99_ms': _percentile(timings, 99),
+            'max_ms': max(timings),
+        }
+        if options['json']:
+            self.stdout.write(json.dumps(report, ensure_ascii=False, indent=2))
+            return
+        self.stdout.write(
+            f'{report["documents"]} 条记录，索引构建 {build_seconds:.3f}s，'
+            f'拼音{"已启用" if report["pinyin"] else "未启用（没有拼音表且未安装 pypinyin）"}'
+        )
+        self.stdout.write(
+            f'{report["queries"]} 次查询 mean={report["mean_ms"]:.3f}ms p50={report["p50_ms"]:.3f}ms '
+            f'p95={report["p95_ms"]:.3f}ms p99={report["p99_ms"]:.3f}ms max={report["max_ms"]:.3f}ms'
+        )
@@ -0,0 +1,113 @@
+import os
+import sys
+import json
+import time
+import tempfile
+
+from django.core.management.base import BaseCommand
+from django.http import JsonResponse
+from django.test import RequestFactory
+
+from api.synthetic import synthetic_herbs
+from api.tracing import Tracer, span
+
+
+def _percentile(values, pct):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(round(pct / 100.0 * (len(values) - 1))))]
+
+
+class Command(BaseCommand):
+    help = '测试搜索请求的调试输出开销：原有的 print 输出、关闭的请求记录、按采样率记录和全部记录'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000,
+                            help='每种方式的请求数')
+        parser.add_argument('--matches', type=int, default=50,
+                            help='每个请求匹配的药材数（决定 print 的行数和响应大小）')
+        parser.add_argument('--sample-rate', type=float, default=0.01,
+                            help='采样记录方式的采样率')
+        parser.add_argument('--sink', choices=('file', 'devnull', 'stdout'), default='file',
+                            help='print 输出的去向：临时文件（默认，相当于重定向到日志文件）、/dev/null 或标准输出')
+        parser.add_argument('--json', action='store_true',
+                            help='以JSON格式输出报告')
+
+    def handle(self, *args, **options):
+        herbs = synthetic_herbs(options['matches'])
+        sql = 'SELECT `中药数据库`.`药名`, `中药数据库`.`别名` FROM `中药数据库` WHERE `中药数据库`.`药名` LIKE %清热%'
+
+        if options['sink'] == 'stdout':
+            sink = sys.stdout
+        elif options['sink'] == 'devnull':
+            sink = open(os.devnull, 'w')
+        else:
+            sink = tempfile.NamedTemporaryFile('w', suffix='.log', delete=False)
+
+        def handle_request(request, prints=False):
+            """模拟搜索视图：匹配、整理结果、序列化"""
+            with span('match'):
+                matched = [herb for herb in herbs if herb['name']]
+            if prints:
+                # 原有视图对每个请求的输出
+                print(f"\n{'=' * 50}", file=sink)
+                print(f"搜索请求 关键词: 清热", file=sink)
+                print(f"\nSQL查询: {sql}", file=sink)
+                for herb in matched:
+                    print(f"  - 药名: {herb['name']}", file=sink)
+                    print(f"    别名: {herb['alias']}", file=sink)
+                    print(f"    功效分类: {herb['effect_class']}", file=sink)
+                print(f"\n执行的SQL: {sql}", file=sink)
+                print(f"耗时: 0.001秒", file=sink)
+                print(f"{'=' * 50}\n", file=sink)
+            with span('serialize'):
+                return JsonResponse({'success': True, 'data': matched, 'count': len(matched)})
+
+        variants = {
+            'baseline': handle_request,
+            'prints': lambda request: handle_request(request, prints=True),
+        }
+        for name, sample_rate in (('tracing_off', 0.0), ('tracing_sampled', options['sample_rate']),
+                                  ('tracing_all', 1.0)):
+            # 刷新间隔设得足够长，测试期间后台线程不写日志
+            tracer = Tracer(sample_rate=sample_rate, buffer_size=256, flush_interval=3600)
+            variants[name] = tracer.traced('bench')(handle_request)
+
+        factory = RequestFactory()
+        request = factory.post('/api/search/', {'keyword': '清热'}, content_type='application/json')
+        count = max(1, options['requests'])
+        report = {'requests': count, 'matches': len(herbs), 'sink': options['sink'], 'variants': {}}
+        try:
+            for name, view in variants.items():
+                for _ in range(min(100, count)):
+                    view(request)
+                timings = []
+                for _ in range(count):
+                    started = time.perf_counter()
+                    view(request)
+                    timings.append((time.perf_counter() - started) * 1e6)
+                report['variants'][name] = {
+                    'mean_us': sum(timings) / len(timings),
+                    'p50_us': _percentile(timings, 50),
+                    'p99_us': _percentile(timings, 99),
+                }
+        finally:
+            if sink is not sys.stdout:
+                sink.close()
+                if options['sink'] == 'file':
+                    os.unlink(sink.name)
+
+        baseline = report['variants']['baseline']['mean_us']
+        for stats in report['variants'].values():
+            stats['overhead_us'] = stats['mean_us'] - baseline
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, ensure_ascii=False, indent=2))
+            return
+        self.stdout.write(f'{count} 次请求，每次 {len(herbs)} 条结果，print 输出到 {options["sink"]}')
+        for name, stats in report['variants'].items():
+            self.stdout.write(
+                f'  {name:<16} mean={stats["mean_us"]:.1f}us p50={stats["p50_us"]:.1f}us '
+                f'p99={stats["p99_us"]:.1f}us 额外开销={stats["overhead_us"]:+.1f}us'
+            )
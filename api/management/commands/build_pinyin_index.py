@@ -0,0 +1,41 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api.models import Herb
+from api.pinyin import PinyinIndex, herb_texts, pinyin_available, pinyin_table
+
+
+class Command(BaseCommand):
+    help = '为全部药名和别名生成拼音转换表（含多音字读音），运行时无需安装 pypinyin'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default=None,
+                            help='输出路径，默认为 SEARCH_PINYIN_TABLE_PATH')
+
+    def handle(self, *args, **options):
+        if not pinyin_available():
+            raise CommandError('生成拼音表需要安装 pypinyin: pip install pypinyin')
+        output = options['output'] or getattr(settings, 'SEARCH_PINYIN_TABLE_PATH', None)
+        if not output:
+            raise CommandError('请通过 --output 或 SEARCH_PINYIN_TABLE_PATH 指定输出路径')
+
+        rows = list(Herb.objects.values_list('name', 'alias'))
+        if not rows:
+            raise CommandError('中药数据表为空')
+        texts = [text for name, alias in rows for text in herb_texts(name, alias)]
+
+        started = time.perf_counter()
+        count = pinyin_table.save(texts, output)
+        convert_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        index = PinyinIndex.build(rows=rows)
+        build_seconds = time.perf_counter() - started
+        stats = index.stats()
+        self.stdout.write(
+            f'{len(rows)} 味药材，{count} 个药名/别名，转换 {convert_seconds:.2f}s；'
+            f'索引 {stats["full_keys"]} 个全拼键、{stats["initial_keys"]} 个首字母键，构建 {build_seconds:.3f}s'
+        )
+        self.stdout.write(self.style.SUCCESS(f'拼音表已保存到 {output}'))
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from api.models import Herb
+from api.search_index import FULLTEXT_INDEX_NAME, fulltext_columns, fulltext_status
+
+
+class Command(BaseCommand):
+    help = '在中药数据表上创建（或删除）用于数据库分层搜索的 FULLTEXT(ngram) 索引（需要 MySQL 5.7.6+）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--drop', action='store_true',
+                            help='删除索引')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'mysql':
+            raise CommandError('FULLTEXT(ngram) 索引只支持 MySQL')
+        quote = connection.ops.quote_name
+        table = quote(Herb._meta.db_table)
+        if options['drop']:
+            sql = f'ALTER TABLE {table} DROP INDEX {quote(FULLTEXT_INDEX_NAME)}'
+        else:
+            columns = ', '.join(quote(column) for column in fulltext_columns())
+            sql = f'ALTER TABLE {table} ADD FULLTEXT INDEX {quote(FULLTEXT_INDEX_NAME)} ({columns}) WITH PARSER ngram'
+        self.stdout.write(sql)
+        with connection.cursor() as cursor:
+            cursor.execute(sql)
+        status = fulltext_status(refresh=True)
+        self.stdout.write(self.style.SUCCESS(
+            f'全文索引{"可用" if status["available"] else "已删除"}（ngram_token_size={status["token_size"]}）'
+        ))
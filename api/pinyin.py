@@ -0,0 +1,233 @@
+import os
+import json
+import bisect
+import logging
+import threading
+from array import array
+from itertools import islice, product
+
+from django.conf import settings
+
+from .dataset import DatasetIndex, split_aliases
+from .models import Herb
+
+logger = logging.getLogger(__name__)
+
+# pypinyin 为可选依赖：未安装时只能使用 build_pinyin_index 预先生成的拼音表
+try:
+    from pypinyin import Style, lazy_pinyin, pinyin
+except ImportError:
+    lazy_pinyin = None
+
+# 每个词最多保留的读音数（多音字的组合）
+MAX_VARIANTS = 8
+
+
+def pinyin_available():
+    return lazy_pinyin is not None
+
+
+def _convert(text, max_variants=MAX_VARIANTS):
+    """
+    用 pypinyin 计算词语的读音
+    Returns:
+        list: (全拼, 首字母) 列表，第一个为按词组判断的最常用读音，其后为多音字的其他组合
+    """
+    default = [syllable.lower() for syllable in lazy_pinyin(text, errors='default') if syllable.strip()]
+    if not default:
+        return []
+    candidates = [default]
+    readings = [
+        [reading.lower() for reading in choices if reading.strip()]
+        for choices in pinyin(text, style=Style.NORMAL, heteronym=True, errors='default')
+    ]
+    readings = [choices for choices in readings if choices]
+    if len(readings) == len(default):
+        candidates.extend(islice(product(*readings), max_variants * 4))
+    variants = []
+    seen = set()
+    for syllables in candidates:
+        full = ''.join(syllables)
+        if full not in seen:
+            seen.add(full)
+            variants.append((full, ''.join(syllable[0] for syllable in syllables)))
+            if len(variants) >= max_variants:
+                break
+    return variants
+
+
+class PinyinTable:
+    """
+    词语到拼音的转换表
+
+    优先使用 build_pinyin_index 生成的JSON文件，文件中没有的词再用 pypinyin 计算并缓存。
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self._table = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        table = {}
+        if self.path and os.path.exists(self.path):
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    table = {text: [tuple(variant) for variant in variants] for text, variants in json.load(f).items()}
+            except (OSError, ValueError) as e:
+                logger.error(f'Failed to load pinyin table {self.path}: {str(e)}')
+        return table
+
+    def variants(self, text):
+        """
+        词语的全部读音
+        Args:
+            text: 药名或单个别名
+        Returns:
+            list: (全拼, 首字母) 列表，小写、不含分隔符；无法转换时为空列表
+        """
+        if not text:
+            return []
+        if self._table is None:
+            with self._lock:
+                if self._table is None:
+                    self._table = self._load()
+        cached = self._table.get(text)
+        if cached is not None:
+            return cached
+        if lazy_pinyin is None:
+            return []
+        converted = _convert(text)
+        self._table[text] = converted
+        return converted
+
+    def save(self, texts, path=None):
+        """
+        计算并保存一组词语的拼音（需要 pypinyin）
+        Returns:
+            int: 保存的词语数
+        """
+        table = {text: _convert(text) for text in sorted(set(texts)) if text}
+        path = path or self.path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(table, f, ensure_ascii=False, separators=(',', ':'))
+        with self._lock:
+            self._table = table
+        return len(table)
+
+
+pinyin_table = PinyinTable(getattr(settings, 'SEARCH_PINYIN_TABLE_PATH', None))
+
+
+def to_pinyin(text):
+    """
+    词语最常用读音的拼音
+    Returns:
+        tuple: (全拼, 首字母)；无法转换时返回 None
+    """
+    variants = pinyin_table.variants(text)
+    return variants[0] if variants else None
+
+
+def is_pinyin_query(keyword):
+    """查询词是否只由字母（和空格）组成，可按拼音查询"""
+    compact = ''.join((keyword or '').split())
+    return bool(compact) and compact.isascii() and compact.isalpha()
+
+
+def herb_texts(name, alias):
+    """药名和拆分后的各个别名"""
+    return [name] + [text for text in split_aliases(alias) if text != name]
+
+
+class PinyinIndex:
+    """
+    药名和别名的拼音前缀索引
+
+    全拼和首字母各一个有序键列表，对应的词语编号存放在 array 中，
+    词语编号再对应到药材编号和是否为别名。查询时用二分查找定位前缀范围。
+    """
+
+    def __init__(self, names, text_docs, text_is_alias, full_keys, full_texts, initial_keys, initial_texts):
+        self.names = names
+        self.text_docs = text_docs
+        self.text_is_alias = text_is_alias
+        self.full_keys = full_keys
+        self.full_texts = full_texts
+        self.initial_keys = initial_keys
+        self.initial_texts = initial_texts
+
+    def __len__(self):
+        return len(self.names)
+
+    @classmethod
+    def build(cls, rows=None, table=None):
+        """
+        构建索引
+        Args:
+            rows: 可选的 (药名, 别名) 元组序列，默认从数据库读取
+            table: 拼音转换表，默认为 pinyin_table
+        """
+        table = table or pinyin_table
+        if rows is None:
+            rows = Herb.objects.values_list('name', 'alias').iterator()
+        names = []
+        text_docs = array('i')
+        text_is_alias = array('b')
+        full_entries, initial_entries = set(), set()
+        for doc, (name, alias) in enumerate(rows):
+            names.append(name)
+            for position, text in enumerate(herb_texts(name, alias)):
+                text_id = len(text_docs)
+                text_docs.append(doc)
+                text_is_alias.append(1 if position else 0)
+                for full, initials in table.variants(text):
+                    full_entries.add((full, text_id))
+                    initial_entries.add((initials, text_id))
+        full_entries = sorted(full_entries)
+        initial_entries = sorted(initial_entries)
+        return cls(
+            names, text_docs, text_is_alias,
+            [key for key, _ in full_entries], array('i', (text_id for _, text_id in full_entries)),
+            [key for key, _ in initial_entries], array('i', (text_id for _, text_id in initial_entries)),
+        )
+
+    def search(self, query, limit=None):
+        """
+        拼音前缀查询
+        Args:
+            query: 拼音或拼音首字母（如 "dangshen"、"ds"），忽略大小写和空格
+            limit: 最多返回的药材数，默认不限
+        Returns:
+            list: (药名, 匹配类型) 列表。全拼匹配在前、首字母匹配在后，
+                  同类中药名匹配在别名匹配之前，再按数据库默认顺序
+        """
+        query = ''.join(query.lower().split())
+        if not query:
+            return []
+        results = []
+        seen = set()
+        for kind, keys, texts in (('pinyin', self.full_keys, self.full_texts),
+                                  ('initials', self.initial_keys, self.initial_texts)):
+            start = bisect.bisect_left(keys, query)
+            end = bisect.bisect_left(keys, query + '\uffff', lo=start)
+            matched = sorted({(self.text_is_alias[text_id], self.text_docs[text_id]) for text_id in texts[start:end]})
+            for _, doc in matched:
+                if doc not in seen:
+                    seen.add(doc)
+                    results.append((self.names[doc], kind))
+                    if limit and len(results) >= limit:
+                        return results
+        return results
+
+    def stats(self):
+        return {
+            'documents': len(self.names),
+            'texts': len(self.text_docs),
+            'full_keys': len(self.full_keys),
+            'initial_keys': len(self.initial_keys),
+        }
+
+
+pinyin_index = DatasetIndex('pinyin', PinyinIndex.build)
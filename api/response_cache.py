@@ -0,0 +1,266 @@
+import json
+import time
+import hashlib
+import logging
+import threading
+from functools import wraps
+from collections import OrderedDict
+
+from django.conf import settings
+from django.http import HttpResponse
+
+from .dataset import dataset_version, served_versions
+from .tracing import span
+
+logger = logging.getLogger(__name__)
+
+# 缓存的响应中需要原样保留的头（如分类接口的跨域头、DRF的 Allow 和 Vary）
+_PRESERVED_HEADERS = ('Content-Type', 'Allow', 'Vary', 'Access-Control-Allow-Origin', 'Access-Control-Allow-Methods',
+                      'Access-Control-Allow-Headers', 'Access-Control-Max-Age')
+
+
+def normalize_params(request):
+    """
+    请求参数规范化：查询参数、POST的JSON请求体及其Content-Type、Accept头；只对键排序，值与视图读到的完全相同
+    （例如不去掉关键词首尾的空白，" 黄芪" 与 "黄芪" 的匹配结果不同）
+    Returns:
+        str: 规范化后的参数，无法解析时返回 None（不缓存）
+    """
+    params = {
+        'query': {key: request.GET.getlist(key) for key in request.GET},
+        # 同一请求按 Accept 可能渲染为JSON或可浏览的HTML页面
+        'accept': request.META.get('HTTP_ACCEPT', ''),
+    }
+    if request.method != 'GET':
+        try:
+            body = json.loads(request.body or b'{}')
+        except (ValueError, UnicodeDecodeError):
+            return None
+        if not isinstance(body, dict):
+            return None
+        params['body'] = body
+        params['content_type'] = request.META.get('CONTENT_TYPE', '')
+    return json.dumps(params, ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+
+
+def _cacheable(response):
+    """
+    只缓存成功的JSON响应：可浏览API的HTML页面（含CSRF令牌）不缓存；
+    分类接口以200返回的 success: False 错误（如数据库暂时不可用）不缓存
+    """
+    if response.status_code != 200 or response.streaming:
+        return False
+    if response.get('Content-Type', '').split(';')[0].strip() != 'application/json':
+        return False
+    data = getattr(response, 'data', None)
+    if data is None:
+        try:
+            data = json.loads(response.content)
+        except (ValueError, UnicodeDecodeError):
+            return False
+    return not (isinstance(data, dict) and data.get('success') is False)
+
+
+def _etag_matches(request, etag):
+    header = request.META.get('HTTP_IF_NONE_MATCH', '')
+    tags = {tag.strip() for tag in header.split(',') if tag.strip()}
+    return '*' in tags or etag in tags
+
+
+class ResponseCache:
+    """
+    中药查询接口的响应缓存
+
+    缓存键由接口名、规范化的请求参数和数据版本组成，数据表变化后旧条目不再被命中；
+    视图使用了与该版本不一致的索引（其他线程正在重建）时不保存响应。
+    第一层为进程内LRU（带TTL），第二层为可选的Django缓存后端（多个worker共享）。
+    每个响应带强ETag，客户端携带 If-None-Match 重新验证时返回304。
+    """
+
+    def __init__(self, max_entries=512, ttl=300, backend=None):
+        """
+        初始化缓存
+        Args:
+            max_entries: 进程内缓存的最大条目数
+            ttl: 缓存有效期（秒）
+            backend: Django缓存别名（settings.CACHES 中的键），为空时不启用共享层
+        """
+        self.max_entries = max(1, int(max_entries))
+        self.ttl = ttl
+        self.backend = backend
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (expires_at, entry)
+        self._counters = {
+            'memory_hits': 0,
+            'shared_hits': 0,
+            'misses': 0,
+            'not_modified': 0,
+            'stores': 0,
+            'stale_skips': 0,
+            'evictions': 0,
+            'shared_errors': 0,
+        }
+        self._timings = {'hit': [0, 0.0], 'miss': [0, 0.0]}  # 次数、总耗时（毫秒）
+
+    def _shared(self):
+        if not self.backend:
+            return None
+        from django.core.cache import caches
+
+        return caches[self.backend]
+
+    @staticmethod
+    def make_key(endpoint, params, version):
+        digest = hashlib.sha256(f'{version}\x00{params}'.encode('utf-8')).hexdigest()
+        return f'herb-response:{endpoint}:{digest}'
+
+    def _count(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+    def _observe(self, kind, elapsed_ms):
+        with self._lock:
+            self._timings[kind][0] += 1
+            self._timings[kind][1] += elapsed_ms
+
+    def get(self, key):
+        """
+        查询缓存（先进程内，再共享层）
+        Returns:
+            dict: 缓存的响应（status、body、etag、headers），未命中时返回 None
+        """
+        with self._lock:
+            item = self._entries.get(key)
+            if item is not None:
+                if item[0] >= time.monotonic():
+                    self._entries.move_to_end(key)
+                    self._counters['memory_hits'] += 1
+                    return item[1]
+                del self._entries[key]
+        shared = self._shared()
+        if shared is not None:
+            try:
+                entry = shared.get(key)
+            except Exception as e:
+                logger.error(f'Shared response cache read failed: {str(e)}')
+                self._count('shared_errors')
+                entry = None
+            if entry is not None:
+                self._memory_set(key, entry)
+                self._count('shared_hits')
+                return entry
+        self._count('misses')
+        return None
+
+    def _memory_set(self, key, entry):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, entry)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._counters['evictions'] += 1
+
+    def set(self, key, entry):
+        self._memory_set(key, entry)
+        shared = self._shared()
+        if shared is not None:
+            try:
+                shared.set(key, entry, self.ttl)
+            except Exception as e:
+                logger.error(f'Shared response cache write failed: {str(e)}')
+                self._count('shared_errors')
+        self._count('stores')
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """命中率、304次数及命中/未命中时的平均处理时间"""
+        with self._lock:
+            counters = dict(self._counters)
+            timings = {kind: list(values) for kind, values in self._timings.items()}
+            size = len(self._entries)
+        hits = counters['memory_hits'] + counters['shared_hits']
+        lookups = hits + counters['misses']
+        return {
+            'config': {
+                'max_entries': self.max_entries,
+                'ttl': self.ttl,
+                'backend': self.backend,
+            },
+            'entries': size,
+            'hits': hits,
+            'hit_rate': hits / lookups if lookups else 0.0,
+            'hit_mean_ms': timings['hit'][1] / timings['hit'][0] if timings['hit'][0] else 0.0,
+            'miss_mean_ms': timings['miss'][1] / timings['miss'][0] if timings['miss'][0] else 0.0,
+            **counters,
+        }
+
+    def _replay(self, request, entry):
+        """由缓存条目生成响应；客户端已有相同版本时返回304"""
+        if _etag_matches(request, entry['etag']):
+            self._count('not_modified')
+            response = HttpResponse(status=304)
+        else:
+            response = HttpResponse(entry['body'], status=entry['status'])
+        for header, value in entry['headers']:
+            response[header] = value
+        response['ETag'] = entry['etag']
+        response['Cache-Control'] = 'no-cache'
+        return response
+
+    def cached(self, endpoint):
+        """
+        视图装饰器：缓存成功（200、JSON、非 success: False）的响应
+        Args:
+            endpoint: 接口名，作为缓存键的一部分
+        """
+        def decorator(view):
+            @wraps(view)
+            def wrapper(request, *args, **kwargs):
+                if request.method not in ('GET', 'POST') or not getattr(settings, 'SEARCH_CACHE_ENABLED', True):
+                    return view(request, *args, **kwargs)
+                params = normalize_params(request)
+                if params is None:
+                    return view(request, *args, **kwargs)
+                started = time.perf_counter()
+                with span('cache'):
+                    version = dataset_version.current()
+                    key = self.make_key(endpoint, json.dumps([args, kwargs, params], ensure_ascii=False), version)
+                    entry = self.get(key)
+                if entry is not None:
+                    response = self._replay(request, entry)
+                    self._observe('hit', (time.perf_counter() - started) * 1000)
+                    return response
+
+                with served_versions() as served:
+                    response = view(request, *args, **kwargs)
+                if hasattr(response, 'render') and not getattr(response, 'is_rendered', True):
+                    with span('serialize'):
+                        response.render()
+                if not _cacheable(response):
+                    return response
+                if served - {version}:
+                    # 结果来自旧版本的索引，不能以新版本的缓存键保存
+                    self._count('stale_skips')
+                    return response
+                entry = {
+                    'status': response.status_code,
+                    'body': response.content,
+                    'etag': '"' + hashlib.sha256(response.content).hexdigest()[:32] + '"',
+                    'headers': [(header, response[header]) for header in _PRESERVED_HEADERS if response.has_header(header)],
+                }
+                self.set(key, entry)
+                response = self._replay(request, entry)
+                self._observe('miss', (time.perf_counter() - started) * 1000)
+                return response
+            return wrapper
+        return decorator
+
+
+response_cache = ResponseCache(
+    max_entries=getattr(settings, 'SEARCH_CACHE_MAX_ENTRIES', 512),
+    ttl=getattr(settings, 'SEARCH_CACHE_TTL', 300),
+    backend=getattr(settings, 'SEARCH_CACHE_BACKEND', None),
+)
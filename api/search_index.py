@@ -0,0 +1,273 @@
+import re
+import logging
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import DatabaseError, connection
+from django.db.models import BooleanField, Case, IntegerField, Q, Value, When
+from django.db.models.expressions import RawSQL
+
+from .bm25 import bm25_index
+from .dataset import DatasetIndex
+from .facets import facet_index
+from .models import Herb
+from .pinyin import is_pinyin_query, pinyin_index
+from .suggest import suggest_index
+
+logger = logging.getLogger(__name__)
+
+# 分层匹配：药名 > 别名 > 其他字段，与原有搜索的排序一致
+TIERS = (
+    ('name', ('name',)),
+    ('alias', ('alias',)),
+    ('other', ('effect', 'indication', 'effect_class', 'taste', 'meridian')),
+)
+INDEXED_FIELDS = tuple(field for _, fields in TIERS for field in fields)
+
+# 同一层的多个字段拼接时使用的分隔符，保证匹配不会跨越字段
+_FIELD_SEPARATOR = '\x00'
+
+
+def _grams(text):
+    """文本中的单字和相邻两字（去重）"""
+    grams = set(text)
+    grams.update(text[i:i + 2] for i in range(len(text) - 1))
+    return grams
+
+
+def _query_grams(keyword):
+    """查询词用于查倒排表的n-gram：两字及以上只用相邻两字，单字时用单字"""
+    if len(keyword) == 1:
+        return {keyword}
+    return {keyword[i:i + 2] for i in range(len(keyword) - 1)}
+
+
+class NgramIndex:
+    """
+    中药数据的字符n-gram倒排索引
+
+    每一层（药名、别名、其他字段）对小写后的文本建立单字和两字倒排表，
+    查询时对查询词的两字n-gram求交集得到候选，再做子串校验，结果与 icontains 查询一致。
+    文档按数据库默认顺序（主键顺序）编号，同一层内的结果保持该顺序。
+    """
+
+    def __init__(self, names, texts, postings):
+        self.names = names
+        self.texts = texts
+        self.postings = postings
+
+    def __len__(self):
+        return len(self.names)
+
+    @classmethod
+    def build(cls, rows=None):
+        """
+        构建索引
+        Args:
+            rows: 可选的 (name, alias, effect, ...) 元组序列，默认从数据库读取 INDEXED_FIELDS
+        """
+        if rows is None:
+            # 文档编号即层内排序：按主键（药名）顺序，与原有查询（InnoDB按聚簇主键扫描）及数据库分层搜索一致
+            rows = Herb.objects.order_by('pk').values_list(*INDEXED_FIELDS).iterator()
+        names = []
+        texts = {tier: [] for tier, _ in TIERS}
+        postings = {tier: defaultdict(list) for tier, _ in TIERS}
+        for doc, row in enumerate(rows):
+            values = dict(zip(INDEXED_FIELDS, row))
+            names.append(values['name'])
+            for tier, fields in TIERS:
+                parts = [(values[field] or '').lower() for field in fields]
+                texts[tier].append(_FIELD_SEPARATOR.join(parts))
+                grams = set()
+                for part in parts:
+                    grams.update(_grams(part))
+                for gram in grams:
+                    postings[tier][gram].append(doc)
+        return cls(names, texts, {tier: dict(table) for tier, table in postings.items()})
+
+    def _candidates(self, tier, grams):
+        """各n-gram倒排表的交集（从最短的表开始）"""
+        table = self.postings[tier]
+        lists = []
+        for gram in grams:
+            docs = table.get(gram)
+            if not docs:
+                return []
+            lists.append(docs)
+        lists.sort(key=len)
+        if len(lists) == 1:
+            return lists[0]
+        candidates = set(lists[0])
+        for docs in lists[1:]:
+            candidates.intersection_update(docs)
+            if not candidates:
+                return []
+        return sorted(candidates)
+
+    def search(self, keyword):
+        """
+        分层搜索
+        Args:
+            keyword: 搜索关键词
+        Returns:
+            list: (药名, 匹配层) 列表，按 药名 > 别名 > 其他字段 排序，同层内按数据库默认顺序
+        """
+        keyword = keyword.lower()
+        if not keyword:
+            return []
+        grams = _query_grams(keyword)
+        seen = set()
+        results = []
+        for tier, _ in TIERS:
+            texts = self.texts[tier]
+            for doc in self._candidates(tier, grams):
+                if doc not in seen and keyword in texts[doc]:
+                    seen.add(doc)
+                    results.append((self.names[doc], tier))
+        return results
+
+
+ngram_index = DatasetIndex('ngram', NgramIndex.build)
+
+
+# MySQL FULLTEXT（ngram 分词）索引，由 create_search_fulltext_index 命令创建
+FULLTEXT_INDEX_NAME = 'herb_search_fulltext'
+
+# 只由汉字组成的查询词才走全文索引（ngram 分词会在标点、空格处断开，英文词受停用词影响）
+_FULLTEXT_KEYWORD = re.compile(r'^[一-鿿]+$')
+
+_fulltext_status = None
+_fulltext_lock = threading.Lock()
+
+
+def fulltext_columns():
+    """全文索引覆盖的数据库列（与 INDEXED_FIELDS 对应）"""
+    return [Herb._meta.get_field(field).column for field in INDEXED_FIELDS]
+
+
+def fulltext_status(refresh=False):
+    """
+    检查数据库是否有覆盖全部搜索字段的 FULLTEXT 索引（结果在进程内缓存，全文查询失败时重新检查）
+    Returns:
+        dict: available（是否可用）和 token_size（ngram 分词长度）
+    """
+    global _fulltext_status
+    if _fulltext_status is not None and not refresh:
+        return _fulltext_status
+    with _fulltext_lock:
+        status = {'available': False, 'token_size': 2}
+        if connection.vendor == 'mysql' and getattr(settings, 'SEARCH_DATABASE_FULLTEXT', True):
+            try:
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        'SELECT COUNT(DISTINCT COLUMN_NAME) FROM information_schema.STATISTICS '
+                        'WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND INDEX_NAME = %s '
+                        "AND INDEX_TYPE = 'FULLTEXT'",
+                        [Herb._meta.db_table, FULLTEXT_INDEX_NAME]
+                    )
+                    status['available'] = cursor.fetchone()[0] == len(INDEXED_FIELDS)
+                    if status['available']:
+                        cursor.execute('SELECT @@ngram_token_size')
+                        status['token_size'] = int(cursor.fetchone()[0])
+            except Exception as e:
+                logger.warning(f'无法检查全文索引，使用 LIKE 查询: {str(e)}')
+        _fulltext_status = status
+        return status
+
+
+def _fulltext_condition(keyword):
+    """MATCH ... AGAINST 短语查询条件，只用于缩小候选范围，结果仍由 LIKE 校验"""
+    columns = ', '.join(connection.ops.quote_name(column) for column in fulltext_columns())
+    return RawSQL(
+        f'MATCH ({columns}) AGAINST (%s IN BOOLEAN MODE)',
+        [f'"{keyword}"'],
+        output_field=BooleanField()
+    )
+
+
+def search_names_database(keyword, use_fulltext=None):
+    """
+    在数据库中分层搜索（LIKE '%关键词%'），内存索引不可用时使用，也用于校验索引结果。
+    一条SQL完成：用 CASE 计算匹配层（药名 > 别名 > 其他字段），按层和主键排序，只取药名和层；
+    有全文索引且查询词适合时，先用 MATCH ... AGAINST 缩小候选范围
+    Args:
+        keyword: 搜索关键词
+        use_fulltext: 是否使用全文索引，默认自动判断
+    Returns:
+        list: (药名, 匹配层) 列表
+    """
+    tier_names = [tier for tier, _ in TIERS]
+    conditions = []
+    for tier, fields in TIERS:
+        condition = Q()
+        for field in fields:
+            condition |= Q(**{f'{field}__icontains': keyword})
+        conditions.append((tier, condition))
+
+    any_match = Q()
+    for _, condition in conditions:
+        any_match |= condition
+    queryset = Herb.objects.filter(any_match)
+
+    def _rows(queryset):
+        rows = queryset.annotate(match_tier=Case(
+            *[When(condition, then=Value(position)) for position, (_, condition) in enumerate(conditions[:-1])],
+            default=Value(len(conditions) - 1),
+            output_field=IntegerField()
+        )).order_by('match_tier', 'pk').values_list('name', 'match_tier')
+        return [(name, tier_names[position]) for name, position in rows]
+
+    if use_fulltext is None:
+        status = fulltext_status()
+        use_fulltext = (
+            status['available'] and len(keyword) >= status['token_size'] and bool(_FULLTEXT_KEYWORD.match(keyword))
+        )
+    if use_fulltext:
+        try:
+            return _rows(queryset.filter(_fulltext_condition(keyword)))
+        except DatabaseError as e:
+            # 全文索引在运行期间被删除或重建：重新检查索引状态，本次改用 LIKE 查询
+            logger.warning(f'全文索引查询失败，改用 LIKE 查询: {str(e)}')
+            fulltext_status(refresh=True)
+    return _rows(queryset)
+
+
+def _search_tiers(keyword):
+    """分层搜索药名：启用内存索引时使用索引，否则（或索引构建失败时）查询数据库"""
+    if getattr(settings, 'SEARCH_INDEX_ENABLED', True):
+        try:
+            return ngram_index.get().search(keyword)
+        except Exception as e:
+            logger.error(f'搜索索引不可用，改为查询数据库: {str(e)}')
+    return search_names_database(keyword)
+
+
+def search_names(keyword):
+    """
+    分层搜索药名；查询词为字母时，药名或别名的拼音匹配排在其他字段的匹配之前
+    Returns:
+        list: (药名, 匹配层) 列表
+    """
+    results = _search_tiers(keyword)
+    if not is_pinyin_query(keyword):
+        return results
+    try:
+        pinyin_results = pinyin_index.get().search(keyword)
+    except Exception as e:
+        logger.error(f'拼音索引不可用: {str(e)}')
+        return results
+    matched = {name for name, _ in results}
+    head = [item for item in results if item[1] != 'other']
+    tail = [item for item in results if item[1] == 'other']
+    return head + [(name, tier) for name, tier in pinyin_results if name not in matched] + tail
+
+
+def preload():
+    """服务启动时在后台构建搜索索引"""
+    if getattr(settings, 'SEARCH_INDEX_ENABLED', True):
+        ngram_index.preload()
+        bm25_index.preload()
+        suggest_index.preload()
+        pinyin_index.preload()
+        facet_index.preload()
@@ -0,0 +1,252 @@
+import re
+import time
+import bisect
+import logging
+import threading
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import transaction
+
+from .dataset import DatasetIndex
+from .models import Herb
+from .pinyin import herb_texts, pinyin_table
+
+logger = logging.getLogger(__name__)
+
+# 匹配类型，按优先级排列：药名前缀 > 别名前缀 > 拼音前缀 > 拼音首字母 > 药名中间 > 功效分类前缀
+MATCH_KINDS = ('name', 'alias', 'pinyin', 'initials', 'infix', 'effect_class')
+
+# 建议结果中返回的字段
+SUGGEST_FIELDS = ('name', 'alias', 'effect_class', 'effect', 'taste', 'meridian')
+
+# 每种匹配类型最多检查的候选数，保证短前缀（如单个字母）的查询时间有上限
+_SCAN_LIMIT = 1000
+
+# 查询结果缓存的最大条目数（逐字输入时短前缀会被反复查询）
+_CACHE_SIZE = 4096
+
+
+def normalize(keyword):
+    """查询词小写并去掉空白（便于输入 "dang shen" 这样的拼音）"""
+    return re.sub(r'\s+', '', keyword or '').lower()
+
+
+class Popularity:
+    """
+    药材热度（本进程内的详情查看和建议选中次数）
+
+    排序使用的热度每隔 refresh_interval 秒（且期间有新的查看时）才更新一次，
+    不会因为每次查看详情都让全部搜索建议缓存失效。
+    """
+
+    def __init__(self, refresh_interval=60):
+        self.refresh_interval = refresh_interval
+        self._counts = Counter()
+        self._ranking = {}  # 最近一次更新时的热度快照，排序只使用快照
+        self._dirty = False
+        self._next_refresh = 0.0
+        self._version = 0
+        self._lock = threading.Lock()
+
+    def record(self, name):
+        with self._lock:
+            self._counts[name] += 1
+            self._dirty = True
+
+    @property
+    def version(self):
+        """排序热度的版本，快照更新后改变（搜索建议缓存据此失效）"""
+        if self._dirty and time.monotonic() >= self._next_refresh:
+            with self._lock:
+                if self._dirty:
+                    self._ranking = dict(self._counts)
+                    self._dirty = False
+                    self._next_refresh = time.monotonic() + self.refresh_interval
+                    self._version += 1
+        return self._version
+
+    def get(self, name):
+        return self._ranking.get(name, 0)
+
+    def most_common(self, n=10):
+        with self._lock:
+            return self._counts.most_common(n)
+
+
+popularity = Popularity(getattr(settings, 'SUGGEST_POPULARITY_REFRESH', 60))
+
+
+def _entries(values):
+    """
+    一条记录的全部前缀匹配项
+    Args:
+        values: 字段名到值的dict（包含 SUGGEST_FIELDS）
+    Returns:
+        list: (匹配类型, 键, 被匹配的原文)
+    """
+    name = values['name']
+    texts = herb_texts(name, values.get('alias'))
+    entries = [('name', name.lower(), name)]
+    entries.extend(('alias', alias.lower(), alias) for alias in texts[1:])
+    # 多音字的每种读音都可以匹配
+    for text in texts:
+        for full, initials in pinyin_table.variants(text):
+            entries.append(('pinyin', full, text))
+            entries.append(('initials', initials, text))
+    entries.extend(('infix', name[i:].lower(), name) for i in range(1, len(name)))
+    if values.get('effect_class'):
+        entries.append(('effect_class', values['effect_class'].lower(), values['effect_class']))
+    return entries
+
+
+class SuggestIndex:
+    """
+    搜索建议的有序前缀数组
+
+    每种匹配类型一个按键排序的 (键, 药名, 原文) 列表，前缀查询用二分查找定位，
+    结果按匹配类型、热度、药名长度排序并缓存。单条记录修改时可增删，不需要整体重建：
+    修改在数组副本上进行后替换引用（写时复制），进行中的查询不加锁也不会读到修改到一半的数组。
+    """
+
+    def __init__(self):
+        self.arrays = {kind: [] for kind in MATCH_KINDS}
+        self.details = {}
+        self._cache = {}
+
+    def __len__(self):
+        return len(self.details)
+
+    @classmethod
+    def build(cls, rows=None):
+        """
+        构建索引
+        Args:
+            rows: 可选的与 SUGGEST_FIELDS 顺序一致的元组序列，默认从数据库读取
+        """
+        if rows is None:
+            rows = Herb.objects.values_list(*SUGGEST_FIELDS).iterator()
+        index = cls()
+        for row in rows:
+            values = dict(zip(SUGGEST_FIELDS, row))
+            index.details[values['name']] = index._detail(values)
+            for kind, key, text in _entries(values):
+                index.arrays[kind].append((key, values['name'], text))
+        for array in index.arrays.values():
+            array.sort()
+        return index
+
+    @staticmethod
+    def _detail(values):
+        """建议结果中展示的字段（功效截断为100字）"""
+        effect = values.get('effect')
+        return {
+            'name': values['name'],
+            'alias': values.get('alias') or '',
+            'effect_class': values.get('effect_class') or '',
+            'effect': effect[:100] + '...' if effect and len(effect) > 100 else effect,
+            'taste': values.get('taste') or '',
+            'meridian': values.get('meridian') or '',
+        }
+
+    def add(self, values):
+        """新增或更新一条记录"""
+        self._update(values['name'], values)
+
+    def remove(self, name):
+        """删除一条记录"""
+        self._update(name, None)
+
+    def _update(self, name, values):
+        """
+        在受影响的数组副本上删除旧的匹配项、插入新的匹配项，再替换引用
+        （修改由 DatasetIndex.apply_change 在锁内串行执行）
+        """
+        previous = self.details.get(name)
+        if previous is None and values is None:
+            return
+        changes = defaultdict(lambda: ([], []))  # 匹配类型 -> (删除的项, 新增的项)
+        if previous is not None:
+            for kind, key, text in _entries(previous):
+                changes[kind][0].append((key, name, text))
+        if values is not None:
+            for kind, key, text in _entries(values):
+                changes[kind][1].append((key, name, text))
+
+        arrays = dict(self.arrays)
+        for kind, (removed, added) in changes.items():
+            array = list(arrays[kind])
+            for item in removed:
+                position = bisect.bisect_left(array, item)
+                if position < len(array) and array[position] == item:
+                    del array[position]
+            for item in added:
+                bisect.insort(array, item)
+            arrays[kind] = array
+        details = dict(self.details)
+        if values is None:
+            details.pop(name, None)
+        else:
+            details[name] = self._detail(values)
+        # 先替换数组再替换缓存：查询先取缓存再取数组，取到新缓存的查询一定使用新数组，
+        # 用旧数组得到的结果只会写入被丢弃的旧缓存
+        self.arrays = arrays
+        self.details = details
+        self._cache = {}
+
+    def search(self, keyword, limit=10):
+        """
+        前缀查询
+        Args:
+            keyword: 用户输入
+            limit: 最多返回的药材数
+        Returns:
+            list: (药名, 匹配类型, 被匹配的原文) 列表，每个药材只出现一次
+        """
+        prefix = normalize(keyword)
+        if not prefix:
+            return []
+        # 缓存的结果在索引修改（替换缓存）或热度快照更新后失效；顺序见 _update
+        cache = self._cache
+        arrays = self.arrays
+        version = popularity.version
+        cached = cache.get((prefix, limit))
+        if cached is not None and cached[0] == version:
+            return list(cached[1])
+        results = []
+        seen = set()
+        for kind in MATCH_KINDS:
+            array = arrays[kind]
+            start = bisect.bisect_left(array, (prefix,))
+            candidates = {}
+            for position in range(start, min(len(array), start + _SCAN_LIMIT)):
+                key, name, text = array[position]
+                if not key.startswith(prefix):
+                    break
+                if name not in seen and name not in candidates:
+                    candidates[name] = text
+            ranked = sorted(candidates, key=lambda name: (-popularity.get(name), len(name), name))
+            for name in ranked[:limit - len(results)]:
+                seen.add(name)
+                results.append((name, kind, candidates[name]))
+            if len(results) >= limit:
+                break
+        if len(cache) >= _CACHE_SIZE:
+            cache.clear()
+        cache[(prefix, limit)] = (version, results)
+        return list(results)
+
+
+suggest_index = DatasetIndex('suggest', SuggestIndex.build)
+
+
+def herb_saved(sender, instance, **kwargs):
+    """记录保存的事务提交后更新建议索引（post_save 信号处理函数），回滚的修改不进入索引"""
+    values = {field: getattr(instance, field) for field in SUGGEST_FIELDS}
+    transaction.on_commit(lambda: suggest_index.apply_change(lambda index: index.add(values)))
+
+
+def herb_deleted(sender, instance, **kwargs):
+    """记录删除的事务提交后更新建议索引（post_delete 信号处理函数）"""
+    name = instance.name
+    transaction.on_commit(lambda: suggest_index.apply_change(lambda index: index.remove(name)))
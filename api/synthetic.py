@@ -0,0 +1,48 @@
+import random
+
+# 合成数据使用的词汇（取自常见中药的性味、归经和功效描述）
+TASTES = ['甘', '苦', '辛', '酸', '咸', '涩', '淡']
+NATURES = ['寒', '微寒', '凉', '平', '温', '微温', '热']
+MERIDIANS = ['肝', '心', '脾', '肺', '肾', '胃', '胆', '大肠', '小肠', '膀胱', '心包', '三焦']
+EFFECT_CLASSES = ['解表药', '清热药', '泻下药', '祛风湿药', '化湿药', '利水渗湿药', '温里药', '理气药',
+                  '消食药', '止血药', '活血化瘀药', '化痰止咳平喘药', '安神药', '平肝息风药', '补虚药', '收涩药']
+EFFECTS = ['清热解毒', '疏散风热', '凉血止血', '活血化瘀', '补气养血', '健脾益气', '滋阴润燥', '温中散寒',
+           '理气止痛', '消肿散结', '利水渗湿', '祛风除湿', '化痰止咳', '安神定志', '平肝潜阳', '收敛固涩',
+           '润肠通便', '消食化积', '补肾助阳', '养阴生津']
+SYMPTOMS = ['痈肿疮毒', '风热感冒', '咽喉肿痛', '血热吐衄', '跌打损伤', '月经不调', '脾虚食少', '心悸失眠',
+            '头痛眩晕', '咳嗽痰多', '水肿尿少', '风湿痹痛', '肠燥便秘', '食积不化', '腰膝酸软', '久泻久痢']
+PHARMACOLOGY = ['抗菌', '抗病毒', '抗炎', '解热', '镇痛', '镇静', '降血压', '降血糖', '调节免疫', '抗肿瘤',
+                '保肝', '利尿', '止咳', '平喘', '抗氧化', '改善微循环']
+NAME_CHARS = '金银花连翘黄芩柏芍药当归川芎地丹参党白术茯苓甘草陈皮半夏枳实厚朴桂枝麻生姜葛根柴胡升防风羌活独'
+
+
+def synthetic_herbs(count, seed=0):
+    """
+    生成合成中药数据，用于索引和检索的性能测试
+    Args:
+        count: 记录数
+        seed: 随机种子
+    Returns:
+        list: 每条记录为字段名到值的dict（字段名与 Herb 模型一致，没有别名时 alias 为 None）
+    """
+    rng = random.Random(seed)
+    herbs = []
+    for index in range(count):
+        name = ''.join(rng.choice(NAME_CHARS) for _ in range(rng.randint(2, 3))) + str(index)
+        tastes = '、'.join(rng.sample(TASTES, rng.randint(1, 2)))
+        meridians = '、'.join(rng.sample(MERIDIANS, rng.randint(1, 3))) + '经'
+        effects = rng.sample(EFFECTS, rng.randint(1, 3))
+        symptoms = rng.sample(SYMPTOMS, rng.randint(2, 5))
+        herbs.append({
+            'name': name,
+            'alias': '、'.join(
+                ''.join(rng.choice(NAME_CHARS) for _ in range(rng.randint(2, 4))) for _ in range(rng.randint(0, 3))
+            ) or None,
+            'taste': f'{tastes}，{rng.choice(NATURES)}',
+            'meridian': f'归{meridians}',
+            'effect': '，'.join(effects) + '。',
+            'indication': '用于' + '，'.join(symptoms) + '。',
+            'effect_class': rng.choice(EFFECT_CLASSES),
+            'pharmacology': '本品具有' + '、'.join(rng.sample(PHARMACOLOGY, rng.randint(2, 6))) + '等作用。' * rng.randint(1, 4),
+        })
+    return herbs
@@ -0,0 +1,227 @@
+import json
+from unittest import mock
+
+from django.db import DatabaseError, connection, transaction
+from django.http import HttpResponse, JsonResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+
+from api.bm25 import FIELDS, BM25Index
+from api.dataset import DatasetIndex, dataset_version
+from api.models import Herb
+from api.response_cache import ResponseCache, _cacheable, normalize_params
+from api.search_index import NgramIndex, fulltext_status, search_names_database
+from api.suggest import SUGGEST_FIELDS, Popularity, SuggestIndex, suggest_index
+
+HERBS = [
+    {'name': '金银花', 'alias': '忍冬花', 'effect': '清热解毒，疏散风热', 'effect_class': '清热药'},
+    {'name': '连翘', 'alias': '清热连', 'effect': '消肿散结', 'effect_class': '清热药'},
+    {'name': '清热草', 'alias': None, 'effect': '凉血止血', 'effect_class': '止血药'},
+    {'name': '黄芩', 'alias': '腐肠', 'effect': '清热燥湿，泻火解毒', 'effect_class': '清热药'},
+    {'name': '当归', 'alias': '干归', 'effect': '补血活血', 'effect_class': '补虚药'},
+    {'name': '白清热', 'alias': None, 'effect': '补气', 'effect_class': '补虚药'},
+]
+
+
+class DatabaseSearchTests(TestCase):
+    """数据库分层搜索（mode=sql）：一条SQL完成，结果与内存索引一致"""
+
+    @classmethod
+    def setUpClass(cls):
+        # 中药表为 managed=False，测试数据库中需手动建表；MySQL 的DDL会隐式提交，须在测试事务开始前执行
+        with connection.schema_editor() as editor:
+            editor.create_model(Herb)
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        with connection.schema_editor() as editor:
+            editor.delete_model(Herb)
+
+    @classmethod
+    def setUpTestData(cls):
+        Herb.objects.bulk_create([Herb(**values) for values in HERBS])
+
+    def setUp(self):
+        # 全文索引状态在进程内缓存，先检查一次，使后面的查询计数只包含搜索本身
+        fulltext_status(refresh=True)
+
+    def expected(self, tiers):
+        """按 药名 > 别名 > 其他字段 分层，层内按主键顺序（与数据库排序规则一致）"""
+        order = list(Herb.objects.order_by('pk').values_list('name', flat=True))
+        return [(name, tier) for tier in ('name', 'alias', 'other') for name in order if tiers.get(name) == tier]
+
+    def test_search_is_single_query(self):
+        with self.assertNumQueries(1):
+            results = search_names_database('清热')
+        self.assertEqual(results, self.expected({
+            '清热草': 'name', '白清热': 'name', '连翘': 'alias', '金银花': 'other', '黄芩': 'other',
+        }))
+
+    def test_search_without_matches_is_single_query(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(search_names_database('不存在的药材'), [])
+
+    def test_search_matches_ngram_index_order(self):
+        index = NgramIndex.build()
+        for keyword in ('清热', '热', '补', '归', '解毒'):
+            self.assertEqual(search_names_database(keyword), index.search(keyword), keyword)
+
+    def test_fulltext_failure_falls_back_to_like(self):
+        # 测试表上没有全文索引，MATCH 查询失败后应重新检查索引状态并改用 LIKE 查询
+        expected = search_names_database('清热', use_fulltext=False)
+        self.assertEqual(search_names_database('清热', use_fulltext=True), expected)
+        self.assertFalse(fulltext_status()['available'])
+
+    @override_settings(SEARCH_CACHE_ENABLED=False)
+    def test_sql_mode_view_queries(self):
+        # 一条分层搜索查询，加上取出当前页记录的一条查询
+        with self.assertNumQueries(2):
+            response = self.client.post(
+                '/api/search/', {'keyword': '清热', 'mode': 'sql'}, content_type='application/json'
+            )
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['count'], 5)
+        self.assertEqual([herb['name'] for herb in data['data']], [name for name, _ in search_names_database('清热')])
+
+    def test_rolled_back_save_does_not_update_suggestions(self):
+        # 建议索引和数据版本在事务提交后才更新，回滚的修改不留下建议
+        with self.captureOnCommitCallbacks() as callbacks:
+            try:
+                with transaction.atomic():
+                    Herb.objects.create(name='人参', effect_class='补虚药')
+                    raise DatabaseError('rollback')
+            except DatabaseError:
+                pass
+        self.assertEqual(callbacks, [])
+        self.assertEqual(suggest_index.get().search('人参', 10), [])
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            Herb.objects.create(name='人参', effect_class='补虚药')
+        self.assertTrue(callbacks)
+        self.assertEqual([name for name, _, _ in suggest_index.get().search('人参', 10)], ['人参'])
+
+
+class SuggestTests(SimpleTestCase):
+    """搜索建议索引：写时复制的增删，热度按间隔更新"""
+
+    def build(self, herbs):
+        return SuggestIndex.build(rows=[tuple(herb.get(field) for field in SUGGEST_FIELDS) for herb in herbs])
+
+    def test_update_replaces_arrays_instead_of_mutating(self):
+        index = self.build(HERBS)
+        arrays = index.arrays
+        snapshot = {kind: list(array) for kind, array in arrays.items()}
+        index.remove('连翘')
+        index.add({'name': '连钱草', 'effect_class': '利水渗湿药'})
+        # 进行中的查询持有的旧数组不变
+        self.assertEqual({kind: list(array) for kind, array in arrays.items()}, snapshot)
+        self.assertEqual([name for name, _, _ in index.search('连', 10)], ['连钱草'])
+        self.assertNotIn('连翘', index.details)
+        for array in index.arrays.values():
+            self.assertEqual(array, sorted(array))
+
+    def test_update_matches_rebuild(self):
+        index = self.build(HERBS)
+        index.add({'name': '黄芩', 'alias': '子芩', 'effect_class': '清热药'})
+        index.remove('当归')
+        herbs = [herb for herb in HERBS if herb['name'] not in ('黄芩', '当归')]
+        herbs.append({'name': '黄芩', 'alias': '子芩', 'effect_class': '清热药'})
+        rebuilt = self.build(herbs)
+        self.assertEqual(index.arrays, rebuilt.arrays)
+        self.assertEqual(index.details, rebuilt.details)
+
+    def test_popularity_refreshes_after_interval(self):
+        popularity = Popularity(refresh_interval=3600)
+        popularity.record('当归')
+        version = popularity.version
+        self.assertEqual(popularity.get('当归'), 1)
+        # 间隔内的查看不改变排序，也不让缓存失效
+        popularity.record('当归')
+        self.assertEqual(popularity.version, version)
+        self.assertEqual(popularity.get('当归'), 1)
+        popularity._next_refresh = 0.0
+        self.assertEqual(popularity.version, version + 1)
+        self.assertEqual(popularity.get('当归'), 2)
+
+
+class BM25Tests(SimpleTestCase):
+    """BM25 检索：两字词索引之外，单字查询在单字倒排表中检索"""
+
+    def build(self, herbs):
+        return BM25Index.build(rows=[tuple(herb.get(field) for field in FIELDS) for herb in herbs])
+
+    def test_single_character_query_matches_inside_words(self):
+        index = self.build([
+            {'name': '人参', 'taste': '甘、微苦，微温'},
+            {'name': '党参', 'taste': '甘，平'},
+            {'name': '黄连', 'taste': '苦，寒'},
+            {'name': '当归', 'taste': '甘、辛，温'},
+        ])
+        self.assertEqual({name for name, _ in index.search('参')}, {'人参', '党参'})
+        self.assertEqual({name for name, _ in index.search('苦')}, {'人参', '黄连'})
+
+    def test_multi_character_query_uses_bigrams(self):
+        index = self.build([
+            {'name': '人参', 'effect': '大补元气'},
+            {'name': '参三七', 'effect': '散瘀止血'},
+        ])
+        self.assertEqual([name for name, _ in index.search('人参')], ['人参'])
+
+
+class ResponseCacheTests(SimpleTestCase):
+    """响应缓存：参数规范化、可缓存的响应，以及重建期间旧索引的结果不保存"""
+
+    def setUp(self):
+        self.factory = RequestFactory()
+
+    def test_normalize_params_sorts_keys_only(self):
+        first = self.factory.post('/api/search/', json.dumps({'keyword': '黄芪', 'mode': 'tier'}),
+                                  content_type='application/json')
+        second = self.factory.post('/api/search/', json.dumps({'mode': 'tier', 'keyword': '黄芪'}),
+                                   content_type='application/json')
+        self.assertEqual(normalize_params(first), normalize_params(second))
+        # 值原样保留：首尾空白、Accept 头都会改变响应
+        padded = self.factory.post('/api/search/', json.dumps({'keyword': ' 黄芪', 'mode': 'tier'}),
+                                   content_type='application/json')
+        self.assertNotEqual(normalize_params(first), normalize_params(padded))
+        html = self.factory.get('/api/herb/黄芪/', HTTP_ACCEPT='text/html')
+        self.assertNotEqual(normalize_params(html), normalize_params(self.factory.get('/api/herb/黄芪/')))
+
+    def test_normalize_params_rejects_non_json_body(self):
+        self.assertIsNone(normalize_params(self.factory.post('/api/search/', 'keyword=x',
+                                                             content_type='text/plain')))
+        self.assertIsNone(normalize_params(self.factory.post('/api/search/', '[1]', content_type='application/json')))
+
+    def test_cacheable(self):
+        self.assertTrue(_cacheable(JsonResponse({'success': True, 'data': []})))
+        self.assertFalse(_cacheable(JsonResponse({'success': False, 'error': '数据库不可用'})))
+        self.assertFalse(_cacheable(JsonResponse({'error': '未找到'}, status=404)))
+        self.assertFalse(_cacheable(HttpResponse('<html></html>', content_type='text/html; charset=utf-8')))
+
+    def test_stale_index_result_is_not_stored(self):
+        cache = ResponseCache()
+        index = DatasetIndex('test', lambda: 'new')
+        index._state = ('old', 'v1')
+
+        @cache.cached('test')
+        def view(request):
+            return JsonResponse({'success': True, 'data': index.get()})
+
+        with mock.patch.object(dataset_version, 'current', return_value='v2'):
+            # 其他线程正在重建：返回旧索引的结果，但不以 v2 的缓存键保存
+            index._lock.acquire()
+            try:
+                response = view(self.factory.get('/api/test/'))
+            finally:
+                index._lock.release()
+            self.assertEqual(json.loads(response.content)['data'], 'old')
+            self.assertEqual(cache.stats()['stores'], 0)
+            self.assertEqual(cache.stats()['stale_skips'], 1)
+
+            response = view(self.factory.get('/api/test/'))
+            self.assertEqual(json.loads(response.content)['data'], 'new')
+            self.assertEqual(cache.stats()['stores'], 1)
+            view(self.factory.get('/api/test/'))
+            self.assertEqual(cache.stats()['memory_hits'], 1)
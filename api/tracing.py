@@ -0,0 +1,218 @@
+import json
+import time
+import uuid
+import random
+import logging
+import threading
+from functools import wraps
+from contextlib import contextmanager
+from contextvars import ContextVar
+from collections import deque
+
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+# 采样的请求记录写入单独的logger，可在 LOGGING 中配置到文件
+trace_logger = logging.getLogger('api.trace')
+
+_current = ContextVar('herb_trace', default=None)
+
+
+class Trace:
+    """一次请求的耗时分段和SQL统计"""
+
+    __slots__ = ('trace_id', 'endpoint', 'started', 'spans', 'sql_count', 'sql_ms', 'total_ms', 'status')
+
+    def __init__(self, endpoint):
+        self.trace_id = uuid.uuid4().hex[:16]
+        self.endpoint = endpoint
+        self.started = time.perf_counter()
+        self.spans = []  # (名称, 耗时毫秒)
+        self.sql_count = 0
+        self.sql_ms = 0.0
+        self.total_ms = None
+        self.status = None
+
+    def sql_wrapper(self, execute, sql, params, many, context):
+        """connection.execute_wrapper 回调：统计SQL条数和耗时"""
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_count += 1
+            self.sql_ms += (time.perf_counter() - started) * 1000
+
+    def server_timing(self):
+        """Server-Timing 响应头，浏览器开发者工具中可直接查看"""
+        items = [f'{name};dur={duration:.2f}' for name, duration in self.spans]
+        items.append(f'sql;dur={self.sql_ms:.2f};desc="{self.sql_count} queries"')
+        items.append(f'total;dur={self.total_ms:.2f}')
+        return ', '.join(items)
+
+    def to_dict(self):
+        return {
+            'trace_id': self.trace_id,
+            'endpoint': self.endpoint,
+            'status': self.status,
+            'total_ms': round(self.total_ms, 3) if self.total_ms is not None else None,
+            'spans': {name: round(duration, 3) for name, duration in self.spans},
+            'sql_count': self.sql_count,
+            'sql_ms': round(self.sql_ms, 3),
+        }
+
+
+@contextmanager
+def _span(trace, name):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.spans.append((name, (time.perf_counter() - started) * 1000))
+
+
+class _NullSpan:
+    """未采样时使用的空上下文，不计时也不分配对象"""
+
+    def __enter__(self):
+        return None
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def span(name):
+    """
+    在当前请求的记录中计时一段代码；当前请求未被采样时几乎没有开销
+    用法: with span('query'): ...
+    """
+    trace = _current.get()
+    if trace is None:
+        return _NULL_SPAN
+    return _span(trace, name)
+
+
+class Tracer:
+    """
+    采样的结构化请求记录
+
+    按采样率（或调试请求头）选中的请求记录各段耗时和SQL条数，响应中带上 Server-Timing 头；
+    记录放入有界缓冲区，由后台线程定期批量写入日志，请求线程不做任何输出。
+    """
+
+    def __init__(self, sample_rate=0.0, buffer_size=256, flush_interval=5.0, header_enabled=False):
+        """
+        Args:
+            sample_rate: 采样率（0 ~ 1），为 0 时只记录带调试请求头的请求
+            buffer_size: 缓冲区保留的最近记录数（也用于查看接口）
+            flush_interval: 后台写日志的间隔（秒）
+            header_enabled: 是否允许客户端通过 X-Debug-Trace 请求头强制记录
+        """
+        self.sample_rate = sample_rate
+        self.header_enabled = header_enabled
+        self.flush_interval = flush_interval
+        self.recent = deque(maxlen=max(1, int(buffer_size)))
+        self._pending = deque(maxlen=max(1, int(buffer_size)) * 4)
+        self._lock = threading.Lock()
+        self._flusher = None
+        self._counters = {'traced': 0, 'dropped': 0}
+
+    @property
+    def enabled(self):
+        return self.sample_rate > 0 or self.header_enabled
+
+    def _sampled(self, request):
+        if self.header_enabled and request.META.get('HTTP_X_DEBUG_TRACE'):
+            return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def _ensure_flusher(self):
+        if self._flusher is None:
+            with self._lock:
+                if self._flusher is None:
+                    self._flusher = threading.Thread(target=self._flush_loop, name='herb-trace-flusher', daemon=True)
+                    self._flusher.start()
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+    def flush(self):
+        """把缓冲区中的记录写入日志"""
+        batch = []
+        while True:
+            try:
+                batch.append(self._pending.popleft())
+            except IndexError:
+                break
+        for item in batch:
+            trace_logger.info(json.dumps(item, ensure_ascii=False))
+        return len(batch)
+
+    def _record(self, trace):
+        item = trace.to_dict()
+        with self._lock:
+            self._counters['traced'] += 1
+            if len(self._pending) == self._pending.maxlen:
+                self._counters['dropped'] += 1
+            self.recent.append(item)
+            self._pending.append(item)
+        self._ensure_flusher()
+
+    def traced(self, endpoint):
+        """
+        视图装饰器：对采样的请求记录总耗时、各段耗时（见 span）、渲染耗时和SQL条数
+        Args:
+            endpoint: 接口名
+        """
+        def decorator(view):
+            @wraps(view)
+            def wrapper(request, *args, **kwargs):
+                if not self.enabled or not self._sampled(request):
+                    return view(request, *args, **kwargs)
+                trace = Trace(endpoint)
+                token = _current.set(trace)
+                try:
+                    with connection.execute_wrapper(trace.sql_wrapper):
+                        response = view(request, *args, **kwargs)
+                        if hasattr(response, 'render') and not getattr(response, 'is_rendered', True):
+                            with _span(trace, 'serialize'):
+                                response.render()
+                finally:
+                    _current.reset(token)
+                trace.total_ms = (time.perf_counter() - trace.started) * 1000
+                trace.status = response.status_code
+                response['Server-Timing'] = trace.server_timing()
+                response['X-Trace-Id'] = trace.trace_id
+                self._record(trace)
+                return response
+            return wrapper
+        return decorator
+
+    def stats(self):
+        """配置、计数和最近的记录"""
+        with self._lock:
+            counters = dict(self._counters)
+            recent = list(self.recent)
+        return {
+            'config': {
+                'sample_rate': self.sample_rate,
+                'header_enabled': self.header_enabled,
+                'buffer_size': self.recent.maxlen,
+                'flush_interval': self.flush_interval,
+            },
+            **counters,
+            'recent': recent,
+        }
+
+
+tracer = Tracer(
+    sample_rate=getattr(settings, 'SEARCH_TRACE_SAMPLE_RATE', 0.0),
+    buffer_size=getattr(settings, 'SEARCH_TRACE_BUFFER_SIZE', 256),
+    flush_interval=getattr(settings, 'SEARCH_TRACE_FLUSH_INTERVAL', 5.0),
+    header_enabled=getattr(settings, 'SEARCH_TRACE_HEADER_ENABLED', False),
+)
@@ -1,7 +1,14 @@
 from django.urls import path
-from .views import HerbSearchView, HerbSuggestView
+from .views import HerbSearchView, HerbSuggestView, HerbDetailView, SearchCacheStatsView, SearchTraceView
+from .response_cache import response_cache
+from .tracing import tracer
 
 urlpatterns = [
-    path('search/', HerbSearchView.as_view(), name='herb-search'),
-    path('search/suggest/', HerbSuggestView.as_view(), name='herb-suggest'),
+    path('search/', tracer.traced('search')(response_cache.cached('search')(HerbSearchView.as_view())),
+         name='herb-search'),
+    path('search/suggest/', tracer.traced('suggest')(response_cache.cached('suggest')(HerbSuggestView.as_view())),
+         name='herb-suggest'),
+    path('search/cache-stats/', SearchCacheStatsView.as_view(), name='search-cache-stats'),
+    path('search/traces/', SearchTraceView.as_view(), name='search-traces'),
+    path('herbs/<str:name>/', tracer.traced('detail')(HerbDetailView.as_view()), name='herb-detail'),
 ] 
\ No newline at end of file
@@ -1,105 +1,202 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from django.db.models import Q
-from django.db import connection
+from django.conf import settings
 from .models import Herb
+from .search_index import search_names, search_names_database
+from .bm25 import bm25_index
+from .suggest import popularity, suggest_index
+from .response_cache import response_cache
+from .tracing import span, tracer
 import json
+import base64
+import binascii
 import traceback
 import logging
 
 logger = logging.getLogger(__name__)
 
+# 搜索模式：tier 按匹配字段分层（药名 > 别名 > 其他字段），bm25 按全文相关度排序，
+# sql 与 tier 结果相同但直接在数据库中用一条SQL完成分层排序（不使用内存索引）
+SEARCH_MODE_TIER = 'tier'
+SEARCH_MODE_BM25 = 'bm25'
+SEARCH_MODE_SQL = 'sql'
+SEARCH_MODES = (SEARCH_MODE_TIER, SEARCH_MODE_BM25, SEARCH_MODE_SQL)
+
+# 可通过 fields 参数选择的字段，以及列表默认返回的字段（不含考证、各家论述等长文本）
+HERB_FIELDS = tuple(field.name for field in Herb._meta.fields)
+LIST_FIELDS = ('name', 'alias', 'taste', 'meridian', 'effect', 'effect_class')
+
+class SearchParamError(ValueError):
+    """搜索参数不合法"""
+
+def _parse_fields(value):
+    """
+    解析 fields 参数
+    Args:
+        value: 逗号分隔的字段名或字段名列表，'all' 表示全部字段，为空时使用 LIST_FIELDS
+    Returns:
+        tuple: 按模型字段顺序排列的字段名（总是包含 name）
+    """
+    if not value:
+        return LIST_FIELDS
+    if isinstance(value, str):
+        value = value.split(',')
+    requested = {str(field).strip() for field in value if str(field).strip()}
+    if 'all' in requested:
+        return HERB_FIELDS
+    unknown = requested.difference(HERB_FIELDS)
+    if unknown:
+        raise SearchParamError(f'不支持的字段: {", ".join(sorted(unknown))}')
+    requested.add('name')
+    return tuple(field for field in HERB_FIELDS if field in requested)
+
+def _parse_int(value, default, minimum=1, maximum=None, name='参数'):
+    """解析正整数参数，超过上限时取上限"""
+    if value in (None, ''):
+        return default
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        raise SearchParamError(f'{name}必须是整数')
+    if value < minimum:
+        raise SearchParamError(f'{name}不能小于{minimum}')
+    return min(value, maximum) if maximum else value
+
+def _encode_cursor(offset, name):
+    """游标记录下一页的起始位置和上一页最后一条记录的药名"""
+    payload = json.dumps({'offset': offset, 'after': name}, ensure_ascii=False)
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii')
+
+def _decode_cursor(cursor, names):
+    """
+    根据游标计算下一页在匹配结果中的起始位置
+    Args:
+        cursor: _encode_cursor 生成的游标
+        names: 当前的匹配药名列表
+    Returns:
+        int: 起始位置。数据变化导致位置偏移时，以游标中的药名重新定位
+    """
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8'))
+        offset = int(payload['offset'])
+        after = payload['after']
+    except (binascii.Error, UnicodeError, ValueError, KeyError, TypeError, AttributeError):
+        raise SearchParamError('无效的游标')
+    if 0 < offset <= len(names) and names[offset - 1] == after:
+        return offset
+    try:
+        return names.index(after) + 1
+    except ValueError:
+        return max(0, min(offset, len(names)))
+
+def _fetch_herbs(names, fields):
+    """
+    按给定顺序取出药材的指定字段（一次查询）
+    Returns:
+        list: 字段名到值的dict列表，已不存在的药名被跳过
+    """
+    rows = {row['name']: row for row in Herb.objects.filter(name__in=names).values(*fields)}
+    return [rows[name] for name in names if name in rows]
+
 class HerbSearchView(APIView):
     def post(self, request):
         try:
             keyword = request.data.get('keyword', '')
-            print(f"收到搜索请求，关键词: {keyword}")
+            logger.debug(f"收到搜索请求，关键词: {keyword}")
 
             if not keyword:
-                print("关键词为空，返回空结果")
                 return Response({'error': '请输入搜索关键词'}, status=status.HTTP_400_BAD_REQUEST)
 
-            # 构建查询条件
-            query = Q()
-            
-            # 1. 先查找药名匹配的
-            name_query = Q(name__icontains=keyword)
-            name_results = Herb.objects.filter(name_query)
-            print(f"1. 药名匹配结果数: {name_results.count()}")
-            for herb in name_results:
-                print(f"药名匹配: {herb.name}")
-            
-            # 2. 再查找别名匹配的（排除已经在药名中匹配的）
-            alias_query = Q(alias__icontains=keyword)
-            alias_results = Herb.objects.filter(alias_query).exclude(name__in=name_results.values_list('name', flat=True))
-            print(f"2. 别名匹配结果数: {alias_results.count()}")
-            for herb in alias_results:
-                print(f"别名匹配: {herb.name} (别名: {herb.alias})")
-
-            # 3. 最后查找其他字段匹配的（排除已经匹配的）
-            other_query = (
-                Q(effect__icontains=keyword) |
-                Q(indication__icontains=keyword) |
-                Q(effect_class__icontains=keyword) |
-                Q(taste__icontains=keyword) |
-                Q(meridian__icontains=keyword)
-            )
-            excluded_names = list(name_results.values_list('name', flat=True)) + list(alias_results.values_list('name', flat=True))
-            other_results = Herb.objects.filter(other_query).exclude(name__in=excluded_names)
-            print(f"3. 其他字段匹配结果数: {other_results.count()}")
-            for herb in other_results:
-                print(f"其他匹配: {herb.name}")
-
-            # 合并所有结果
-            all_results = list(name_results) + list(alias_results) + list(other_results)
-            print(f"4. 总匹配结果数: {len(all_results)}")
-
-            # 转换为字典列表
-            herbs_list = []
-            for herb in all_results:
-                herb_dict = {
-                    'name': herb.name,
-                    'alias': herb.alias,
-                    'taste': herb.taste,
-                    'meridian': herb.meridian,
-                    'effect': herb.effect,
-                    'indication': herb.indication,
-                    'usage': herb.usage,
-                    'contraindication': herb.contraindication,
-                    'source': herb.source,
-                    'collection': herb.collection,
-                    'effect_class': herb.effect_class,
-                    'pharmacology': herb.pharmacology,
-                    'chemistry': herb.chemistry,
-                    'prescription': herb.prescription,
-                    'theory': herb.theory,
-                    'research': herb.research,
-                    'taxonomy': herb.taxonomy,
-                    'distribution': herb.distribution,
-                    'morphology': herb.morphology,
-                    'identification': herb.identification,
-                    'cultivation': herb.cultivation,
-                    'environment': herb.environment
-                }
-                herbs_list.append(herb_dict)
+            mode = request.data.get('mode', SEARCH_MODE_TIER)
+            if mode not in SEARCH_MODES:
+                return Response({'error': f'不支持的搜索模式: {mode}'}, status=status.HTTP_400_BAD_REQUEST)
 
-            if not herbs_list:
-                print("\n未找到匹配结果")
+            with span('match'):
+                if mode == SEARCH_MODE_BM25:
+                    # 按BM25相关度排序，只返回得分最高的前 top_k 条
+                    max_top_k = getattr(settings, 'SEARCH_BM25_MAX_TOP_K', 100)
+                    try:
+                        top_k = int(request.data.get('top_k', getattr(settings, 'SEARCH_BM25_TOP_K', 20)))
+                    except (TypeError, ValueError):
+                        top_k = getattr(settings, 'SEARCH_BM25_TOP_K', 20)
+                    matches = bm25_index.get().search(keyword, max(1, min(top_k, max_top_k)))
+                elif mode == SEARCH_MODE_SQL:
+                    matches = search_names_database(keyword)
+                else:
+                    # 在内存索引中按 药名 > 别名 > 其他字段 分层匹配
+                    matches = search_names(keyword)
+
+            if not matches:
                 return Response({'error': '未找到相关中药信息'}, status=status.HTTP_404_NOT_FOUND)
 
-            # 返回所匹配的结果
+            # 分页：优先使用游标，否则使用页码；只取出当前页记录的所需字段
+            names = [name for name, _ in matches]
+            fields = _parse_fields(request.data.get('fields'))
+            page_size = _parse_int(
+                request.data.get('page_size'), getattr(settings, 'SEARCH_PAGE_SIZE', 20),
+                maximum=getattr(settings, 'SEARCH_MAX_PAGE_SIZE', 100), name='page_size'
+            )
+            cursor = request.data.get('cursor')
+            if cursor:
+                offset = _decode_cursor(str(cursor), names)
+                page = offset // page_size + 1
+            else:
+                page = _parse_int(request.data.get('page'), 1, name='page')
+                offset = (page - 1) * page_size
+            page_names = names[offset:offset + page_size]
+
+            with span('query'):
+                herbs_list = _fetch_herbs(page_names, fields)
+            if mode == SEARCH_MODE_BM25:
+                scores = dict(matches)
+                for herb_dict in herbs_list:
+                    herb_dict['score'] = round(scores[herb_dict['name']], 4)
+            logger.debug(f"搜索 {keyword}（{mode}）: 匹配 {len(names)} 条，返回第 {offset + 1} 条起 {len(herbs_list)} 条")
+
+            # 返回当前页的结果，count 为匹配总数
+            end = offset + len(page_names)
+            has_more = end < len(names)
             response_data = {
                 'success': True,
                 'data': herbs_list,
-                'count': len(herbs_list)
+                'count': len(names),
+                'page': page,
+                'page_size': page_size,
+                'num_pages': (len(names) + page_size - 1) // page_size,
+                'has_more': has_more,
+                'next_cursor': _encode_cursor(end, page_names[-1]) if has_more else None,
+                'mode': mode
             }
-            print(f"5. 返回数据条数: {len(herbs_list)}")
             return Response(response_data, status=status.HTTP_200_OK)
 
+        except SearchParamError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
-            print(f"\n发生错误: {str(e)}")
-            print(f"错误详情: {traceback.format_exc()}")
+            logger.error(f"搜索时发生错误: {str(e)}")
+            logger.error(traceback.format_exc())
+            return Response({
+                'success': False,
+                'error': str(e)
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+class HerbDetailView(APIView):
+    def get(self, request, name):
+        """按药名返回完整的药材信息，可用 fields 参数只取部分字段"""
+        try:
+            fields = _parse_fields(request.query_params.get('fields') or 'all')
+            with span('query'):
+                herbs_list = _fetch_herbs([name], fields)
+            if not herbs_list:
+                return Response({'success': False, 'error': '未找到该中药'}, status=status.HTTP_404_NOT_FOUND)
+            popularity.record(name)
+            return Response({'success': True, 'data': herbs_list[0]}, status=status.HTTP_200_OK)
+
+        except SearchParamError as e:
+            return Response({'success': False, 'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            logger.error(f"获取中药详情时发生错误: {str(e)}")
+            logger.error(traceback.format_exc())
             return Response({
                 'success': False,
                 'error': str(e)
@@ -108,72 +205,64 @@ class HerbSearchView(APIView):
 class HerbSuggestView(APIView):
     def post(self, request):
         try:
-            keyword = request.data.get('keyword', '')
-            print(f"\n{'='*50}")
-            print(f"搜索建议请求")
-            print(f"关键词: {keyword}")
-            print(f"{'='*50}")
+            keyword = str(request.data.get('keyword', '') or '').strip()
+            max_length = getattr(settings, 'SUGGEST_MAX_KEYWORD_LENGTH', 32)
+            if not keyword or len(keyword) > max_length:
+                return Response({'success': True, 'data': [], 'total_count': 0})
 
-            if not keyword:
-                return Response({'success': True, 'data': []})
-
-            # 直接使用一个查询获取所有匹配的记录
-            query = Q(name__icontains=keyword) | Q(alias__icontains=keyword) | Q(effect_class__icontains=keyword)
-            herbs = Herb.objects.filter(query).order_by('name')
-
-            # 记录 SQL 查询
-            print(f"\nSQL查询: {herbs.query}")
-            
-            # 获取并记录所有匹配的记录
-            herbs_list = list(herbs)  # 执行查询
-            print(f"\n查询到的记录数: {len(herbs_list)}")
-            
-            # 记录每条记录的详细信息
-            print("\n匹配的记录:")
-            for herb in herbs_list:
-                print(f"  - 药名: {herb.name}")
-                print(f"    别名: {herb.alias}")
-                print(f"    功效分类: {herb.effect_class}")
-
-            # 转换为响应格式
-            suggestions = []
-            for herb in herbs_list:
-                suggestion = {
-                    'name': herb.name,
-                    'alias': herb.alias if herb.alias else '',
-                    'effect_class': herb.effect_class if herb.effect_class else '',
-                    'effect': herb.effect[:100] + '...' if herb.effect and len(herb.effect) > 100 else herb.effect,
-                    'taste': herb.taste if herb.taste else '',
-                    'meridian': herb.meridian if herb.meridian else ''
-                }
-                suggestions.append(suggestion)
-
-            # 记录最终结果
-            print(f"\n最终返回结果数: {len(suggestions)}")
-            
-            # 记录所有执行的SQL查询
-            for query in connection.queries:
-                print(f"\n执行的SQL: {query['sql']}")
-                print(f"耗时: {query['time']}秒")
+            limit = _parse_int(
+                request.data.get('limit'), getattr(settings, 'SUGGEST_LIMIT', 10),
+                maximum=getattr(settings, 'SUGGEST_MAX_LIMIT', 20), name='limit'
+            )
 
-            response_data = {
+            # 在内存前缀索引中查询，按 匹配类型 > 热度 排序，最多返回 limit 条
+            with span('match'):
+                index = suggest_index.get()
+                suggestions = []
+                for name, kind, matched in index.search(keyword, limit):
+                    detail = index.details.get(name)
+                    if detail is None:
+                        # 查询期间该记录已被删除
+                        continue
+                    suggestion = dict(detail)
+                    suggestion['match'] = kind
+                    suggestion['matched'] = matched
+                    suggestions.append(suggestion)
+            logger.debug(f"搜索建议 {keyword}: 返回 {len(suggestions)} 条")
+
+            return Response({
                 'success': True,
                 'data': suggestions,
-                'total_count': len(suggestions),
-                'sql_query': str(herbs.query)
-            }
-
-            print(f"\n响应数据:")
-            print(f"总数: {response_data['total_count']}")
-            print(f"SQL: {response_data['sql_query']}")
-            print(f"{'='*50}\n")
-
-            return Response(response_data)
+                'total_count': len(suggestions)
+            })
 
+        except SearchParamError as e:
+            return Response({'success': False, 'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
-            print(f"\n搜索建议发生错误: {str(e)}")
-            print(f"错误详情: {traceback.format_exc()}")
+            logger.error(f"搜索建议发生错误: {str(e)}")
+            logger.error(traceback.format_exc())
             return Response({
                 'success': False,
                 'error': str(e)
-            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR) 
\ No newline at end of file
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+class SearchCacheStatsView(APIView):
+    def get(self, request):
+        """获取搜索接口响应缓存的命中率和处理时间统计"""
+        return Response({
+            'success': True,
+            'data': response_cache.stats()
+        })
+
+class SearchTraceView(APIView):
+    def get(self, request):
+        """获取最近采样的搜索请求记录（各段耗时和SQL条数）"""
+        if not tracer.enabled:
+            return Response({
+                'success': False,
+                'error': '请求记录未启用'
+            }, status=status.HTTP_404_NOT_FOUND)
+        return Response({
+            'success': True,
+            'data': tracer.stats()
+        })
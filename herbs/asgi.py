@@ -7,4 +7,12 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'herbs.settings')
 
-application = get_asgi_application() 
\ No newline at end of file
+application = get_asgi_application()
+
+# 服务启动后在后台加载图像识别模型（RECOGNITION_LOAD_MODE=lazy 时改为首次识别请求时加载）
+from recognition.service import preload  # noqa: E402
+preload()
+
+# 服务启动后在后台构建中药搜索索引
+from api.search_index import preload as preload_search_index  # noqa: E402
+preload_search_index()
@@ -1,4 +1,5 @@
 import os
+import json
 from pathlib import Path
 
 # 构建项目内部路径
@@ -125,8 +126,10 @@ CORS_ALLOW_HEADERS = [
     'user-agent',
     'x-csrftoken',
     'x-requested-with',
+    'if-none-match',
+    'x-debug-trace',
 ]
-CORS_EXPOSE_HEADERS = ['Content-Type', 'X-CSRFToken']
+CORS_EXPOSE_HEADERS = ['Content-Type', 'X-CSRFToken', 'ETag', 'Server-Timing', 'X-Trace-Id']
 CORS_PREFLIGHT_MAX_AGE = 86400
 
 # 日志配置
@@ -147,17 +150,55 @@ LOGGING = {
             'handlers': ['console', 'file'],
             'level': 'INFO',
         },
+        # SQL日志默认关闭（DEBUG 下每条SQL都会同步写控制台），排查时可设置 DB_LOG_LEVEL=DEBUG
         'django.db.backends': {
             'handlers': ['console'],
-            'level': 'DEBUG',
+            'level': os.getenv('DB_LOG_LEVEL', 'WARNING'),
+            'propagate': False,
         },
         'api': {
             'handlers': ['console', 'file'],
-            'level': 'DEBUG',
+            'level': os.getenv('API_LOG_LEVEL', 'INFO'),
+        },
+        # 采样的搜索请求记录（由后台线程批量写入）
+        'api.trace': {
+            'handlers': ['file'],
+            'level': 'INFO',
+            'propagate': False,
         },
     },
 }
 
+# 中药搜索配置
+# 启用时搜索在内存中的n-gram索引上完成，数据变化后自动重建；关闭时直接查询数据库
+SEARCH_INDEX_ENABLED = os.getenv('SEARCH_INDEX_ENABLED', 'true').lower() == 'true'
+SEARCH_DATASET_CHECK_INTERVAL = float(os.getenv('SEARCH_DATASET_CHECK_INTERVAL', '30'))  # 检查数据表是否变化的最短间隔（秒）
+SEARCH_BM25_TOP_K = int(os.getenv('SEARCH_BM25_TOP_K', '20'))  # mode=bm25 时默认返回的结果数
+SEARCH_BM25_MAX_TOP_K = int(os.getenv('SEARCH_BM25_MAX_TOP_K', '100'))
+# 数据库分层搜索在存在 FULLTEXT(ngram) 索引时用 MATCH ... AGAINST 缩小候选范围（见 create_search_fulltext_index）
+SEARCH_DATABASE_FULLTEXT = os.getenv('SEARCH_DATABASE_FULLTEXT', 'true').lower() == 'true'
+SEARCH_PAGE_SIZE = int(os.getenv('SEARCH_PAGE_SIZE', '20'))  # 搜索结果每页条数（请求中 page_size 未指定时）
+SEARCH_MAX_PAGE_SIZE = int(os.getenv('SEARCH_MAX_PAGE_SIZE', '100'))
+# 药名和别名的拼音转换表（build_pinyin_index 生成；不存在时需要安装 pypinyin）
+SEARCH_PINYIN_TABLE_PATH = os.getenv('SEARCH_PINYIN_TABLE_PATH', os.path.join(BASE_DIR, 'api', 'data', 'pinyin.json'))
+SUGGEST_LIMIT = int(os.getenv('SUGGEST_LIMIT', '10'))  # 搜索建议默认返回条数
+SUGGEST_MAX_LIMIT = int(os.getenv('SUGGEST_MAX_LIMIT', '20'))
+SUGGEST_MAX_KEYWORD_LENGTH = int(os.getenv('SUGGEST_MAX_KEYWORD_LENGTH', '32'))  # 超过该长度的输入不返回建议
+SUGGEST_POPULARITY_REFRESH = int(os.getenv('SUGGEST_POPULARITY_REFRESH', '60'))  # 建议排序使用的热度的更新间隔（秒）
+
+# 中药查询接口的响应缓存（搜索、搜索建议、分类浏览），数据表变化后自动失效
+SEARCH_CACHE_ENABLED = os.getenv('SEARCH_CACHE_ENABLED', 'true').lower() == 'true'
+SEARCH_CACHE_MAX_ENTRIES = int(os.getenv('SEARCH_CACHE_MAX_ENTRIES', '512'))  # 进程内LRU最大条目数
+SEARCH_CACHE_TTL = int(os.getenv('SEARCH_CACHE_TTL', '300'))  # 缓存有效期（秒）
+# 多个worker共享的Django缓存别名（需在 CACHES 中配置，如Redis），为空时只使用进程内缓存
+SEARCH_CACHE_BACKEND = os.getenv('SEARCH_CACHE_BACKEND', '') or None
+
+# 搜索接口的请求记录（各段耗时和SQL条数），默认关闭
+SEARCH_TRACE_SAMPLE_RATE = float(os.getenv('SEARCH_TRACE_SAMPLE_RATE', '0'))  # 采样率（0 ~ 1）
+SEARCH_TRACE_HEADER_ENABLED = os.getenv('SEARCH_TRACE_HEADER_ENABLED', 'false').lower() == 'true'  # 允许通过 X-Debug-Trace 请求头强制记录
+SEARCH_TRACE_BUFFER_SIZE = int(os.getenv('SEARCH_TRACE_BUFFER_SIZE', '256'))  # 保留的最近记录数
+SEARCH_TRACE_FLUSH_INTERVAL = float(os.getenv('SEARCH_TRACE_FLUSH_INTERVAL', '5'))  # 后台写日志的间隔（秒）
+
 # DeepSeek API 配置
 DEEPSEEK_API_KEY = os.getenv('DEEPSEEK_API_KEY', '')  # 从环境变量获取API密钥
 DEEPSEEK_API_BASE_URL = os.getenv('DEEPSEEK_API_BASE_URL', 'https://api.deepseek.com')
@@ -173,4 +214,112 @@ REST_FRAMEWORK = {
     ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 10,
-}
\ No newline at end of file
+}
+
+# 图像识别模型配置
+RECOGNITION_CHECKPOINT_PATH = os.path.join(BASE_DIR, 'recognition', 'models', '完整模型_ResNet50模型_epoch_13.pth')
+# 精简推理文件（manage.py convert_model 生成），存在时优先加载
+RECOGNITION_ARTIFACT_PATH = os.path.join(BASE_DIR, 'recognition', 'models', 'resnet50_inference.pt')
+RECOGNITION_MODEL_PATH = os.getenv(
+    'RECOGNITION_MODEL_PATH',
+    RECOGNITION_ARTIFACT_PATH if os.path.exists(RECOGNITION_ARTIFACT_PATH) else RECOGNITION_CHECKPOINT_PATH
+)
+RECOGNITION_CLASS_NAMES_PATH = os.path.join(BASE_DIR, 'recognition', 'class_names.json')
+# 推理后端：eager（PyTorch原生）/ torchscript / onnx（ONNX Runtime CPU）/ quantized（INT8，仅CPU）
+# torchscript、onnx 需先执行 manage.py export_model，quantized 需先执行 manage.py quantize_model
+RECOGNITION_BACKEND = os.getenv('RECOGNITION_BACKEND', 'eager')
+RECOGNITION_EXPORT_DIR = os.path.join(BASE_DIR, 'recognition', 'models', 'exported')
+RECOGNITION_TORCHSCRIPT_PATH = os.getenv('RECOGNITION_TORCHSCRIPT_PATH', os.path.join(RECOGNITION_EXPORT_DIR, 'resnet50.torchscript.pt'))
+RECOGNITION_ONNX_PATH = os.getenv('RECOGNITION_ONNX_PATH', os.path.join(RECOGNITION_EXPORT_DIR, 'resnet50.onnx'))
+RECOGNITION_QUANTIZED_PATH = os.getenv('RECOGNITION_QUANTIZED_PATH', os.path.join(RECOGNITION_EXPORT_DIR, 'resnet50.int8.torchscript.pt'))
+# 快速预处理：JPEG按接近目标尺寸解码、按EXIF方向旋转、缩放裁剪一次完成
+# 默认关闭：预处理结果与原流程不完全相同，需先用 manage.py bench_preprocess 在真实图片上确认识别一致后再开启
+RECOGNITION_FAST_PREPROCESS = os.getenv('RECOGNITION_FAST_PREPROCESS', 'false').lower() == 'true'
+RECOGNITION_MODEL_INFO_MAX_AGE = int(os.getenv('RECOGNITION_MODEL_INFO_MAX_AGE', '300'))  # model-info 响应的 Cache-Control max-age（秒）
+
+# 多版本模型注册表：default 为上面配置的模型，RECOGNITION_EXTRA_MODELS 可用JSON追加其他版本，例如
+# {"v2": {"model_path": "/app/recognition/models/v2.pt", "backend": "onnx", "backend_path": "/app/v2.onnx"}}
+RECOGNITION_MODELS = {
+    'default': {
+        'model_path': RECOGNITION_MODEL_PATH,
+        'backend': RECOGNITION_BACKEND,
+        'backend_path': {
+            'torchscript': RECOGNITION_TORCHSCRIPT_PATH,
+            'onnx': RECOGNITION_ONNX_PATH,
+            'quantized': RECOGNITION_QUANTIZED_PATH,
+        }.get(RECOGNITION_BACKEND),
+    },
+    **json.loads(os.getenv('RECOGNITION_EXTRA_MODELS', '{}')),
+}
+RECOGNITION_ACTIVE_MODEL = os.getenv('RECOGNITION_ACTIVE_MODEL', 'default')
+# 影子评估：按采样比例用候选模型在后台重复推理线上请求，记录一致率和耗时
+RECOGNITION_SHADOW_MODEL = os.getenv('RECOGNITION_SHADOW_MODEL') or None
+RECOGNITION_SHADOW_SAMPLE_RATE = float(os.getenv('RECOGNITION_SHADOW_SAMPLE_RATE', '0.05'))
+# 模型切换控制文件（manage.py recognition_models 写入），各worker据此热切换模型，无需重启
+RECOGNITION_MODEL_CONTROL_PATH = os.getenv(
+    'RECOGNITION_MODEL_CONTROL_PATH', os.path.join(BASE_DIR, 'recognition', 'models', 'control.json')
+)
+
+# 模型加载方式：background（服务启动后在后台线程加载）/ lazy（首次识别请求时加载）
+# 两种方式下，导入URL配置都不会导入torch；migrate 等管理命令不会加载模型
+RECOGNITION_LOAD_MODE = os.getenv('RECOGNITION_LOAD_MODE', 'background')
+RECOGNITION_LOAD_WAIT = float(os.getenv('RECOGNITION_LOAD_WAIT', '30'))  # 请求等待模型加载完成的最长时间（秒）
+RECOGNITION_WARMUP_ITERATIONS = int(os.getenv('RECOGNITION_WARMUP_ITERATIONS', '2'))  # 加载后预热的前向推理次数，0为不预热
+
+# 图像识别批量推理配置
+# 开启后，时间窗口内并发到达的识别请求会合并为一个batch执行前向推理
+RECOGNITION_BATCHING_ENABLED = os.getenv('RECOGNITION_BATCHING_ENABLED', 'true').lower() == 'true'
+RECOGNITION_BATCH_WINDOW_MS = float(os.getenv('RECOGNITION_BATCH_WINDOW_MS', '10'))  # 收集请求的时间窗口（毫秒）
+RECOGNITION_MAX_BATCH_SIZE = int(os.getenv('RECOGNITION_MAX_BATCH_SIZE', '8'))  # 单个batch的最大图片数
+RECOGNITION_MAX_UPLOAD_IMAGES = int(os.getenv('RECOGNITION_MAX_UPLOAD_IMAGES', '10'))  # 多图识别一次最多上传的图片数
+RECOGNITION_MAX_UPLOAD_SIZE = int(os.getenv('RECOGNITION_MAX_UPLOAD_SIZE', str(5 * 1024 * 1024)))  # 单张图片的最大字节数，上传时边读取边校验
+
+# 图像识别结果缓存配置
+# 以上传图片内容的SHA-256为键缓存识别结果，模型文件变化后自动失效
+RECOGNITION_CACHE_ENABLED = os.getenv('RECOGNITION_CACHE_ENABLED', 'true').lower() == 'true'
+RECOGNITION_CACHE_MAX_ENTRIES = int(os.getenv('RECOGNITION_CACHE_MAX_ENTRIES', '1024'))  # 进程内LRU最大条目数
+RECOGNITION_CACHE_TTL = int(os.getenv('RECOGNITION_CACHE_TTL', '86400'))  # 缓存有效期（秒）
+# 跨worker共享的SQLite缓存文件路径，为空时仅使用进程内缓存
+RECOGNITION_CACHE_SHARED_PATH = os.getenv('RECOGNITION_CACHE_SHARED_PATH', '') or None
+# 感知哈希近似匹配允许的最大汉明距离（64位dHash），为空时不启用
+RECOGNITION_CACHE_PHASH_DISTANCE = int(os.getenv('RECOGNITION_CACHE_PHASH_DISTANCE')) if os.getenv('RECOGNITION_CACHE_PHASH_DISTANCE') else None
+
+# 图像识别推理线程池配置
+# 识别任务在固定数量的worker线程中执行，workers × threads_per_worker 不应超过CPU核数
+# 排队请求超过 QUEUE_SIZE 时直接返回503并附带 Retry-After
+RECOGNITION_EXECUTOR_ENABLED = os.getenv('RECOGNITION_EXECUTOR_ENABLED', 'true').lower() == 'true'
+RECOGNITION_EXECUTOR_WORKERS = int(os.getenv('RECOGNITION_EXECUTOR_WORKERS', '2'))
+RECOGNITION_EXECUTOR_THREADS_PER_WORKER = int(os.getenv(
+    'RECOGNITION_EXECUTOR_THREADS_PER_WORKER',
+    str(max(1, (os.cpu_count() or 1) // RECOGNITION_EXECUTOR_WORKERS))
+))
+RECOGNITION_EXECUTOR_QUEUE_SIZE = int(os.getenv('RECOGNITION_EXECUTOR_QUEUE_SIZE', '16'))
+RECOGNITION_EXECUTOR_TIMEOUT = float(os.getenv('RECOGNITION_EXECUTOR_TIMEOUT', '30'))  # 单个请求的最长处理时间（秒）
+# 同时启用批量推理时，单张图片识别只经过线程池的准入控制（最多 WORKERS + QUEUE_SIZE 个请求），
+# 前向推理统一在批量推理线程中执行，该线程的算子内线程数即整个推理的CPU预算
+RECOGNITION_BATCH_THREADS = int(os.getenv(
+    'RECOGNITION_BATCH_THREADS',
+    str(RECOGNITION_EXECUTOR_WORKERS * RECOGNITION_EXECUTOR_THREADS_PER_WORKER)
+))
+
+# 级联推理配置
+# RECOGNITION_CASCADE_MODEL 为 RECOGNITION_MODELS 中小模型的版本名（与完整模型使用相同的 class_names.json），
+# 小模型top-1概率不低于阈值时直接返回，否则交给完整模型；阈值可用 manage.py eval_cascade 在评估集上选取
+RECOGNITION_CASCADE_MODEL = os.getenv('RECOGNITION_CASCADE_MODEL') or None
+RECOGNITION_CASCADE_THRESHOLD = float(os.getenv('RECOGNITION_CASCADE_THRESHOLD', '0.9'))
+
+# 测试时增强配置（默认关闭）
+# 第一次推理的top-1与top-2概率差小于 MARGIN 时，把翻转、四角裁剪、多尺度视图拼成一个batch再推理一次并取平均概率
+RECOGNITION_TTA_ENABLED = os.getenv('RECOGNITION_TTA_ENABLED', 'false').lower() == 'true'
+RECOGNITION_TTA_MARGIN = float(os.getenv('RECOGNITION_TTA_MARGIN', '0.1'))
+RECOGNITION_TTA_VIEWS = [view.strip() for view in os.getenv('RECOGNITION_TTA_VIEWS', 'flip,five_crop,scale').split(',') if view.strip()]
+RECOGNITION_TTA_SCALES = [int(size) for size in os.getenv('RECOGNITION_TTA_SCALES', '224,320').split(',') if size.strip()]  # 多尺度视图的短边尺寸
+
+# 相似图片检索配置
+# 索引由 python manage.py build_embedding_index --gallery-dir <图库目录> 生成
+RECOGNITION_EMBEDDING_INDEX_PATH = os.getenv(
+    'RECOGNITION_EMBEDDING_INDEX_PATH', os.path.join(BASE_DIR, 'recognition', 'models', 'gallery_index.npz')
+)
+# 参考图片的访问地址前缀，设置后结果中附带图片URL
+RECOGNITION_GALLERY_URL = os.getenv('RECOGNITION_GALLERY_URL', '') or None
+RECOGNITION_SIMILAR_MAX_K = int(os.getenv('RECOGNITION_SIMILAR_MAX_K', '50'))  # 一次最多返回的相似图片数
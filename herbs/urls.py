@@ -1,10 +1,11 @@
 from django.contrib import admin
 from django.urls import path, include
-from .views import search_by_category
+from .views import search_by_category, category_facets
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/search/category/', search_by_category, name='search_by_category'),
+    path('api/search/category/facets/', category_facets, name='category_facets'),
     path('api/', include('api.urls')),
     path('chat/', include('chat.urls')),
     path('recognition/', include('recognition.urls')),
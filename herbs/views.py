@@ -1,8 +1,13 @@
 from django.http import JsonResponse
 from api.models import Herb
-from django.db.models import Q
+from api.facets import CATEGORY_FIELDS, FACETS, facet_index, parse_filters
+from api.response_cache import response_cache
+from api.tracing import span, tracer
 from django.views.decorators.csrf import csrf_exempt
 import json
+import logging
+
+logger = logging.getLogger(__name__)
 
 def add_cors_headers(response):
     response["Access-Control-Allow-Origin"] = "*"
@@ -11,6 +16,16 @@ def add_cors_headers(response):
     response["Access-Control-Max-Age"] = "1728000"
     return response
 
+def _category_database(category_type, sub_category):
+    """原有的数据库子串查询，分类值无法识别或索引不可用时使用"""
+    if category_type not in FACETS:
+        return []
+    return list(Herb.objects.filter(**{
+        f'{category_type}__icontains': sub_category
+    }).values(*CATEGORY_FIELDS).order_by('name'))
+
+@tracer.traced('category')
+@response_cache.cached('category')
 @csrf_exempt
 def search_by_category(request):
     if request.method == "OPTIONS":
@@ -22,9 +37,11 @@ def search_by_category(request):
             data = json.loads(request.body)
             category_type = data.get('type', '')
             sub_category = data.get('subCategory', '')
-            print(f"Received category type: {category_type}, sub category: {sub_category}")
-            
-            if not category_type or not sub_category:
+            # 可选的多条件筛选，如 {"taste": ["苦"], "meridian": ["肝经"]}，与 type/subCategory 取交集
+            facets = data.get('facets') or {}
+            logger.debug(f"Received category type: {category_type}, sub category: {sub_category}, facets: {facets}")
+
+            if not facets and (not category_type or not sub_category):
                 response = JsonResponse({
                     'success': False,
                     'error': 'Category information not provided',
@@ -32,43 +49,78 @@ def search_by_category(request):
                 }, status=200)
                 return add_cors_headers(response)
 
-            # 根据不同分类类型进行查询
-            if category_type == 'taste':
-                # 按性味查询
-                results = list(Herb.objects.filter(
-                    taste__icontains=sub_category
-                ).values(
-                    'name', 'alias', 'taste', 'meridian', 'effect',
-                    'indication', 'usage', 'contraindication'
-                ).order_by('name'))
-                
-            elif category_type == 'meridian':
-                # 按归经查询
-                results = list(Herb.objects.filter(
-                    meridian__icontains=sub_category
-                ).values(
-                    'name', 'alias', 'taste', 'meridian', 'effect',
-                    'indication', 'usage', 'contraindication'
-                ).order_by('name'))
+            values = {}
+            if isinstance(facets, dict):
+                values = {facet: list(v) if isinstance(v, (list, tuple)) else [v] for facet, v in facets.items()}
+            if category_type and sub_category:
+                values.setdefault(category_type, []).append(sub_category)
+            filters = parse_filters(values)
+
+            # 在分面索引中按规范化的性味、归经词求交集；无法识别的分类值沿用数据库子串查询
+            if filters and all(filters.values()):
+                try:
+                    with span('match'):
+                        index = facet_index.get()
+                        results = index.records(index.select(filters))
+                except Exception as e:
+                    logger.error(f"Facet index unavailable, falling back to database: {str(e)}")
+                    results = _category_database(category_type, sub_category)
+            elif not facets:
+                with span('query'):
+                    results = _category_database(category_type, sub_category)
             else:
                 results = []
 
-            print(f"Found {len(results)} results for {category_type} - {sub_category}")
+            logger.debug(f"Found {len(results)} results for {category_type} - {sub_category}")
             
             response = JsonResponse({
                 'success': True,
                 'data': results,
                 'category_type': category_type,
                 'sub_category': sub_category,
+                'filters': filters,
                 'count': len(results)
             }, status=200)
             return add_cors_headers(response)
 
     except Exception as e:
-        print(f"Category search error: {str(e)}")
+        logger.error(f"Category search error: {str(e)}")
         response = JsonResponse({
             'success': False,
             'error': str(e),
             'data': []
         }, status=200)
-        return add_cors_headers(response) 
\ No newline at end of file
+        return add_cors_headers(response)
+
+@tracer.traced('category-facets')
+@response_cache.cached('category-facets')
+@csrf_exempt
+def category_facets(request):
+    """
+    各性味、归经分类下的药材数
+    可选的查询参数 taste、meridian（可重复）用于在已选条件下统计
+    """
+    if request.method == "OPTIONS":
+        response = JsonResponse({})
+        return add_cors_headers(response)
+
+    try:
+        filters = parse_filters({facet: request.GET.getlist(facet) for facet in FACETS})
+        index = facet_index.get()
+        docs = index.select(filters)
+        response = JsonResponse({
+            'success': True,
+            'data': index.counts(docs),
+            'filters': filters,
+            'count': len(index) if docs is None else len(docs)
+        }, status=200)
+        return add_cors_headers(response)
+
+    except Exception as e:
+        logger.error(f"Category facets error: {str(e)}")
+        response = JsonResponse({
+            'success': False,
+            'error': str(e),
+            'data': {}
+        }, status=200)
+        return add_cors_headers(response)
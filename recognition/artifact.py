@@ -0,0 +1,157 @@
+import os
+import json
+import time
+import logging
+from contextlib import nullcontext
+
+import torch
+import torch.nn as nn
+import torchvision.models as models
+
+logger = logging.getLogger(__name__)
+
+ARTIFACT_FORMAT_VERSION = 1
+
+# 可在sidecar中描述的分类头层类型
+_HEAD_LAYERS = {
+    'Linear': lambda spec: nn.Linear(spec['in_features'], spec['out_features'], bias=spec.get('bias', True)),
+    'Dropout': lambda spec: nn.Dropout(spec.get('p', 0.5)),
+    'ReLU': lambda spec: nn.ReLU(inplace=spec.get('inplace', False)),
+    'BatchNorm1d': lambda spec: nn.BatchNorm1d(spec['num_features']),
+}
+
+
+def sidecar_path(weights_path):
+    """推理权重文件对应的JSON元数据路径"""
+    return os.path.splitext(weights_path)[0] + '.json'
+
+
+def is_inference_artifact(model_path):
+    """判断模型路径是否为 convert_model 生成的精简推理文件"""
+    return os.path.exists(sidecar_path(model_path))
+
+
+def read_sidecar(weights_path):
+    """读取精简推理文件的JSON元数据"""
+    with open(sidecar_path(weights_path), 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _describe_layer(layer):
+    name = layer.__class__.__name__
+    if name == 'Linear':
+        return {'type': name, 'in_features': layer.in_features, 'out_features': layer.out_features,
+                'bias': layer.bias is not None}
+    if name == 'Dropout':
+        return {'type': name, 'p': layer.p}
+    if name == 'ReLU':
+        return {'type': name, 'inplace': layer.inplace}
+    if name == 'BatchNorm1d':
+        return {'type': name, 'num_features': layer.num_features}
+    raise ValueError(f'Unsupported classifier layer: {name}')
+
+
+def describe_head(fc):
+    """将分类头结构描述为可JSON序列化的层列表"""
+    layers = list(fc) if isinstance(fc, nn.Sequential) else [fc]
+    return {
+        'sequential': isinstance(fc, nn.Sequential),
+        'layers': [_describe_layer(layer) for layer in layers],
+    }
+
+
+def build_head(spec):
+    """根据 describe_head 的描述重建分类头"""
+    layers = [_HEAD_LAYERS[layer['type']](layer) for layer in spec['layers']]
+    if spec['sequential']:
+        return nn.Sequential(*layers)
+    return layers[0]
+
+
+def write_inference_artifact(model, weights_path, best_val_acc=None, fp16=False, source=None):
+    """
+    从训练好的模型生成仅含推理所需内容的权重文件及JSON元数据
+    Args:
+        model: torchvision ResNet50 模型
+        weights_path: 权重文件输出路径
+        best_val_acc: 训练时的最佳验证集准确率
+        fp16: 是否以半精度存储权重（文件减半，加载时转换回fp32）
+        source: 来源检查点路径，记录在元数据中
+    Returns:
+        dict: 写入的元数据
+    """
+    model = model.cpu().eval()
+    head = describe_head(model.fc)
+
+    # 确认权重可以被标准ResNet50结构完整加载
+    probe = models.resnet50()
+    probe.fc = build_head(head)
+    probe.load_state_dict(model.state_dict(), strict=True)
+
+    state_dict = {
+        key: (value.half() if fp16 and value.is_floating_point() else value).contiguous()
+        for key, value in model.state_dict().items()
+    }
+    torch.save(state_dict, weights_path)
+
+    num_classes = head['layers'][-1].get('out_features') if head['layers'][-1]['type'] == 'Linear' else None
+    metadata = {
+        'format_version': ARTIFACT_FORMAT_VERSION,
+        'architecture': model.__class__.__name__,
+        'arch': 'resnet50',
+        'head': head,
+        'num_parameters': sum(p.numel() for p in model.parameters()),
+        'num_classes': num_classes,
+        'best_val_acc': best_val_acc if best_val_acc is not None else 'N/A',
+        'dtype': 'float16' if fp16 else 'float32',
+        'weights_file': os.path.basename(weights_path),
+        'weights_size': os.path.getsize(weights_path),
+        'source': os.path.basename(source) if source else None,
+        'created_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+    }
+    with open(sidecar_path(weights_path), 'w', encoding='utf-8') as f:
+        json.dump(metadata, f, ensure_ascii=False, indent=2)
+    return metadata
+
+
+def _load_state_dict(weights_path):
+    """以内存映射方式加载权重，旧版PyTorch退化为普通加载"""
+    try:
+        return torch.load(weights_path, map_location='cpu', mmap=True, weights_only=True), True
+    except TypeError:
+        return torch.load(weights_path, map_location='cpu'), False
+
+
+def load_inference_model(weights_path, device):
+    """
+    加载 write_inference_artifact 生成的精简推理文件
+    Args:
+        weights_path: 权重文件路径
+        device: 运行设备
+    Returns:
+        (model, metadata)
+    """
+    metadata = read_sidecar(weights_path)
+    if metadata.get('arch') != 'resnet50':
+        raise ValueError(f'Unsupported architecture in artifact: {metadata.get("arch")}')
+
+    state_dict, mmapped = _load_state_dict(weights_path)
+    if metadata.get('dtype') == 'float16':
+        state_dict = {
+            key: value.float() if value.is_floating_point() else value
+            for key, value in state_dict.items()
+        }
+
+    with torch.device('meta') if mmapped else nullcontext():
+        model = models.resnet50()
+        model.fc = build_head(metadata['head'])
+    if mmapped:
+        # 直接使用内存映射的张量作为参数，多个worker可共享同一份页缓存
+        model.load_state_dict(state_dict, strict=True, assign=True)
+    else:
+        model.load_state_dict(state_dict, strict=True)
+    model = model.to(device)
+    model.eval()
+    logger.debug(f"Loaded inference artifact {weights_path} (mmap={mmapped}, dtype={metadata.get('dtype')})")
+    return model, metadata
+
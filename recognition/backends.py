@@ -0,0 +1,141 @@
+import os
+import logging
+
+import torch
+
+logger = logging.getLogger(__name__)
+
+# 导出模型时使用的固定输入尺寸
+INPUT_SIZE = 224
+
+BACKEND_EAGER = 'eager'
+BACKEND_TORCHSCRIPT = 'torchscript'
+BACKEND_ONNX = 'onnx'
+BACKEND_QUANTIZED = 'quantized'
+BACKENDS = (BACKEND_EAGER, BACKEND_TORCHSCRIPT, BACKEND_ONNX, BACKEND_QUANTIZED)
+
+
+class EagerBackend:
+    """直接调用PyTorch模型（eager模式）"""
+
+    name = BACKEND_EAGER
+
+    def __init__(self, model, device):
+        self.model = model
+        self.device = device
+
+    def __call__(self, batch):
+        with torch.no_grad():
+            return self.model(batch.to(self.device))
+
+
+class TorchScriptBackend:
+    """加载 export_model 导出的 TorchScript 模型（已冻结并针对推理优化）"""
+
+    name = BACKEND_TORCHSCRIPT
+
+    def __init__(self, path, device):
+        if not os.path.exists(path):
+            raise FileNotFoundError(f'TorchScript model not found: {path}')
+        self.device = device
+        self.model = torch.jit.load(path, map_location=device)
+        self.model.eval()
+        logger.info(f'Loaded TorchScript model from {path}')
+
+    def __call__(self, batch):
+        with torch.no_grad():
+            return self.model(batch.to(self.device))
+
+
+class QuantizedBackend(TorchScriptBackend):
+    """加载 quantize_model 生成的INT8 TorchScript模型（仅支持CPU）"""
+
+    name = BACKEND_QUANTIZED
+
+    def __init__(self, path, engine=None):
+        supported = torch.backends.quantized.supported_engines
+        engine = engine or ('fbgemm' if 'fbgemm' in supported else 'qnnpack')
+        torch.backends.quantized.engine = engine
+        super().__init__(path, torch.device('cpu'))
+
+
+class OnnxRuntimeBackend:
+    """使用 ONNX Runtime 的CPU执行器运行 export_model 导出的 ONNX 模型"""
+
+    name = BACKEND_ONNX
+
+    def __init__(self, path, num_threads=None):
+        if not os.path.exists(path):
+            raise FileNotFoundError(f'ONNX model not found: {path}')
+        try:
+            import onnxruntime as ort
+        except ImportError:
+            raise ImportError('使用ONNX后端需要安装 onnxruntime: pip install onnxruntime')
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads:
+            options.intra_op_num_threads = int(num_threads)
+        self.session = ort.InferenceSession(path, sess_options=options, providers=['CPUExecutionProvider'])
+        self.input_name = self.session.get_inputs()[0].name
+        logger.info(f'Loaded ONNX model from {path}')
+
+    def __call__(self, batch):
+        inputs = batch.detach().cpu().numpy()
+        outputs = self.session.run(None, {self.input_name: inputs})[0]
+        return torch.from_numpy(outputs)
+
+
+def load_backend(name, model=None, path=None, device=None):
+    """
+    根据名称创建推理后端
+    Args:
+        name: 后端名称，eager / torchscript / onnx / quantized
+        model: eager后端使用的PyTorch模型
+        path: torchscript/onnx/quantized后端使用的导出文件路径
+        device: 运行设备
+    Returns:
+        可调用对象，输入 (N, 3, 224, 224) 张量，输出 (N, num_classes) logits
+    """
+    device = device or torch.device('cpu')
+    if name == BACKEND_EAGER:
+        if model is None:
+            raise ValueError('eager backend requires a model')
+        return EagerBackend(model, device)
+    if name == BACKEND_TORCHSCRIPT:
+        return TorchScriptBackend(path, device)
+    if name == BACKEND_ONNX:
+        return OnnxRuntimeBackend(path, num_threads=torch.get_num_threads())
+    if name == BACKEND_QUANTIZED:
+        return QuantizedBackend(path)
+    raise ValueError(f'Unknown recognition backend: {name} (expected one of {", ".join(BACKENDS)})')
+
+
+def export_torchscript(model, path):
+    """将模型trace为TorchScript，冻结并针对推理优化后保存"""
+    model = model.cpu().eval()
+    example = torch.randn(1, 3, INPUT_SIZE, INPUT_SIZE)
+    with torch.no_grad():
+        traced = torch.jit.trace(model, example)
+        frozen = torch.jit.freeze(traced)
+        optimized = torch.jit.optimize_for_inference(frozen)
+    optimized.save(path)
+    return path
+
+
+def export_onnx(model, path, opset_version=17):
+    """导出固定224×224输入、动态batch维度的ONNX模型"""
+    model = model.cpu().eval()
+    example = torch.randn(1, 3, INPUT_SIZE, INPUT_SIZE)
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            example,
+            path,
+            input_names=['input'],
+            output_names=['logits'],
+            dynamic_axes={'input': {0: 'batch'}, 'logits': {0: 'batch'}},
+            opset_version=opset_version,
+            do_constant_folding=True,
+        )
+    return path
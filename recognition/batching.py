@@ -0,0 +1,236 @@
+import threading
+import queue
+import time
+import logging
+from collections import deque
+
+import torch
+
+from .evaluation import percentile
+from .exceptions import BatchTimeoutError
+
+logger = logging.getLogger(__name__)
+
+
+class _PendingRequest:
+    """排队中的单个识别请求（top_k 为 None 时 tensor 为已组好的batch，只执行前向推理并返回概率）"""
+
+    __slots__ = ('tensor', 'top_k', 'recognizer', 'enqueued_at', 'event', 'results', 'error')
+
+    def __init__(self, tensor, top_k, recognizer):
+        self.tensor = tensor
+        self.top_k = top_k
+        self.recognizer = recognizer
+        self.enqueued_at = time.perf_counter()
+        self.event = threading.Event()
+        self.results = None
+        self.error = None
+
+
+class BatchingEngine:
+    """
+    动态批量推理引擎
+
+    在一个时间窗口内收集并发到达的识别请求，拼接为一个batch后执行一次前向推理，
+    再把每张图片的top-k结果分发回对应的等待请求。
+    一个batch只包含使用同一个识别器的请求：切换线上模型时，已取得旧识别器的请求仍由旧模型完成。
+    """
+
+    def __init__(self, recognizer, max_batch_size=8, window_ms=10, num_threads=None, stats_size=1000):
+        """
+        初始化批量推理引擎
+        Args:
+            recognizer: HerbRecognizer实例
+            max_batch_size: 单个batch的最大图片数
+            window_ms: 收集请求的时间窗口（毫秒），从batch中第一个请求到达时开始计时
+            num_threads: 批量推理线程的PyTorch算子内线程数，为空时使用PyTorch默认值
+            stats_size: 统计信息保留的最近batch数量
+        """
+        self.recognizer = recognizer
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.window = max(0.0, float(window_ms)) / 1000.0
+        self.num_threads = max(1, int(num_threads)) if num_threads else None
+        self._queue = queue.Queue()
+        self._carry = deque()  # 识别器与当前batch不同、留到后面的batch的请求（只由后台线程访问）
+        self._stats_lock = threading.Lock()
+        self._batches = deque(maxlen=stats_size)
+        self._requests = deque(maxlen=stats_size)
+        self._total_batches = 0
+        self._total_requests = 0
+        self._closed = False
+        self._worker = threading.Thread(target=self._run, name='recognition-batching', daemon=True)
+        self._worker.start()
+        logger.info(
+            f'BatchingEngine started: max_batch_size={self.max_batch_size}, window_ms={window_ms}, '
+            f'num_threads={self.num_threads}'
+        )
+
+    def submit(self, tensor, top_k=5, timeout=30, recognizer=None):
+        """
+        提交一张预处理后的图片并等待识别结果
+        Args:
+            tensor: 形状为 (3, 224, 224) 的张量
+            top_k: 返回前k个预测结果
+            timeout: 等待结果的最长时间（秒）
+            recognizer: 执行推理的识别器，默认为提交时的线上识别器
+        Returns:
+            list: 包含dict的列表，每个dict包含name和similarity
+        """
+        return self._wait(_PendingRequest(tensor, top_k, recognizer or self.recognizer), timeout)
+
+    def forward(self, batch, recognizer=None, timeout=30):
+        """
+        在批量推理线程中对已组好的batch（如测试时增强的多个视图）单独执行一次前向推理，
+        使其与其他推理共用同一个线程数限定
+        Args:
+            batch: 形状为 (N, 3, 224, 224) 的张量
+            recognizer: 执行推理的识别器，默认为提交时的线上识别器
+            timeout: 等待结果的最长时间（秒）
+        Returns:
+            torch.Tensor: 形状为 (N, num_classes) 的概率张量
+        """
+        return self._wait(_PendingRequest(batch, None, recognizer or self.recognizer), timeout)
+
+    def _wait(self, pending, timeout):
+        if self._closed:
+            raise RuntimeError('BatchingEngine is closed')
+        self._queue.put(pending)
+        if not pending.event.wait(timeout):
+            raise BatchTimeoutError(f'等待识别结果超时 ({timeout}s)')
+        if pending.error is not None:
+            raise pending.error
+        return pending.results
+
+    def close(self):
+        """停止后台线程"""
+        self._closed = True
+        self._queue.put(None)
+
+    def _collect(self):
+        """阻塞等待第一个请求，然后在时间窗口内尽量凑满一个使用同一识别器的batch"""
+        first = self._carry.popleft() if self._carry else self._queue.get()
+        if first is None:
+            return None
+        batch = [first]
+        if first.top_k is None:
+            # 已组好的batch单独执行
+            return batch
+        carried = []
+        while self._carry and len(batch) < self.max_batch_size:
+            item = self._carry.popleft()
+            (batch if self._joins(first, item) else carried).append(item)
+        self._carry.extendleft(reversed(carried))
+        deadline = first.enqueued_at + self.window
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                self._queue.put(None)
+                break
+            if not self._joins(first, item):
+                # 模型切换前后到达的请求、已组好的batch：留给后面的batch
+                self._carry.append(item)
+                continue
+            batch.append(item)
+        return batch
+
+    @staticmethod
+    def _joins(first, item):
+        """请求能否并入以 first 开始的batch"""
+        return item.top_k is not None and item.recognizer is first.recognizer
+
+    def _run(self):
+        # 所有前向推理都在本线程执行，算子内线程数在这里限定
+        if self.num_threads is not None:
+            torch.set_num_threads(self.num_threads)
+        while True:
+            batch = self._collect()
+            if batch is None:
+                logger.info('BatchingEngine stopped')
+                return
+            self._process(batch)
+
+    def _process(self, batch):
+        started = time.perf_counter()
+        # 整个batch的请求使用同一个识别器（见 _collect）
+        recognizer = batch[0].recognizer
+        try:
+            if batch[0].top_k is None:
+                batch[0].results = recognizer.forward_batch(batch[0].tensor)
+                forward_ms = (time.perf_counter() - started) * 1000
+            else:
+                stacked = torch.stack([item.tensor for item in batch])
+                probabilities = recognizer.forward_batch(stacked)
+                forward_ms = (time.perf_counter() - started) * 1000
+                for item, row in zip(batch, probabilities):
+                    item.results = recognizer.format_topk(row, item.top_k)
+        except Exception as e:
+            logger.error(f'Batch inference failed (size={len(batch)}): {str(e)}')
+            forward_ms = (time.perf_counter() - started) * 1000
+            for item in batch:
+                item.error = e
+
+        finished = time.perf_counter()
+        with self._stats_lock:
+            self._total_batches += 1
+            self._total_requests += len(batch)
+            self._batches.append((len(batch), forward_ms))
+            for item in batch:
+                self._requests.append((
+                    (started - item.enqueued_at) * 1000,
+                    (finished - item.enqueued_at) * 1000,
+                ))
+        for item in batch:
+            item.event.set()
+
+    def stats(self):
+        """
+        获取最近若干个batch的统计信息
+        Returns:
+            dict: batch大小分布、前向耗时及请求端到端延迟的百分位数（毫秒）
+        """
+        with self._stats_lock:
+            batches = list(self._batches)
+            requests = list(self._requests)
+            total_batches = self._total_batches
+            total_requests = self._total_requests
+
+        sizes = [size for size, _ in batches]
+        forward = sorted(ms for _, ms in batches)
+        waits = sorted(wait for wait, _ in requests)
+        latencies = sorted(latency for _, latency in requests)
+        histogram = {}
+        for size in sizes:
+            histogram[size] = histogram.get(size, 0) + 1
+
+        return {
+            'config': {
+                'max_batch_size': self.max_batch_size,
+                'window_ms': self.window * 1000,
+                'num_threads': self.num_threads,
+            },
+            'total_batches': total_batches,
+            'total_requests': total_requests,
+            'queue_depth': self._queue.qsize(),
+            'recent_batches': len(batches),
+            'mean_batch_size': sum(sizes) / len(sizes) if sizes else 0.0,
+            'batch_size_histogram': {str(k): v for k, v in sorted(histogram.items())},
+            'forward_ms': {
+                'p50': percentile(forward, 50),
+                'p95': percentile(forward, 95),
+                'p99': percentile(forward, 99),
+            },
+            'queue_wait_ms': {
+                'p50': percentile(waits, 50),
+                'p95': percentile(waits, 95),
+                'p99': percentile(waits, 99),
+            },
+            'latency_ms': {
+                'p50': percentile(latencies, 50),
+                'p95': percentile(latencies, 95),
+                'p99': percentile(latencies, 99),
+            },
+        }
@@ -0,0 +1,255 @@
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+
+def content_hash(data):
+    """上传图片原始字节的SHA-256"""
+    return hashlib.sha256(data).hexdigest()
+
+
+def perceptual_hash(image, hash_size=8):
+    """
+    计算图片的差值哈希（dHash），用于识别重新压缩、缩放后的近似重复图片
+    Args:
+        image: PIL图片
+        hash_size: 哈希边长，结果为 hash_size*hash_size 位整数
+    Returns:
+        int: 感知哈希
+    """
+    small = image.convert('L').resize((hash_size + 1, hash_size), Image.BILINEAR)
+    pixels = list(small.getdata())
+    value = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+
+class _SharedStore:
+    """基于SQLite的跨进程缓存层，多个gunicorn worker共享同一个文件"""
+
+    def __init__(self, path, ttl):
+        self.path = path
+        self.ttl = ttl
+        self._local = threading.local()
+        conn = self._connection()
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS predictions ('
+            ' key TEXT PRIMARY KEY,'
+            ' model_version TEXT NOT NULL,'
+            ' results TEXT NOT NULL,'
+            ' created_at REAL NOT NULL)'
+        )
+        conn.commit()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=1.0, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        row = self._connection().execute(
+            'SELECT results, created_at FROM predictions WHERE key = ?', (key,)
+        ).fetchone()
+        if row is None or time.time() - row[1] > self.ttl:
+            return None
+        return json.loads(row[0])
+
+    def set(self, key, model_version, results):
+        self._connection().execute(
+            'INSERT OR REPLACE INTO predictions (key, model_version, results, created_at) VALUES (?, ?, ?, ?)',
+            (key, model_version, json.dumps(results, ensure_ascii=False), time.time())
+        )
+
+    def prune(self, model_version):
+        """删除其他模型版本及已过期的记录"""
+        cursor = self._connection().execute(
+            'DELETE FROM predictions WHERE model_version != ? OR created_at < ?',
+            (model_version, time.time() - self.ttl)
+        )
+        return cursor.rowcount
+
+
+class PredictionCache:
+    """
+    以图片内容为键的识别结果缓存
+
+    第一层为进程内LRU（带TTL），第二层为可选的SQLite共享缓存；
+    可选地按感知哈希匹配近似重复的图片。缓存键包含模型版本，模型更换后旧结果自动失效。
+    """
+
+    def __init__(self, max_entries=1024, ttl=86400, shared_path=None, phash_distance=None):
+        """
+        初始化缓存
+        Args:
+            max_entries: 进程内缓存的最大条目数
+            ttl: 缓存有效期（秒）
+            shared_path: SQLite共享缓存文件路径，为空时不启用
+            phash_distance: 感知哈希允许的最大汉明距离，为 None 时不启用近似匹配
+        """
+        self.max_entries = max(1, int(max_entries))
+        self.ttl = ttl
+        self.phash_distance = phash_distance
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (expires_at, results)
+        self._phashes = OrderedDict()  # (model_version, top_k) -> OrderedDict(phash -> key)
+        self._counters = {
+            'memory_hits': 0,
+            'shared_hits': 0,
+            'phash_hits': 0,
+            'misses': 0,
+            'stores': 0,
+            'evictions': 0,
+            'shared_errors': 0,
+        }
+        self._shared = None
+        if shared_path:
+            try:
+                self._shared = _SharedStore(shared_path, ttl)
+            except sqlite3.Error as e:
+                logger.error(f'Failed to open shared prediction cache {shared_path}: {str(e)}')
+
+    @property
+    def phash_enabled(self):
+        return self.phash_distance is not None
+
+    @staticmethod
+    def make_key(digest, model_version, top_k):
+        return f'{model_version}:{top_k}:{digest}'
+
+    def _count(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+    def _memory_get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def _memory_set(self, key, results):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, results)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._counters['evictions'] += 1
+
+    def get(self, digest, model_version, top_k):
+        """
+        按内容哈希查询缓存（先进程内，再共享层）
+        Returns:
+            list: 缓存的识别结果，未命中时返回 None
+        """
+        key = self.make_key(digest, model_version, top_k)
+        results = self._memory_get(key)
+        if results is not None:
+            self._count('memory_hits')
+            return results
+        if self._shared is not None:
+            try:
+                results = self._shared.get(key)
+            except sqlite3.Error as e:
+                logger.error(f'Shared prediction cache read failed: {str(e)}')
+                self._count('shared_errors')
+                results = None
+            if results is not None:
+                self._memory_set(key, results)
+                self._count('shared_hits')
+                return results
+        return None
+
+    def get_similar(self, phash, model_version, top_k):
+        """
+        按感知哈希查找近似重复图片的缓存结果
+        Returns:
+            list: 缓存的识别结果，未命中时返回 None
+        """
+        if not self.phash_enabled or phash is None:
+            return None
+        with self._lock:
+            candidates = self._phashes.get((model_version, top_k))
+            items = list(candidates.items()) if candidates else []
+        for known, key in reversed(items):
+            if bin(known ^ phash).count('1') <= self.phash_distance:
+                results = self._memory_get(key)
+                if results is not None:
+                    self._count('phash_hits')
+                    return results
+        return None
+
+    def miss(self):
+        """记录一次未命中（需要执行推理）"""
+        self._count('misses')
+
+    def set(self, digest, model_version, top_k, results, phash=None):
+        """写入识别结果"""
+        key = self.make_key(digest, model_version, top_k)
+        self._memory_set(key, results)
+        if phash is not None and self.phash_enabled:
+            with self._lock:
+                bucket = self._phashes.setdefault((model_version, top_k), OrderedDict())
+                bucket[phash] = key
+                bucket.move_to_end(phash)
+                while len(bucket) > self.max_entries:
+                    bucket.popitem(last=False)
+        if self._shared is not None:
+            try:
+                self._shared.set(key, model_version, results)
+            except sqlite3.Error as e:
+                logger.error(f'Shared prediction cache write failed: {str(e)}')
+                self._count('shared_errors')
+        self._count('stores')
+
+    def prune(self, model_version):
+        """清理与当前模型版本不符的缓存"""
+        with self._lock:
+            for key in [k for k in self._entries if not k.startswith(f'{model_version}:')]:
+                del self._entries[key]
+            for bucket_key in [k for k in self._phashes if k[0] != model_version]:
+                del self._phashes[bucket_key]
+        if self._shared is not None:
+            try:
+                removed = self._shared.prune(model_version)
+                logger.info(f'Pruned {removed} stale entries from shared prediction cache')
+            except sqlite3.Error as e:
+                logger.error(f'Shared prediction cache prune failed: {str(e)}')
+
+    def stats(self):
+        """命中/未命中计数及命中率"""
+        with self._lock:
+            counters = dict(self._counters)
+            size = len(self._entries)
+        hits = counters['memory_hits'] + counters['shared_hits'] + counters['phash_hits']
+        lookups = hits + counters['misses']
+        return {
+            'config': {
+                'max_entries': self.max_entries,
+                'ttl': self.ttl,
+                'shared': self._shared.path if self._shared is not None else None,
+                'phash_distance': self.phash_distance,
+            },
+            'entries': size,
+            'hits': hits,
+            'hit_rate': hits / lookups if lookups else 0.0,
+            **counters,
+        }
@@ -0,0 +1,154 @@
+import time
+import logging
+import threading
+from collections import deque
+
+import torch
+
+from .model_utils import HerbRecognizer
+
+logger = logging.getLogger(__name__)
+
+
+class CascadeRecognizer:
+    """
+    级联识别器
+
+    先用小模型推理，top-1概率达到阈值的图片直接使用小模型结果，其余图片再交给完整模型。
+    预处理、模型信息、特征提取等其他属性和方法均使用完整模型的实现。
+    """
+
+    def __init__(self, fast, full, threshold=0.9, fast_version=None, full_version=None, stats_size=1000):
+        """
+        初始化级联识别器
+        Args:
+            fast: 小模型的 HerbRecognizer
+            full: 完整模型的 HerbRecognizer
+            threshold: 小模型top-1概率不低于该值时不再调用完整模型
+            fast_version: 小模型在注册表中的版本名
+            full_version: 完整模型在注册表中的版本名
+            stats_size: 统计信息保留的最近batch数
+        """
+        if fast.class_names != full.class_names:
+            raise ValueError('Cascade models must share the same class_names.json')
+        self.fast = fast
+        self.full = full
+        self.threshold = float(threshold)
+        self.fast_version = fast_version
+        self.full_version = full_version
+        self._lock = threading.Lock()
+        self._counters = {'images': 0, 'escalated': 0}
+        self._recent = deque(maxlen=stats_size)  # (images, escalated, fast_ms, full_ms)
+
+    def __getattr__(self, name):
+        full = self.__dict__.get('full')
+        if full is None:
+            raise AttributeError(name)
+        return getattr(full, name)
+
+    @property
+    def model_version(self):
+        """级联结果同时取决于两个模型和阈值"""
+        return f'cascade-{self.threshold:g}-{self.fast.model_version}-{self.full.model_version}'
+
+    def forward_batch(self, batch):
+        """
+        级联前向推理：整个batch先经过小模型，只把置信度低于阈值的图片组成子batch交给完整模型
+        Args:
+            batch: 形状为 (N, 3, 224, 224) 的张量
+        Returns:
+            torch.Tensor: 形状为 (N, num_classes) 的概率张量（位于CPU）
+        """
+        started = time.perf_counter()
+        probabilities = self.fast.forward_batch(batch)
+        fast_ms = (time.perf_counter() - started) * 1000
+
+        confidence = probabilities.max(dim=1).values
+        escalate = (confidence < self.threshold).nonzero(as_tuple=True)[0]
+        full_ms = 0.0
+        if len(escalate):
+            started = time.perf_counter()
+            subset = batch if len(escalate) == batch.shape[0] else batch[escalate]
+            probabilities[escalate] = self.full.forward_batch(subset)
+            full_ms = (time.perf_counter() - started) * 1000
+
+        with self._lock:
+            self._counters['images'] += batch.shape[0]
+            self._counters['escalated'] += len(escalate)
+            self._recent.append((batch.shape[0], len(escalate), fast_ms, full_ms))
+        return probabilities
+
+    def predict(self, image_file, top_k=5):
+        """对输入图片进行级联预测"""
+        return HerbRecognizer.predict(self, image_file, top_k)
+
+    def predict_batch(self, images, top_k=5):
+        """对同一药材的多张图片进行级联识别"""
+        return HerbRecognizer.predict_batch(self, images, top_k)
+
+    def stats(self):
+        """升级率、两级模型耗时及相对始终使用完整模型估算节省的耗时（毫秒/张）"""
+        with self._lock:
+            recent = list(self._recent)
+            counters = dict(self._counters)
+        images = sum(item[0] for item in recent)
+        escalated = sum(item[1] for item in recent)
+        fast_total = sum(item[2] for item in recent)
+        full_total = sum(item[3] for item in recent)
+        fast_per_image = fast_total / images if images else None
+        # 完整模型单张耗时按升级子batch的实测值估算
+        full_per_image = full_total / escalated if escalated else None
+        cascade_per_image = (fast_total + full_total) / images if images else None
+        return {
+            'threshold': self.threshold,
+            'fast_model': self.fast_version,
+            'full_model': self.full_version,
+            **counters,
+            'escalation_rate': escalated / images if images else None,
+            'fast_ms_per_image': fast_per_image,
+            'full_ms_per_image': full_per_image,
+            'cascade_ms_per_image': cascade_per_image,
+            'saved_ms_per_image': (
+                full_per_image - cascade_per_image
+                if full_per_image is not None and cascade_per_image is not None else None
+            ),
+        }
+
+
+def evaluate_cascade(fast_probs, full_probs, fast_ms, full_ms, thresholds, labels=None):
+    """
+    在评估集上按不同阈值模拟级联推理
+    Args:
+        fast_probs: 小模型概率 (N, num_classes)
+        full_probs: 完整模型概率 (N, num_classes)
+        fast_ms: 小模型单张图片的平均推理耗时（毫秒）
+        full_ms: 完整模型单张图片的平均推理耗时（毫秒）
+        thresholds: 需要评估的置信度阈值
+        labels: 可选的真实类别序号张量 (N,)，-1 表示未知
+    Returns:
+        list: 每个阈值的升级率、与完整模型的top-1一致率、准确率及平均耗时
+    """
+    fast_conf, fast_top1 = fast_probs.max(dim=1)
+    full_top1 = full_probs.argmax(dim=1)
+    known = labels >= 0 if labels is not None else None
+    has_labels = known is not None and bool(known.any())
+
+    report = []
+    for threshold in thresholds:
+        escalated = fast_conf < threshold
+        top1 = torch.where(escalated, full_top1, fast_top1)
+        rate = escalated.float().mean().item()
+        latency = fast_ms + rate * full_ms
+        entry = {
+            'threshold': threshold,
+            'escalation_rate': rate,
+            'agreement_with_full': (top1 == full_top1).float().mean().item(),
+            'mean_latency_ms': latency,
+            'saved_ms_per_image': full_ms - latency,
+            'speedup': full_ms / latency if latency else None,
+        }
+        if has_labels:
+            entry['accuracy'] = (top1[known] == labels[known]).float().mean().item()
+            entry['full_accuracy'] = (full_top1[known] == labels[known]).float().mean().item()
+        report.append(entry)
+    return report
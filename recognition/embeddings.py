@@ -0,0 +1,120 @@
+import os
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def _normalize(vectors):
+    """按行L2归一化"""
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+class EmbeddingIndex:
+    """
+    参考图库的特征向量索引
+
+    特征经L2归一化，可选地用PCA降维后以float16存储；查询时在内存中以float32矩阵运算计算余弦相似度，
+    用 argpartition 取前k个，数万张图片的图库查询在毫秒级完成。
+    """
+
+    def __init__(self, vectors, labels, paths, mean=None, components=None, model_version=None):
+        """
+        Args:
+            vectors: (N, D) 已归一化的特征矩阵
+            labels: 每张参考图片的药材名称
+            paths: 每张参考图片相对于图库目录的路径
+            mean: PCA均值 (2048,)，未降维时为 None
+            components: PCA投影矩阵 (D, 2048)，未降维时为 None
+            model_version: 生成索引时使用的模型版本
+        """
+        self.vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        self.labels = list(labels)
+        self.paths = list(paths)
+        self.mean = None if mean is None else np.asarray(mean, dtype=np.float32)
+        self.components = None if components is None else np.asarray(components, dtype=np.float32)
+        self.model_version = model_version
+
+    def __len__(self):
+        return self.vectors.shape[0]
+
+    @property
+    def dims(self):
+        return self.vectors.shape[1]
+
+    def project(self, embeddings):
+        """将原始特征投影到索引空间并归一化"""
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        if self.components is not None:
+            embeddings = (embeddings - self.mean) @ self.components.T
+        return _normalize(embeddings)
+
+    @classmethod
+    def build(cls, embeddings, labels, paths, dims=256, model_version=None):
+        """
+        由原始特征构建索引
+        Args:
+            embeddings: (N, 2048) 原始特征
+            dims: PCA降维后的维度，0 或不小于原始维度时不降维
+        """
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        mean = components = None
+        if dims and dims < min(embeddings.shape):
+            mean = embeddings.mean(axis=0)
+            # 中心化后做SVD，取前 dims 个主成分
+            _, _, vt = np.linalg.svd(embeddings - mean, full_matrices=False)
+            components = vt[:dims]
+        index = cls(np.zeros((0, 0)), labels, paths, mean, components, model_version)
+        index.vectors = np.ascontiguousarray(index.project(embeddings).astype(np.float16).astype(np.float32))
+        return index
+
+    def search(self, embedding, k=10):
+        """
+        查询最相似的参考图片
+        Args:
+            embedding: (2048,) 查询图片的原始特征
+            k: 返回数量
+        Returns:
+            list: 按相似度降序的 (序号, 余弦距离)
+        """
+        if len(self) == 0:
+            return []
+        query = self.project(embedding.reshape(1, -1))[0]
+        scores = self.vectors @ query
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(i), float(1.0 - scores[i])) for i in top]
+
+    def save(self, path):
+        """以压缩的npz格式保存（特征以float16存储）"""
+        arrays = {
+            'vectors': self.vectors.astype(np.float16),
+            'labels': np.asarray(self.labels),
+            'paths': np.asarray(self.paths),
+            'model_version': np.asarray(self.model_version or ''),
+        }
+        if self.components is not None:
+            arrays['mean'] = self.mean.astype(np.float32)
+            arrays['components'] = self.components.astype(np.float16)
+        np.savez_compressed(path, **arrays)
+        return path
+
+    @classmethod
+    def load(cls, path):
+        if not os.path.exists(path):
+            raise FileNotFoundError(f'Embedding index not found: {path}')
+        with np.load(path, allow_pickle=False) as data:
+            index = cls(
+                data['vectors'],
+                data['labels'].tolist(),
+                data['paths'].tolist(),
+                data['mean'] if 'mean' in data else None,
+                data['components'] if 'components' in data else None,
+                str(data['model_version']) or None,
+            )
+        logger.info(f'Loaded embedding index {path}: {len(index)} images, {index.dims} dims')
+        return index
@@ -0,0 +1,196 @@
+import io
+import os
+import time
+import logging
+
+import torch
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+
+def percentile(values, pct):
+    """计算已排序列表的百分位数"""
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, int(round(pct / 100.0 * (len(values) - 1))))
+    return values[index]
+
+
+def reset_peak_rss():
+    """重置进程的峰值内存统计（Linux /proc/self/clear_refs），不支持时返回 False"""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def read_status_kb(field):
+    """读取 /proc/self/status 中的内存字段（KB），如 VmRSS、VmHWM"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith(field + ':'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def list_images(folder, limit=None):
+    """递归列出目录下的图片文件（按路径排序）"""
+    paths = []
+    for root, _, files in os.walk(folder):
+        for name in files:
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                paths.append(os.path.join(root, name))
+    paths.sort()
+    return paths[:limit] if limit else paths
+
+
+def load_sample_batch(recognizer, sample_dir=None, limit=32):
+    """
+    构造用于对比评估的输入张量
+    Args:
+        recognizer: HerbRecognizer实例，用于预处理图片
+        sample_dir: 样本图片目录，为空时使用随机张量
+        limit: 最多使用的样本数
+    Returns:
+        torch.Tensor: 形状为 (N, 3, 224, 224) 的张量
+    """
+    if sample_dir:
+        paths = list_images(sample_dir, limit)
+        if not paths:
+            raise ValueError(f'No images found in {sample_dir}')
+        return torch.stack([recognizer.preprocess(path) for path in paths])
+    generator = torch.Generator().manual_seed(0)
+    return torch.randn(limit, 3, 224, 224, generator=generator)
+
+
+def compare_topk(reference, candidate, k=5):
+    """
+    比较两组概率的top-k一致性
+    Args:
+        reference: 基准概率 (N, num_classes)
+        candidate: 待比较概率 (N, num_classes)
+        k: top-k
+    Returns:
+        dict: top1一致率、top-k集合一致率、top-k顺序完全一致率及最大概率误差
+    """
+    reference = reference.float()
+    candidate = candidate.float()
+    ref_top = torch.topk(reference, k, dim=1).indices
+    cand_top = torch.topk(candidate, k, dim=1).indices
+    n = reference.shape[0]
+    top1 = (ref_top[:, 0] == cand_top[:, 0]).sum().item()
+    exact = (ref_top == cand_top).all(dim=1).sum().item()
+    same_set = sum(
+        1 for r, c in zip(ref_top.tolist(), cand_top.tolist()) if set(r) == set(c)
+    )
+    # 基准top1是否出现在候选的top-k中
+    top1_in_topk = (cand_top == ref_top[:, :1]).any(dim=1).sum().item()
+    return {
+        'samples': n,
+        'top1_agreement': top1 / n,
+        f'top{k}_set_agreement': same_set / n,
+        f'top{k}_exact_agreement': exact / n,
+        f'ref_top1_in_top{k}': top1_in_topk / n,
+        'max_abs_prob_diff': (reference - candidate).abs().max().item(),
+    }
+
+
+def measure_latency(fn, batch_sizes=(1, 8), iterations=20, warmup=3):
+    """
+    测量推理函数在不同batch大小下的延迟和吞吐
+    Args:
+        fn: 可调用对象，输入 (N, 3, 224, 224) 张量
+        batch_sizes: 需要测量的batch大小
+        iterations: 每个batch大小的计时次数
+        warmup: 预热次数（不计时）
+    Returns:
+        dict: 以batch大小为键，包含平均/p50/p95延迟（毫秒）和吞吐（张/秒）
+    """
+    report = {}
+    for batch_size in batch_sizes:
+        batch = torch.randn(batch_size, 3, 224, 224)
+        for _ in range(warmup):
+            fn(batch)
+        timings = []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            fn(batch)
+            timings.append((time.perf_counter() - start) * 1000)
+        timings.sort()
+        mean = sum(timings) / len(timings)
+        report[batch_size] = {
+            'mean_ms': mean,
+            'p50_ms': timings[len(timings) // 2],
+            'p95_ms': timings[min(len(timings) - 1, int(len(timings) * 0.95))],
+            'images_per_sec': batch_size * 1000.0 / mean if mean else 0.0,
+        }
+    return report
+
+
+def synthetic_image(width, height, fmt='JPEG', variant=0, quality=90):
+    """
+    生成合成测试图片（渐变 + 分形纹理 + 低频噪声），压缩后的大小与真实照片接近
+    Args:
+        width: 宽度
+        height: 高度
+        fmt: JPEG 或 PNG
+        variant: 变体序号，不同序号生成不同内容
+        quality: JPEG质量
+    Returns:
+        bytes: 编码后的图片
+    """
+    from PIL import Image
+
+    shift = (variant % 17) * 0.05
+    gradient = Image.linear_gradient('L').rotate(variant * 37 % 360).resize((width, height), Image.BILINEAR)
+    texture = Image.effect_mandelbrot((width, height), (-2.0 + shift, -1.2, 0.8 + shift, 1.2), 64)
+    noise = Image.effect_noise((max(1, width // 4), max(1, height // 4)), 48).resize((width, height), Image.BILINEAR)
+    image = Image.merge('RGB', (gradient, texture, noise))
+    buffer = io.BytesIO()
+    if fmt.upper() == 'PNG':
+        image.save(buffer, format='PNG')
+    else:
+        image.save(buffer, format='JPEG', quality=quality)
+    return buffer.getvalue()
+
+
+def parse_image_specs(specs):
+    """
+    解析合成图片规格，例如 "4032x3024:JPEG,1024x768:PNG"
+    Returns:
+        list: (width, height, fmt) 列表
+    """
+    parsed = []
+    for spec in specs.split(','):
+        if not spec.strip():
+            continue
+        size, _, fmt = spec.strip().partition(':')
+        width, height = (int(value) for value in size.lower().split('x'))
+        parsed.append((width, height, (fmt or 'JPEG').upper()))
+    return parsed
+
+
+def write_random_artifact(weights_path, num_classes, seed=0):
+    """
+    生成随机初始化的ResNet50精简推理文件，用于没有训练好的检查点时的性能测试
+    Args:
+        weights_path: 权重文件输出路径
+        num_classes: 类别数（与 class_names.json 一致）
+        seed: 随机种子
+    Returns:
+        str: 权重文件路径
+    """
+    import torchvision.models as models
+    from .artifact import write_inference_artifact
+
+    torch.manual_seed(seed)
+    model = models.resnet50(num_classes=num_classes)
+    write_inference_artifact(model, weights_path, source='random')
+    return weights_path
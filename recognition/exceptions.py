@@ -0,0 +1,14 @@
+class BatchTimeoutError(Exception):
+    """等待批量推理结果超时"""
+
+
+class ExecutorSaturated(Exception):
+    """推理队列已满，请求被拒绝"""
+
+    def __init__(self, retry_after):
+        super().__init__(f'Inference queue is full, retry after {retry_after}s')
+        self.retry_after = retry_after
+
+
+class ExecutorTimeout(Exception):
+    """请求在推理队列中等待或执行超时"""
@@ -0,0 +1,162 @@
+import math
+import time
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+import torch
+
+from .evaluation import percentile
+from .exceptions import ExecutorSaturated, ExecutorTimeout
+
+logger = logging.getLogger(__name__)
+
+
+class InferenceExecutor:
+    """
+    有界的推理线程池
+
+    固定数量的worker线程执行识别任务，每个worker通过 torch.set_num_threads 限定算子内线程数，
+    避免突发请求时线程数超过CPU核数。排队请求数超过上限时直接拒绝（调用方返回503和Retry-After）。
+    """
+
+    def __init__(self, workers=2, queue_size=16, threads_per_worker=1, timeout=30, stats_size=1000):
+        """
+        初始化推理线程池
+        Args:
+            workers: worker线程数（同时执行的推理数）
+            queue_size: 允许排队等待的最大请求数
+            threads_per_worker: 每个worker的PyTorch算子内线程数
+            timeout: 单个请求从提交到完成的最长时间（秒）
+            stats_size: 统计信息保留的最近请求数
+        """
+        self.workers = max(1, int(workers))
+        self.queue_size = max(0, int(queue_size))
+        self.threads_per_worker = max(1, int(threads_per_worker))
+        self.timeout = timeout
+        self._capacity = threading.BoundedSemaphore(self.workers + self.queue_size)
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._running = 0
+        self._rejected = 0
+        self._timeouts = 0
+        self._completed = 0
+        self._recent = deque(maxlen=stats_size)  # (queue_wait_ms, exec_ms)
+        self._pool = ThreadPoolExecutor(
+            max_workers=self.workers,
+            thread_name_prefix='recognition-inference',
+            initializer=self._init_worker,
+        )
+        logger.info(
+            f'InferenceExecutor started: workers={self.workers}, queue_size={self.queue_size}, '
+            f'threads_per_worker={self.threads_per_worker}'
+        )
+
+    def _init_worker(self):
+        # OpenMP线程数设置对调用线程生效，每个worker各自限定
+        torch.set_num_threads(self.threads_per_worker)
+
+    def _retry_after(self):
+        """按最近的平均执行时间估算排队请求全部完成所需的秒数"""
+        with self._lock:
+            recent = list(self._recent)[-50:]
+            in_flight = self._in_flight
+        avg_exec = sum(exec_ms for _, exec_ms in recent) / len(recent) / 1000 if recent else 1.0
+        return max(1, int(math.ceil(avg_exec * in_flight / self.workers)))
+
+    def run(self, fn, *args, inline=False, **kwargs):
+        """
+        在worker线程中执行识别任务并等待结果
+        Args:
+            inline: 只做准入控制，在调用线程中执行任务。用于把推理交给批量推理引擎的任务：
+                worker线程阻塞等待batch结果会使一个batch最多只有 workers 个请求，
+                因此这类任务不占用worker，并发数由 workers + queue_size 限定，前向推理的线程数由批量推理线程限定
+        Returns:
+            tuple: (任务返回值, 计时信息dict：queue_depth, queue_wait_ms, exec_ms)
+        Raises:
+            ExecutorSaturated: 排队请求数已达上限
+            ExecutorTimeout: 等待结果超时
+        """
+        if not self._capacity.acquire(blocking=False):
+            with self._lock:
+                self._rejected += 1
+            raise ExecutorSaturated(self._retry_after())
+
+        with self._lock:
+            # 准入模式下所有已接受的请求都在等待同一个批量推理队列
+            queue_depth = self._in_flight if inline else max(0, self._in_flight - self._running)
+            self._in_flight += 1
+        submitted = time.perf_counter()
+        timing = {'queue_depth': queue_depth}
+
+        def _task():
+            started = time.perf_counter()
+            with self._lock:
+                self._running += 1
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                finished = time.perf_counter()
+                timing['queue_wait_ms'] = (started - submitted) * 1000
+                timing['exec_ms'] = (finished - started) * 1000
+                with self._lock:
+                    self._running -= 1
+                    self._in_flight -= 1
+                    self._completed += 1
+                    self._recent.append((timing['queue_wait_ms'], timing['exec_ms']))
+                self._capacity.release()
+
+        if inline:
+            # 等待时间由批量推理引擎的超时限定
+            return _task(), timing
+
+        try:
+            future = self._pool.submit(_task)
+        except Exception:
+            with self._lock:
+                self._in_flight -= 1
+            self._capacity.release()
+            raise
+        try:
+            result = future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            with self._lock:
+                self._timeouts += 1
+            raise ExecutorTimeout(f'Inference did not finish within {self.timeout}s')
+        return result, timing
+
+    def stats(self):
+        """获取队列深度、等待时间和执行时间统计（毫秒）"""
+        with self._lock:
+            recent = list(self._recent)
+            snapshot = {
+                'in_flight': self._in_flight,
+                'running': self._running,
+                'queued': max(0, self._in_flight - self._running),
+                'completed': self._completed,
+                'rejected': self._rejected,
+                'timeouts': self._timeouts,
+            }
+        waits = sorted(wait for wait, _ in recent)
+        execs = sorted(exec_ms for _, exec_ms in recent)
+        return {
+            'config': {
+                'workers': self.workers,
+                'queue_size': self.queue_size,
+                'threads_per_worker': self.threads_per_worker,
+                'timeout': self.timeout,
+            },
+            **snapshot,
+            'queue_wait_ms': {
+                'p50': percentile(waits, 50),
+                'p95': percentile(waits, 95),
+                'p99': percentile(waits, 99),
+            },
+            'exec_ms': {
+                'p50': percentile(execs, 50),
+                'p95': percentile(execs, 95),
+                'p99': percentile(execs, 99),
+            },
+        }
@@ -0,0 +1,62 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test import Client
+
+from recognition.model_utils import HerbRecognizer
+
+
+def _timeit(fn, iterations):
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return {
+        'mean_ms': sum(timings) / len(timings),
+        'p50_ms': timings[len(timings) // 2],
+        'p99_ms': timings[min(len(timings) - 1, int(len(timings) * 0.99))],
+    }
+
+
+class Command(BaseCommand):
+    help = '对比 /recognition/model-info 未缓存（每次加载检查点）与缓存后的耗时'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--uncached-iterations', type=int, default=5,
+                            help='未缓存路径的计时次数（每次都会完整加载模型文件）')
+        parser.add_argument('--iterations', type=int, default=1000,
+                            help='缓存路径的计时次数')
+
+    def _report(self, label, stats):
+        self.stdout.write(
+            f'  {label:<28} mean={stats["mean_ms"]:.3f}ms p50={stats["p50_ms"]:.3f}ms p99={stats["p99_ms"]:.3f}ms'
+        )
+
+    def handle(self, *args, **options):
+        model_path = settings.RECOGNITION_MODEL_PATH
+        recognizer = HerbRecognizer(model_path, settings.RECOGNITION_CLASS_NAMES_PATH)
+
+        self.stdout.write('model-info 耗时:')
+        self._report('未缓存 get_model_info', _timeit(
+            lambda: HerbRecognizer.get_model_info(model_path), options['uncached_iterations']
+        ))
+        recognizer.model_info()
+        self._report('缓存 model_info()', _timeit(recognizer.model_info, options['iterations']))
+
+        # HTTP层面（使用服务进程中的识别器）
+        client = Client()
+        response = client.get('/recognition/model-info')
+        if response.status_code != 200:
+            self.stderr.write(f'model-info 接口返回 {response.status_code}，跳过HTTP计时')
+            return
+        etag = response['ETag']
+        iterations = options['iterations']
+        self._report('GET model-info', _timeit(
+            lambda: client.get('/recognition/model-info'), iterations
+        ))
+        self._report('GET model-info (304)', _timeit(
+            lambda: client.get('/recognition/model-info', HTTP_IF_NONE_MATCH=etag), iterations
+        ))
@@ -0,0 +1,134 @@
+import os
+import json
+import time
+import multiprocessing
+
+import torch
+import torchvision.transforms as transforms
+from PIL import Image
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from recognition.preprocess import FastPreprocessor, IMAGENET_MEAN, IMAGENET_STD
+from recognition.evaluation import list_images, compare_topk, reset_peak_rss, read_status_kb
+
+_baseline_transform = transforms.Compose([
+    transforms.Resize(256),
+    transforms.CenterCrop(224),
+    transforms.ToTensor(),
+    transforms.Normalize(IMAGENET_MEAN, IMAGENET_STD)
+])
+_fast = FastPreprocessor()
+
+
+def _baseline(path):
+    """原有预处理：全分辨率解码后 Resize(256) + CenterCrop(224)"""
+    image = Image.open(path)
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    return _baseline_transform(image)
+
+
+PIPELINES = {
+    'baseline': _baseline,
+    'fast': _fast,
+}
+
+
+def _run_pipeline(name, paths, result_queue):
+    """在子进程中运行一种预处理流程，统计耗时和峰值内存"""
+    fn = PIPELINES[name]
+    fn(paths[0])  # 预热
+    peak_supported = reset_peak_rss()
+    baseline_kb = read_status_kb('VmRSS')
+    timings = []
+    for path in paths:
+        start = time.perf_counter()
+        fn(path)
+        timings.append((time.perf_counter() - start) * 1000)
+    peak_kb = read_status_kb('VmHWM') if peak_supported else None
+    result_queue.put({
+        'timings': timings,
+        'peak_delta_mb': (peak_kb - baseline_kb) / 1024 if peak_kb and baseline_kb else None,
+    })
+
+
+class Command(BaseCommand):
+    help = '对比原有预处理与快速预处理（JPEG draft解码）的耗时、峰值内存和结果一致性'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--image-dir', required=True,
+                            help='测试图片目录（建议使用真实手机拍摄的大尺寸JPEG）')
+        parser.add_argument('--limit', type=int, default=200,
+                            help='最多使用的图片数')
+        parser.add_argument('--no-model', action='store_true',
+                            help='不加载模型，只比较预处理张量')
+        parser.add_argument('--json', action='store_true',
+                            help='以JSON格式输出报告')
+
+    def handle(self, *args, **options):
+        paths = list_images(options['image_dir'], options['limit'])
+        if not paths:
+            raise CommandError(f'目录中没有图片: {options["image_dir"]}')
+
+        sizes = [Image.open(path).size for path in paths[:50]]
+        avg_pixels = sum(w * h for w, h in sizes) / len(sizes)
+        report = {
+            'images': len(paths),
+            'avg_megapixels': avg_pixels / 1e6,
+            'avg_file_kb': sum(os.path.getsize(p) for p in paths) / len(paths) / 1024,
+            'pipelines': {},
+        }
+
+        # 每种流程在独立的子进程中运行，避免峰值内存相互影响
+        context = multiprocessing.get_context('fork')
+        for name in PIPELINES:
+            result_queue = context.Queue()
+            process = context.Process(target=_run_pipeline, args=(name, paths, result_queue))
+            process.start()
+            result = result_queue.get()
+            process.join()
+            timings = sorted(result['timings'])
+            report['pipelines'][name] = {
+                'mean_ms': sum(timings) / len(timings),
+                'p50_ms': timings[len(timings) // 2],
+                'p95_ms': timings[min(len(timings) - 1, int(len(timings) * 0.95))],
+                'peak_delta_mb': result['peak_delta_mb'],
+            }
+
+        baseline = torch.stack([_baseline(path) for path in paths])
+        fast = torch.stack([_fast(path) for path in paths])
+        report['tensor_diff'] = {
+            'mean_abs': (baseline - fast).abs().mean().item(),
+            'max_abs': (baseline - fast).abs().max().item(),
+        }
+
+        if not options['no_model']:
+            from recognition.model_utils import HerbRecognizer
+            recognizer = HerbRecognizer(settings.RECOGNITION_MODEL_PATH, settings.RECOGNITION_CLASS_NAMES_PATH)
+            report['parity'] = compare_topk(
+                recognizer.forward_batch(baseline), recognizer.forward_batch(fast), k=5
+            )
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, ensure_ascii=False, indent=2))
+            return
+
+        self.stdout.write(
+            f'{report["images"]} 张图片，平均 {report["avg_megapixels"]:.1f} 百万像素，'
+            f'{report["avg_file_kb"]:.0f}KB'
+        )
+        for name, stats in report['pipelines'].items():
+            peak = f'{stats["peak_delta_mb"]:.1f}MB' if stats['peak_delta_mb'] is not None else 'N/A'
+            self.stdout.write(
+                f'  {name:<9} mean={stats["mean_ms"]:.2f}ms p50={stats["p50_ms"]:.2f}ms '
+                f'p95={stats["p95_ms"]:.2f}ms 峰值内存增量={peak}'
+            )
+        self.stdout.write(
+            f'张量差异: 平均 {report["tensor_diff"]["mean_abs"]:.4f}，最大 {report["tensor_diff"]["max_abs"]:.4f}'
+        )
+        if 'parity' in report:
+            parity = report['parity']
+            self.stdout.write(
+                f'识别一致性: top1={parity["top1_agreement"]:.4f} top5集合={parity["top5_set_agreement"]:.4f}'
+            )
@@ -0,0 +1,204 @@
+import os
+import json
+import time
+import platform
+import tempfile
+import subprocess
+
+import torch
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from recognition.model_utils import HerbRecognizer
+from recognition.preprocess import FastPreprocessor
+from recognition.evaluation import (
+    percentile, measure_latency, synthetic_image, parse_image_specs, write_random_artifact,
+)
+
+DEFAULT_IMAGES = '4032x3024:JPEG,1920x1080:JPEG,1024x768:PNG'
+
+
+def _summary(timings):
+    """耗时列表（毫秒）的均值和百分位数"""
+    timings = sorted(timings)
+    return {
+        'mean_ms': sum(timings) / len(timings),
+        'p50_ms': percentile(timings, 50),
+        'p95_ms': percentile(timings, 95),
+        'p99_ms': percentile(timings, 99),
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def flatten_metrics(report, prefix=''):
+    """把嵌套的报告展开为 {点分路径: 数值}，用于不同提交之间的对比"""
+    flat = {}
+    for key, value in report.items():
+        path = f'{prefix}.{key}' if prefix else str(key)
+        if isinstance(value, dict):
+            flat.update(flatten_metrics(value, path))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[path] = value
+    return flat
+
+
+class Command(BaseCommand):
+    help = ('识别性能基准测试：预处理、前向推理、端到端延迟百分位及吞吐（按batch大小和线程数），'
+            '默认使用随机初始化的ResNet50和合成图片，结果可输出为JSON并与之前的结果对比')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--use-checkpoint', action='store_true',
+                            help='使用 RECOGNITION_MODEL_PATH 指定的模型（默认使用随机初始化的模型）')
+        parser.add_argument('--images', default=DEFAULT_IMAGES,
+                            help='合成图片规格，格式为 宽x高:格式，逗号分隔')
+        parser.add_argument('--images-per-spec', type=int, default=4,
+                            help='每种规格生成的图片数')
+        parser.add_argument('--batch-sizes', default='1,4,8,16',
+                            help='前向推理测试的batch大小，逗号分隔')
+        parser.add_argument('--threads', default=f'1,{os.cpu_count() or 1}',
+                            help='测试的PyTorch线程数，逗号分隔')
+        parser.add_argument('--iterations', type=int, default=10,
+                            help='每项测试的计时次数')
+        parser.add_argument('--requests', type=int, default=32,
+                            help='端到端测试的识别次数')
+        parser.add_argument('--output', default=None,
+                            help='结果JSON的输出路径')
+        parser.add_argument('--compare', default=None,
+                            help='与之前输出的结果JSON对比')
+
+    def handle(self, *args, **options):
+        batch_sizes = [int(size) for size in options['batch_sizes'].split(',') if size]
+        thread_counts = sorted({int(count) for count in options['threads'].split(',') if count})
+        specs = parse_image_specs(options['images'])
+        if not specs:
+            raise CommandError('请至少指定一种图片规格')
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            if options['use_checkpoint']:
+                model_path = settings.RECOGNITION_MODEL_PATH
+            else:
+                with open(settings.RECOGNITION_CLASS_NAMES_PATH, 'r', encoding='utf-8') as f:
+                    num_classes = len(json.load(f))
+                model_path = write_random_artifact(os.path.join(tmp_dir, 'random_resnet50.pt'), num_classes)
+            recognizer = HerbRecognizer(model_path, settings.RECOGNITION_CLASS_NAMES_PATH)
+            report = self._run(recognizer, specs, batch_sizes, thread_counts, options)
+        report['meta']['model'] = model_path if options['use_checkpoint'] else 'random'
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+            self.stdout.write(f'结果已保存: {options["output"]}')
+        self._print(report)
+        if options['compare']:
+            with open(options['compare'], 'r', encoding='utf-8') as f:
+                self._print_comparison(json.load(f), report)
+
+    def _run(self, recognizer, specs, batch_sizes, thread_counts, options):
+        iterations = max(1, options['iterations'])
+        images = {}
+        for width, height, fmt in specs:
+            key = f'{width}x{height}_{fmt.lower()}'
+            images[key] = [
+                synthetic_image(width, height, fmt, variant) for variant in range(max(1, options['images_per_spec']))
+            ]
+
+        report = {
+            'meta': {
+                'timestamp': time.strftime('%Y-%m-%d %H:%M:%S'),
+                'git_commit': _git_commit(),
+                'python': platform.python_version(),
+                'torch': torch.__version__,
+                'cpu_count': os.cpu_count(),
+                'num_classes': len(recognizer.class_names),
+            },
+            'images': {key: {'count': len(data), 'mean_kb': sum(map(len, data)) / len(data) / 1024}
+                       for key, data in images.items()},
+            'preprocess': {},
+            'forward': {},
+            'end_to_end': {},
+        }
+
+        # 预处理：对比torchvision流程与快速预处理
+        torch.set_num_threads(1)
+        for name, preprocessor in (('torchvision', None), ('fast', FastPreprocessor())):
+            recognizer.preprocessor = preprocessor
+            report['preprocess'][name] = {}
+            for key, data in images.items():
+                timings = []
+                for _ in range(iterations):
+                    for image in data:
+                        started = time.perf_counter()
+                        recognizer.preprocess(image)
+                        timings.append((time.perf_counter() - started) * 1000)
+                report['preprocess'][name][key] = _summary(timings)
+        recognizer.preprocessor = FastPreprocessor() if settings.RECOGNITION_FAST_PREPROCESS else None
+
+        # 前向推理与端到端识别（解码 + 预处理 + 推理 + top-k）
+        all_images = [image for data in images.values() for image in data]
+        for threads in thread_counts:
+            torch.set_num_threads(threads)
+            label = f'threads_{threads}'
+            report['forward'][label] = {
+                f'batch_{size}': stats
+                for size, stats in measure_latency(recognizer.forward_batch, batch_sizes, iterations).items()
+            }
+            recognizer.predict(all_images[0])
+            timings = []
+            started = time.perf_counter()
+            for index in range(options['requests']):
+                request_started = time.perf_counter()
+                recognizer.predict(all_images[index % len(all_images)])
+                timings.append((time.perf_counter() - request_started) * 1000)
+            wall = time.perf_counter() - started
+            report['end_to_end'][label] = {
+                **_summary(timings),
+                'images_per_sec': len(timings) / wall if wall else 0.0,
+            }
+        return report
+
+    def _print(self, report):
+        meta = report['meta']
+        self.stdout.write(
+            f'模型 {meta["model"]}，torch {meta["torch"]}，{meta["cpu_count"]} 核，提交 {meta["git_commit"]}'
+        )
+        self.stdout.write('\n预处理（单线程）:')
+        for name, by_image in report['preprocess'].items():
+            for key, stats in by_image.items():
+                self.stdout.write(
+                    f'  {name:<12} {key:<16} mean={stats["mean_ms"]:.2f}ms p95={stats["p95_ms"]:.2f}ms'
+                )
+        self.stdout.write('\n前向推理:')
+        for label, by_batch in report['forward'].items():
+            for batch, stats in by_batch.items():
+                self.stdout.write(
+                    f'  {label:<12} {batch:<9} mean={stats["mean_ms"]:.2f}ms p95={stats["p95_ms"]:.2f}ms '
+                    f'吞吐={stats["images_per_sec"]:.1f}张/秒'
+                )
+        self.stdout.write('\n端到端识别:')
+        for label, stats in report['end_to_end'].items():
+            self.stdout.write(
+                f'  {label:<12} p50={stats["p50_ms"]:.2f}ms p95={stats["p95_ms"]:.2f}ms '
+                f'p99={stats["p99_ms"]:.2f}ms 吞吐={stats["images_per_sec"]:.1f}张/秒'
+            )
+
+    def _print_comparison(self, previous, current):
+        before = flatten_metrics({k: v for k, v in previous.items() if k != 'meta'})
+        after = flatten_metrics({k: v for k, v in current.items() if k != 'meta'})
+        self.stdout.write(
+            f'\n与 {previous.get("meta", {}).get("git_commit")} 对比（仅列出变化超过5%的指标）:'
+        )
+        for key in sorted(before.keys() & after.keys()):
+            old, new = before[key], after[key]
+            if not old:
+                continue
+            change = (new - old) / old
+            if abs(change) >= 0.05:
+                self.stdout.write(f'  {key:<60} {old:>10.2f} -> {new:>10.2f} ({change:+.1%})')
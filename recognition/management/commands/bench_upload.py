@@ -0,0 +1,132 @@
+import io
+import os
+import json
+import time
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test.client import BOUNDARY, MULTIPART_CONTENT, RequestFactory, encode_multipart
+from django.core.files.uploadedfile import SimpleUploadedFile
+
+from recognition.evaluation import percentile, reset_peak_rss, read_status_kb
+from recognition.uploads import ImageUploadHandler
+
+HANDLERS = ('default', 'streaming')
+
+
+def _synthetic_jpeg(target_bytes):
+    """生成接近目标大小的随机噪声JPEG（噪声几乎不可压缩，文件大小随像素数线性变化）"""
+    side = 1024
+    for _ in range(5):
+        image = Image.frombytes('RGB', (side, side * 3 // 4), os.urandom(side * (side * 3 // 4) * 3))
+        buffer = io.BytesIO()
+        image.save(buffer, format='JPEG', quality=95)
+        size = buffer.tell()
+        if abs(size - target_bytes) < target_bytes * 0.02:
+            break
+        side = int(side * (target_bytes / size) ** 0.5)
+    return buffer.getvalue()
+
+
+def _handle_request(factory, body, handler_name, max_size):
+    """解析一次multipart上传并用PIL解码图片，返回 (耗时毫秒, 上传文件类型)"""
+    request = factory.generic('POST', '/recognition/upload', body, content_type=MULTIPART_CONTENT)
+    started = time.perf_counter()
+    if handler_name == 'streaming':
+        request.upload_handlers = [ImageUploadHandler(request, max_size=max_size)]
+    upload = request.FILES['file']
+    image = Image.open(upload.file)
+    if image.format == 'JPEG':
+        image.draft('RGB', (256, 256))
+    image.load()
+    elapsed = (time.perf_counter() - started) * 1000
+    kind = upload.__class__.__name__
+    upload.close()
+    return elapsed, kind
+
+
+def _run_handler(handler_name, body, requests, concurrency, max_size, result_queue):
+    """在子进程中并发处理上传请求，统计耗时和峰值内存"""
+    factory = RequestFactory()
+    _handle_request(factory, body, handler_name, max_size)  # 预热
+    peak_supported = reset_peak_rss()
+    baseline_kb = read_status_kb('VmRSS')
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(
+            lambda _: _handle_request(factory, body, handler_name, max_size), range(requests)
+        ))
+    wall = time.perf_counter() - started
+    peak_kb = read_status_kb('VmHWM') if peak_supported else None
+    result_queue.put({
+        'timings': [elapsed for elapsed, _ in results],
+        'upload_class': results[0][1],
+        'wall_seconds': wall,
+        'peak_delta_mb': (peak_kb - baseline_kb) / 1024 if peak_kb and baseline_kb else None,
+    })
+
+
+class Command(BaseCommand):
+    help = '对比Django默认上传处理器与识别接口的流式上传处理器在并发大图上传下的耗时和峰值内存'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size-mb', type=float, default=4.9,
+                            help='合成JPEG的大小（MB）')
+        parser.add_argument('--requests', type=int, default=64,
+                            help='每种处理器处理的请求数')
+        parser.add_argument('--concurrency', type=int, default=8,
+                            help='并发请求数')
+        parser.add_argument('--json', action='store_true',
+                            help='以JSON格式输出报告')
+
+    def handle(self, *args, **options):
+        max_size = getattr(settings, 'RECOGNITION_MAX_UPLOAD_SIZE', 5 * 1024 * 1024)
+        image = _synthetic_jpeg(int(options['size_mb'] * 1024 * 1024))
+        body = encode_multipart(BOUNDARY, {
+            'file': SimpleUploadedFile('synthetic.jpg', image, content_type='image/jpeg'),
+        })
+        report = {
+            'image_mb': len(image) / (1024 * 1024),
+            'requests': options['requests'],
+            'concurrency': options['concurrency'],
+            'handlers': {},
+        }
+
+        # 每种处理器在独立的子进程中运行，避免峰值内存相互影响
+        context = multiprocessing.get_context('fork')
+        for name in HANDLERS:
+            result_queue = context.Queue()
+            process = context.Process(target=_run_handler, args=(
+                name, body, options['requests'], options['concurrency'], max_size, result_queue
+            ))
+            process.start()
+            result = result_queue.get()
+            process.join()
+            timings = sorted(result['timings'])
+            report['handlers'][name] = {
+                'upload_class': result['upload_class'],
+                'mean_ms': sum(timings) / len(timings),
+                'p50_ms': percentile(timings, 50),
+                'p95_ms': percentile(timings, 95),
+                'p99_ms': percentile(timings, 99),
+                'requests_per_sec': len(timings) / result['wall_seconds'],
+                'peak_delta_mb': result['peak_delta_mb'],
+            }
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, ensure_ascii=False, indent=2))
+            return
+
+        self.stdout.write(
+            f'图片 {report["image_mb"]:.2f}MB，{report["requests"]} 个请求，并发 {report["concurrency"]}'
+        )
+        for name, stats in report['handlers'].items():
+            peak = f'{stats["peak_delta_mb"]:.1f}MB' if stats['peak_delta_mb'] is not None else 'N/A'
+            self.stdout.write(
+                f'  {name:<10} {stats["upload_class"]:<22} mean={stats["mean_ms"]:.2f}ms '
+                f'p95={stats["p95_ms"]:.2f}ms p99={stats["p99_ms"]:.2f}ms '
+                f'{stats["requests_per_sec"]:.1f}请求/秒 峰值内存增量={peak}'
+            )
@@ -0,0 +1,80 @@
+import os
+import time
+
+import numpy as np
+import torch
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from recognition.model_utils import HerbRecognizer
+from recognition.embeddings import EmbeddingIndex
+from recognition.evaluation import list_images
+
+
+class Command(BaseCommand):
+    help = '用识别模型的全局池化特征为参考图库构建相似图片检索索引（图库按 药材名称/图片 组织）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--gallery-dir', required=True,
+                            help='参考图库目录，每个子目录名为药材名称')
+        parser.add_argument('--output', default=settings.RECOGNITION_EMBEDDING_INDEX_PATH,
+                            help='索引文件路径（.npz）')
+        parser.add_argument('--dims', type=int, default=256,
+                            help='PCA降维后的维度，0为不降维（2048维）')
+        parser.add_argument('--batch-size', type=int, default=32,
+                            help='提取特征的batch大小')
+        parser.add_argument('--limit', type=int, default=None,
+                            help='最多使用的图片数')
+
+    def handle(self, *args, **options):
+        gallery_dir = options['gallery_dir']
+        paths = list_images(gallery_dir, options['limit'])
+        if not paths:
+            raise CommandError(f'图库目录中没有图片: {gallery_dir}')
+
+        recognizer = HerbRecognizer(
+            settings.RECOGNITION_MODEL_PATH, settings.RECOGNITION_CLASS_NAMES_PATH,
+            fast_preprocess=settings.RECOGNITION_FAST_PREPROCESS,
+        )
+        if recognizer.model is None:
+            raise CommandError('无法加载eager模型')
+
+        started = time.perf_counter()
+        batch_size = max(1, options['batch_size'])
+        embeddings, labels, relative_paths = [], [], []
+        for offset in range(0, len(paths), batch_size):
+            tensors = []
+            for path in paths[offset:offset + batch_size]:
+                try:
+                    tensors.append(recognizer.preprocess(path))
+                except Exception as e:
+                    self.stderr.write(f'跳过无法读取的图片 {path}: {str(e)}')
+                    continue
+                relative = os.path.relpath(path, gallery_dir)
+                relative_paths.append(relative.replace(os.sep, '/'))
+                labels.append(os.path.basename(os.path.dirname(path)))
+            if tensors:
+                embeddings.append(recognizer.extract_embeddings(torch.stack(tensors)).numpy())
+            self.stdout.write(f'  已提取 {min(offset + batch_size, len(paths))}/{len(paths)}')
+        if not embeddings:
+            raise CommandError('没有可用的图片')
+
+        embeddings = np.concatenate(embeddings)
+        index = EmbeddingIndex.build(
+            embeddings, labels, relative_paths,
+            dims=options['dims'], model_version=recognizer.model_version,
+        )
+        os.makedirs(os.path.dirname(os.path.abspath(options['output'])), exist_ok=True)
+        index.save(options['output'])
+        self.stdout.write(self.style.SUCCESS(
+            f'索引已保存: {options["output"]}（{len(index)} 张图片，{len(set(labels))} 种药材，'
+            f'{index.dims} 维，耗时 {time.perf_counter() - started:.1f}s）'
+        ))
+
+        # 用图库中的图片测量查询耗时
+        queries = embeddings[:100]
+        started = time.perf_counter()
+        for embedding in queries:
+            index.search(embedding, 10)
+        elapsed = (time.perf_counter() - started) * 1000 / len(queries)
+        self.stdout.write(f'单次查询平均耗时: {elapsed:.3f}ms')
@@ -0,0 +1,71 @@
+import os
+import time
+
+import torch
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from recognition.artifact import write_inference_artifact, load_inference_model, sidecar_path
+
+
+class Command(BaseCommand):
+    help = '将完整训练检查点转换为仅含推理权重的精简文件和JSON元数据'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--checkpoint', default=settings.RECOGNITION_CHECKPOINT_PATH,
+                            help='完整训练检查点路径')
+        parser.add_argument('--output', default=settings.RECOGNITION_ARTIFACT_PATH,
+                            help='精简推理权重输出路径')
+        parser.add_argument('--fp16', action='store_true',
+                            help='以半精度存储权重（文件减半，加载时转换回fp32，无法使用内存映射共享）')
+        parser.add_argument('--verify', action='store_true',
+                            help='转换后重新加载并与原模型输出对比')
+
+    def handle(self, *args, **options):
+        checkpoint_path = options['checkpoint']
+        output = options['output']
+        if not os.path.exists(checkpoint_path):
+            raise CommandError(f'检查点不存在: {checkpoint_path}')
+
+        start = time.perf_counter()
+        checkpoint = torch.load(checkpoint_path, map_location='cpu')
+        load_seconds = time.perf_counter() - start
+        if 'model' not in checkpoint:
+            raise CommandError('检查点中没有 model 字段')
+        model = checkpoint['model'].eval()
+        best_val_acc = checkpoint.get('best_val_acc')
+        del checkpoint
+
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+        try:
+            metadata = write_inference_artifact(
+                model, output, best_val_acc=best_val_acc, fp16=options['fp16'], source=checkpoint_path
+            )
+        except (ValueError, RuntimeError) as e:
+            raise CommandError(f'无法转换为精简推理文件: {str(e)}')
+
+        self.stdout.write(f'权重文件: {output}')
+        self.stdout.write(f'元数据:   {sidecar_path(output)}')
+        self.stdout.write(
+            f'文件大小: {os.path.getsize(checkpoint_path) / (1024 * 1024):.1f}MB -> '
+            f'{metadata["weights_size"] / (1024 * 1024):.1f}MB ({metadata["dtype"]})'
+        )
+        self.stdout.write(f'完整检查点加载耗时: {load_seconds * 1000:.0f}ms')
+
+        if options['verify']:
+            start = time.perf_counter()
+            slim, _ = load_inference_model(output, torch.device('cpu'))
+            slim_seconds = time.perf_counter() - start
+            inputs = torch.randn(4, 3, 224, 224, generator=torch.Generator().manual_seed(0))
+            with torch.no_grad():
+                diff = (torch.softmax(model(inputs), dim=1) - torch.softmax(slim(inputs), dim=1)).abs().max().item()
+            self.stdout.write(f'精简文件加载耗时: {slim_seconds * 1000:.0f}ms')
+            self.stdout.write(f'最大概率误差: {diff:.2e}')
+            if diff > (1e-2 if options['fp16'] else 1e-5):
+                raise CommandError('精简模型输出与原模型不一致')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'转换完成，重启服务后将自动加载 {os.path.basename(output)}'
+            if output == settings.RECOGNITION_ARTIFACT_PATH else
+            f'转换完成，设置 RECOGNITION_MODEL_PATH={output} 以加载精简文件'
+        ))
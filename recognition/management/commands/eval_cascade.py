@@ -0,0 +1,108 @@
+import os
+import json
+
+import torch
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from recognition.model_utils import HerbRecognizer
+from recognition.cascade import evaluate_cascade
+from recognition.evaluation import list_images, compare_topk, measure_latency
+
+
+def _load_version(version):
+    spec = settings.RECOGNITION_MODELS.get(version)
+    if spec is None:
+        raise CommandError(f'未知的模型版本: {version}（可选: {", ".join(settings.RECOGNITION_MODELS)}）')
+    return HerbRecognizer(
+        spec['model_path'], spec.get('class_names_path', settings.RECOGNITION_CLASS_NAMES_PATH),
+        backend=spec.get('backend', 'eager'),
+        backend_path=spec.get('backend_path'),
+        fast_preprocess=settings.RECOGNITION_FAST_PREPROCESS,
+    )
+
+
+class Command(BaseCommand):
+    help = '在评估集上对比级联推理（小模型 + 完整模型）在不同置信度阈值下的升级率、准确率和平均耗时'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--eval-dir', required=True,
+                            help='评估图片目录，按 药材名称/图片 组织时同时报告准确率')
+        parser.add_argument('--samples', type=int, default=1000,
+                            help='最多使用的评估图片数')
+        parser.add_argument('--fast-model', default=settings.RECOGNITION_CASCADE_MODEL,
+                            help='小模型在 RECOGNITION_MODELS 中的版本名')
+        parser.add_argument('--full-model', default=settings.RECOGNITION_ACTIVE_MODEL,
+                            help='完整模型在 RECOGNITION_MODELS 中的版本名')
+        parser.add_argument('--thresholds', default='0.5,0.6,0.7,0.8,0.9,0.95,0.99',
+                            help='需要评估的置信度阈值，逗号分隔')
+        parser.add_argument('--batch-size', type=int, default=32,
+                            help='推理时的batch大小')
+        parser.add_argument('--iterations', type=int, default=20,
+                            help='单张图片耗时的计时次数')
+        parser.add_argument('--json', action='store_true',
+                            help='以JSON格式输出报告')
+
+    def handle(self, *args, **options):
+        if not options['fast_model']:
+            raise CommandError('请通过 --fast-model 或 RECOGNITION_CASCADE_MODEL 指定小模型')
+        paths = list_images(options['eval_dir'], options['samples'])
+        if not paths:
+            raise CommandError(f'评估目录中没有图片: {options["eval_dir"]}')
+        thresholds = [float(value) for value in options['thresholds'].split(',') if value]
+
+        fast = _load_version(options['fast_model'])
+        full = _load_version(options['full_model'])
+        if fast.class_names != full.class_names:
+            raise CommandError('两个模型的类别映射不一致')
+
+        # 以目录名作为真实类别，无法对应到类别的图片不参与准确率统计
+        name_to_index = {name: int(index) for index, name in full.class_names.items()}
+        labels = torch.tensor([
+            name_to_index.get(os.path.basename(os.path.dirname(path)), -1) for path in paths
+        ])
+
+        fast_probs, full_probs = [], []
+        batch_size = max(1, options['batch_size'])
+        for start in range(0, len(paths), batch_size):
+            batch = torch.stack([full.preprocess(path) for path in paths[start:start + batch_size]])
+            fast_probs.append(fast.forward_batch(batch))
+            full_probs.append(full.forward_batch(batch))
+        fast_probs = torch.cat(fast_probs)
+        full_probs = torch.cat(full_probs)
+
+        # 线上请求通常是单张图片，按batch=1的耗时估算级联节省的时间
+        fast_ms = measure_latency(fast.forward_batch, (1,), options['iterations'])[1]['mean_ms']
+        full_ms = measure_latency(full.forward_batch, (1,), options['iterations'])[1]['mean_ms']
+
+        report = {
+            'samples': len(paths),
+            'labelled': int((labels >= 0).sum().item()),
+            'fast_model': options['fast_model'],
+            'full_model': options['full_model'],
+            'fast_ms': fast_ms,
+            'full_ms': full_ms,
+            'fast_vs_full': compare_topk(full_probs, fast_probs, k=5),
+            'thresholds': evaluate_cascade(fast_probs, full_probs, fast_ms, full_ms, thresholds, labels),
+        }
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, ensure_ascii=False, indent=2))
+            return
+
+        self.stdout.write(
+            f'样本 {report["samples"]} 张（有标签 {report["labelled"]} 张），'
+            f'单张耗时：小模型 {fast_ms:.2f}ms，完整模型 {full_ms:.2f}ms，'
+            f'小模型与完整模型top1一致率 {report["fast_vs_full"]["top1_agreement"]:.4f}'
+        )
+        self.stdout.write('\n阈值      升级率    与完整模型一致  准确率(级联/完整)   平均耗时   节省')
+        for entry in report['thresholds']:
+            accuracy = (
+                f'{entry["accuracy"]:.4f}/{entry["full_accuracy"]:.4f}'
+                if 'accuracy' in entry else '-'
+            )
+            self.stdout.write(
+                f'{entry["threshold"]:<9.2f} {entry["escalation_rate"]:<9.2%} '
+                f'{entry["agreement_with_full"]:<15.4f} {accuracy:<19} '
+                f'{entry["mean_latency_ms"]:>7.2f}ms {entry["saved_ms_per_image"]:>7.2f}ms'
+            )
@@ -0,0 +1,89 @@
+import os
+import json
+
+import torch
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from recognition.model_utils import HerbRecognizer
+from recognition.backends import export_torchscript, export_onnx, load_backend
+from recognition.evaluation import load_sample_batch, compare_topk, measure_latency
+
+
+class Command(BaseCommand):
+    help = '将识别模型导出为 TorchScript 和 ONNX，并与 eager 模型对比top-5一致性和推理性能'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output-dir', default=settings.RECOGNITION_EXPORT_DIR,
+                            help='导出文件目录')
+        parser.add_argument('--sample-dir', default=None,
+                            help='用于一致性校验的样本图片目录，未指定时使用随机输入')
+        parser.add_argument('--samples', type=int, default=32,
+                            help='一致性校验使用的最大样本数')
+        parser.add_argument('--batch-sizes', default='1,8',
+                            help='性能对比使用的batch大小，逗号分隔')
+        parser.add_argument('--iterations', type=int, default=20,
+                            help='每个batch大小的计时次数')
+        parser.add_argument('--skip-onnx', action='store_true',
+                            help='不导出ONNX模型')
+        parser.add_argument('--json', action='store_true',
+                            help='以JSON格式输出报告')
+
+    def handle(self, *args, **options):
+        output_dir = options['output_dir']
+        os.makedirs(output_dir, exist_ok=True)
+        batch_sizes = [int(size) for size in options['batch_sizes'].split(',') if size]
+
+        recognizer = HerbRecognizer(settings.RECOGNITION_MODEL_PATH, settings.RECOGNITION_CLASS_NAMES_PATH)
+        if recognizer.model is None:
+            raise CommandError('无法加载eager模型')
+        model = recognizer.model.cpu().eval()
+
+        exported = {}
+        ts_path = os.path.basename(settings.RECOGNITION_TORCHSCRIPT_PATH)
+        exported['torchscript'] = export_torchscript(model, os.path.join(output_dir, ts_path))
+        self.stdout.write(f'TorchScript 模型已导出: {exported["torchscript"]}')
+        if not options['skip_onnx']:
+            onnx_path = os.path.basename(settings.RECOGNITION_ONNX_PATH)
+            exported['onnx'] = export_onnx(model, os.path.join(output_dir, onnx_path))
+            self.stdout.write(f'ONNX 模型已导出: {exported["onnx"]}')
+
+        device = torch.device('cpu')
+        backends = {'eager': load_backend('eager', model=model, device=device)}
+        for name, path in exported.items():
+            try:
+                backends[name] = load_backend(name, path=path, device=device)
+            except ImportError as e:
+                self.stderr.write(f'跳过 {name} 后端: {str(e)}')
+
+        inputs = load_sample_batch(recognizer, options['sample_dir'], options['samples'])
+        with torch.no_grad():
+            probs = {name: torch.softmax(backend(inputs).float(), dim=1) for name, backend in backends.items()}
+
+        report = {'exported': exported, 'parity': {}, 'latency': {}}
+        for name, candidate in probs.items():
+            if name != 'eager':
+                report['parity'][name] = compare_topk(probs['eager'], candidate, k=5)
+        for name, backend in backends.items():
+            report['latency'][name] = measure_latency(backend, batch_sizes, options['iterations'])
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, ensure_ascii=False, indent=2))
+            return
+
+        self.stdout.write('\n一致性（相对eager模型）:')
+        for name, stats in report['parity'].items():
+            self.stdout.write(
+                f'  {name:<12} top1={stats["top1_agreement"]:.4f} '
+                f'top5集合={stats["top5_set_agreement"]:.4f} '
+                f'top5顺序={stats["top5_exact_agreement"]:.4f} '
+                f'最大概率误差={stats["max_abs_prob_diff"]:.2e}'
+            )
+        self.stdout.write('\n性能:')
+        for name, by_batch in report['latency'].items():
+            for batch_size, stats in by_batch.items():
+                self.stdout.write(
+                    f'  {name:<12} batch={batch_size:<3} '
+                    f'mean={stats["mean_ms"]:.2f}ms p95={stats["p95_ms"]:.2f}ms '
+                    f'吞吐={stats["images_per_sec"]:.1f}张/秒'
+                )
@@ -0,0 +1,173 @@
+import os
+import json
+import time
+import uuid
+import tempfile
+import threading
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler
+from django.core.wsgi import get_wsgi_application
+from django.test.utils import override_settings
+
+from recognition.evaluation import percentile, synthetic_image, parse_image_specs, write_random_artifact
+
+
+class _QuietRequestHandler(WSGIRequestHandler):
+    """不输出访问日志的请求处理器"""
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _multipart(image, filename):
+    """构造只包含一个 file 字段的 multipart 请求体"""
+    boundary = uuid.uuid4().hex
+    content_type = 'image/png' if filename.endswith('.png') else 'image/jpeg'
+    body = b''.join([
+        f'--{boundary}\r\n'.encode(),
+        f'Content-Disposition: form-data; name="file"; filename="{filename}"\r\n'.encode(),
+        f'Content-Type: {content_type}\r\n\r\n'.encode(),
+        image,
+        f'\r\n--{boundary}--\r\n'.encode(),
+    ])
+    return body, f'multipart/form-data; boundary={boundary}'
+
+
+def _post(url, body, content_type, timeout):
+    """发送一次上传请求，返回 (状态码, 耗时毫秒, 服务端推理耗时毫秒)"""
+    request = urllib.request.Request(url, data=body, method='POST', headers={'Content-Type': content_type})
+    started = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            response.read()
+            code, headers = response.status, response.headers
+    except urllib.error.HTTPError as e:
+        e.read()
+        code, headers = e.code, e.headers
+    except (urllib.error.URLError, OSError):
+        code, headers = 0, {}
+    elapsed = (time.perf_counter() - started) * 1000
+    inference_ms = headers.get('X-Inference-Ms')
+    return code, elapsed, float(inference_ms) if inference_ms else None
+
+
+class Command(BaseCommand):
+    help = ('对 /recognition/upload 接口进行HTTP压测；未指定 --url 时在本进程中启动测试服务器，'
+            '并使用随机初始化的ResNet50')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default=None,
+                            help='被测接口地址，例如 http://127.0.0.1:8000/recognition/upload')
+        parser.add_argument('--use-checkpoint', action='store_true',
+                            help='内置服务器使用 RECOGNITION_MODEL_PATH 指定的模型（默认使用随机初始化的模型）')
+        parser.add_argument('--images', default='1920x1080:JPEG,1024x768:PNG',
+                            help='合成图片规格，格式为 宽x高:格式，逗号分隔')
+        parser.add_argument('--distinct-images', type=int, default=16,
+                            help='合成图片数量（内置服务器默认关闭识别结果缓存）')
+        parser.add_argument('--concurrency', default='1,4,16',
+                            help='并发客户端数，逗号分隔，依次测试')
+        parser.add_argument('--requests', type=int, default=100,
+                            help='每个并发级别发送的请求数')
+        parser.add_argument('--timeout', type=float, default=60,
+                            help='单个请求的超时时间（秒）')
+        parser.add_argument('--output', default=None,
+                            help='结果JSON的输出路径')
+
+    def handle(self, *args, **options):
+        specs = parse_image_specs(options['images'])
+        if not specs:
+            raise CommandError('请至少指定一种图片规格')
+        payloads = []
+        for index in range(max(1, options['distinct_images'])):
+            width, height, fmt = specs[index % len(specs)]
+            filename = f'synthetic_{index}.{"png" if fmt == "PNG" else "jpg"}'
+            payloads.append(_multipart(synthetic_image(width, height, fmt, index), filename))
+
+        if options['url']:
+            report = self._load_test(options['url'], payloads, options)
+        else:
+            report = self._with_local_server(payloads, options)
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+            self.stdout.write(f'结果已保存: {options["output"]}')
+        for level, stats in report['levels'].items():
+            self.stdout.write(
+                f'  {level:<14} 成功={stats["ok"]:<5} 503={stats["unavailable"]:<4} 其他错误={stats["errors"]:<4} '
+                f'p50={stats["p50_ms"]:.1f}ms p95={stats["p95_ms"]:.1f}ms p99={stats["p99_ms"]:.1f}ms '
+                f'吞吐={stats["requests_per_sec"]:.1f}请求/秒'
+            )
+
+    def _with_local_server(self, payloads, options):
+        """在本进程中启动多线程WSGI服务器，加载模型后执行压测"""
+        from recognition.service import service
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            if options['use_checkpoint']:
+                model_path = settings.RECOGNITION_MODEL_PATH
+            else:
+                with open(settings.RECOGNITION_CLASS_NAMES_PATH, 'r', encoding='utf-8') as f:
+                    num_classes = len(json.load(f))
+                model_path = write_random_artifact(os.path.join(tmp_dir, 'random_resnet50.pt'), num_classes)
+            overrides = {
+                'RECOGNITION_MODELS': {'default': {'model_path': model_path, 'backend': 'eager'}},
+                'RECOGNITION_ACTIVE_MODEL': 'default',
+                'RECOGNITION_SHADOW_MODEL': None,
+                'RECOGNITION_CASCADE_MODEL': None,
+                'RECOGNITION_MODEL_CONTROL_PATH': None,
+                'RECOGNITION_CACHE_ENABLED': False,
+                'DEBUG': False,
+            }
+            with override_settings(**overrides):
+                service.start(background=False)
+                if not service.ready:
+                    raise CommandError(f'模型加载失败: {service.error}')
+                server = ThreadedWSGIServer(('127.0.0.1', 0), _QuietRequestHandler)
+                server.set_app(get_wsgi_application())
+                thread = threading.Thread(target=server.serve_forever, daemon=True)
+                thread.start()
+                try:
+                    url = f'http://127.0.0.1:{server.server_port}/recognition/upload'
+                    self.stdout.write(f'测试服务器已启动: {url}')
+                    report = self._load_test(url, payloads, options)
+                finally:
+                    server.shutdown()
+                    server.server_close()
+        report['model'] = model_path if options['use_checkpoint'] else 'random'
+        return report
+
+    def _load_test(self, url, payloads, options):
+        levels = [int(level) for level in options['concurrency'].split(',') if level]
+        report = {'url': url, 'requests_per_level': options['requests'], 'levels': {}}
+        _post(url, *payloads[0], options['timeout'])  # 预热
+
+        for concurrency in levels:
+            def _send(index):
+                body, content_type = payloads[index % len(payloads)]
+                return _post(url, body, content_type, options['timeout'])
+
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                results = list(pool.map(_send, range(options['requests'])))
+            wall = time.perf_counter() - started
+
+            latencies = sorted(elapsed for code, elapsed, _ in results if code == 200)
+            inference = sorted(ms for code, _, ms in results if code == 200 and ms is not None)
+            report['levels'][f'concurrency_{concurrency}'] = {
+                'ok': len(latencies),
+                'unavailable': sum(1 for code, _, _ in results if code == 503),
+                'errors': sum(1 for code, _, _ in results if code not in (200, 503)),
+                'mean_ms': sum(latencies) / len(latencies) if latencies else 0.0,
+                'p50_ms': percentile(latencies, 50),
+                'p95_ms': percentile(latencies, 95),
+                'p99_ms': percentile(latencies, 99),
+                'server_inference_p50_ms': percentile(inference, 50),
+                'requests_per_sec': len(latencies) / wall if wall else 0.0,
+            }
+        return report
@@ -0,0 +1,162 @@
+import io
+import os
+import json
+
+import torch
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from recognition.model_utils import HerbRecognizer
+from recognition.backends import load_backend
+from recognition.evaluation import list_images, compare_topk, measure_latency
+from recognition.quantization import (
+    QUANT_STATIC, QUANT_DYNAMIC, quantize_static, quantize_dynamic, save_quantized,
+)
+
+
+def _state_dict_size_mb(model):
+    """序列化后的权重大小（MB）"""
+    buffer = io.BytesIO()
+    torch.save(model.state_dict(), buffer)
+    return buffer.tell() / (1024 * 1024)
+
+
+class Command(BaseCommand):
+    help = '对识别模型进行训练后INT8量化，并报告与fp32模型的top-1/top-5一致性及延迟、内存变化'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--calibration-dir', required=True,
+                            help='校准图片目录（建议覆盖全部类别，可按类别分子目录）')
+        parser.add_argument('--calibration-samples', type=int, default=256,
+                            help='最多使用的校准图片数')
+        parser.add_argument('--eval-dir', default=None,
+                            help='一致性评估图片目录，默认与校准目录相同')
+        parser.add_argument('--eval-samples', type=int, default=1000,
+                            help='最多使用的评估图片数')
+        parser.add_argument('--mode', choices=[QUANT_STATIC, QUANT_DYNAMIC], default=QUANT_STATIC,
+                            help='static：卷积层和全连接层全部量化；dynamic：仅量化全连接层')
+        parser.add_argument('--engine', default=None,
+                            help='量化后端（fbgemm / qnnpack），默认自动选择')
+        parser.add_argument('--output', default=settings.RECOGNITION_QUANTIZED_PATH,
+                            help='量化模型输出路径')
+        parser.add_argument('--batch-size', type=int, default=16,
+                            help='校准和评估时的batch大小')
+        parser.add_argument('--iterations', type=int, default=20,
+                            help='性能对比的计时次数')
+        parser.add_argument('--json', action='store_true',
+                            help='以JSON格式输出报告')
+
+    def _batches(self, recognizer, paths, batch_size):
+        for start in range(0, len(paths), batch_size):
+            yield torch.stack([recognizer.preprocess(path) for path in paths[start:start + batch_size]])
+
+    def handle(self, *args, **options):
+        calibration = list_images(options['calibration_dir'], options['calibration_samples'])
+        if not calibration:
+            raise CommandError(f'校准目录中没有图片: {options["calibration_dir"]}')
+        evaluation = list_images(options['eval_dir'] or options['calibration_dir'], options['eval_samples'])
+
+        supported = torch.backends.quantized.supported_engines
+        engine = options['engine'] or ('fbgemm' if 'fbgemm' in supported else 'qnnpack')
+        if engine not in supported:
+            raise CommandError(f'当前环境不支持量化后端 {engine}，可用: {supported}')
+
+        recognizer = HerbRecognizer(settings.RECOGNITION_MODEL_PATH, settings.RECOGNITION_CLASS_NAMES_PATH)
+        if recognizer.model is None:
+            raise CommandError('无法加载fp32模型')
+        model = recognizer.model.cpu().eval()
+        batch_size = options['batch_size']
+
+        self.stdout.write(f'量化模式: {options["mode"]}，后端: {engine}，校准图片: {len(calibration)}')
+        if options['mode'] == QUANT_STATIC:
+            qmodel = quantize_static(model, self._batches(recognizer, calibration, batch_size), engine)
+        else:
+            torch.backends.quantized.engine = engine
+            qmodel = quantize_dynamic(model)
+
+        output = options['output']
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+        save_quantized(qmodel, output)
+        self.stdout.write(f'量化模型已保存: {output}')
+
+        fp32 = load_backend('eager', model=model)
+        int8 = load_backend('quantized', path=output)
+
+        # 逐batch计算概率，避免一次性占用大量内存
+        fp32_probs, int8_probs = [], []
+        with torch.no_grad():
+            for batch in self._batches(recognizer, evaluation, batch_size):
+                fp32_probs.append(torch.softmax(fp32(batch), dim=1))
+                int8_probs.append(torch.softmax(int8(batch).float(), dim=1))
+        fp32_probs = torch.cat(fp32_probs)
+        int8_probs = torch.cat(int8_probs)
+
+        parity = compare_topk(fp32_probs, int8_probs, k=5)
+
+        # 按fp32模型的top1类别统计各类别的一致率
+        fp32_top1 = fp32_probs.argmax(dim=1).tolist()
+        int8_top1 = int8_probs.argmax(dim=1).tolist()
+        per_class = {}
+        for ref, cand in zip(fp32_top1, int8_top1):
+            total, agree = per_class.get(ref, (0, 0))
+            per_class[ref] = (total + 1, agree + (ref == cand))
+        worst = sorted(
+            (
+                {
+                    'class': recognizer.class_names.get(str(idx), str(idx)),
+                    'samples': total,
+                    'top1_agreement': agree / total,
+                }
+                for idx, (total, agree) in per_class.items()
+            ),
+            key=lambda item: item['top1_agreement'],
+        )[:10]
+
+        latency = {
+            'fp32': measure_latency(fp32, (1, batch_size), options['iterations']),
+            'int8': measure_latency(int8, (1, batch_size), options['iterations']),
+        }
+        memory = {
+            'fp32_weights_mb': _state_dict_size_mb(model),
+            'int8_weights_mb': _state_dict_size_mb(qmodel),
+            'int8_file_mb': os.path.getsize(output) / (1024 * 1024),
+        }
+
+        report = {
+            'mode': options['mode'],
+            'engine': engine,
+            'output': output,
+            'calibration_images': len(calibration),
+            'parity': parity,
+            'classes_covered': len(per_class),
+            'classes_total': len(recognizer.class_names),
+            'worst_classes': worst,
+            'latency': latency,
+            'memory': memory,
+        }
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, ensure_ascii=False, indent=2))
+            return
+
+        self.stdout.write(
+            f'\n一致性（{parity["samples"]}张图片，覆盖 {len(per_class)}/{len(recognizer.class_names)} 个类别）:'
+        )
+        self.stdout.write(
+            f'  top1={parity["top1_agreement"]:.4f} '
+            f'top5集合={parity["top5_set_agreement"]:.4f} '
+            f'fp32 top1 在INT8 top5中={parity["ref_top1_in_top5"]:.4f}'
+        )
+        self.stdout.write('  一致率最低的类别:')
+        for item in worst:
+            self.stdout.write(f'    {item["class"]:<8} {item["top1_agreement"]:.3f} ({item["samples"]}张)')
+        self.stdout.write('\n性能:')
+        for name, by_batch in latency.items():
+            for size, stats in by_batch.items():
+                self.stdout.write(
+                    f'  {name:<5} batch={size:<3} mean={stats["mean_ms"]:.2f}ms '
+                    f'吞吐={stats["images_per_sec"]:.1f}张/秒'
+                )
+        self.stdout.write(
+            f'\n权重大小: fp32 {memory["fp32_weights_mb"]:.1f}MB -> INT8 {memory["int8_weights_mb"]:.1f}MB'
+        )
@@ -0,0 +1,63 @@
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from recognition.registry import RegistryControl
+
+
+class Command(BaseCommand):
+    help = '查看或切换线上识别模型及影子评估模型（写入控制文件，各worker无需重启即可生效）'
+
+    def add_arguments(self, parser):
+        subparsers = parser.add_subparsers(dest='action', required=True)
+        subparsers.add_parser('list', help='列出已配置的模型版本及当前控制文件内容')
+
+        activate = subparsers.add_parser('activate', help='切换线上模型')
+        activate.add_argument('version')
+
+        shadow = subparsers.add_parser('shadow', help='设置影子评估模型')
+        shadow.add_argument('version', nargs='?', default=None)
+        shadow.add_argument('--sample-rate', type=float, default=settings.RECOGNITION_SHADOW_SAMPLE_RATE,
+                            help='参与影子评估的请求比例（0~1）')
+        shadow.add_argument('--off', action='store_true', help='停止影子评估')
+
+    def handle(self, *args, **options):
+        path = settings.RECOGNITION_MODEL_CONTROL_PATH
+        if not path:
+            raise CommandError('未配置 RECOGNITION_MODEL_CONTROL_PATH')
+        control = RegistryControl.read(path)
+        versions = settings.RECOGNITION_MODELS
+        action = options['action']
+
+        if action == 'list':
+            active = control.get('active') or settings.RECOGNITION_ACTIVE_MODEL
+            for version, spec in versions.items():
+                marker = '*' if version == active else ' '
+                self.stdout.write(
+                    f'{marker} {version:<12} {spec.get("backend", "eager"):<12} {spec.get("model_path")}'
+                )
+            self.stdout.write(f'\n控制文件 {path}:')
+            self.stdout.write(json.dumps(control, ensure_ascii=False, indent=2))
+            return
+
+        if action == 'activate':
+            version = options['version']
+            if version not in versions:
+                raise CommandError(f'未知的模型版本: {version}（可选: {", ".join(versions)}）')
+            control['active'] = version
+        else:
+            if options['off'] or not options['version']:
+                control['shadow'] = None
+            else:
+                version = options['version']
+                if version not in versions:
+                    raise CommandError(f'未知的模型版本: {version}（可选: {", ".join(versions)}）')
+                if not 0 < options['sample_rate'] <= 1:
+                    raise CommandError('--sample-rate 需在 (0, 1] 范围内')
+                control['shadow'] = {'version': version, 'sample_rate': options['sample_rate']}
+
+        RegistryControl.write(path, control)
+        self.stdout.write(self.style.SUCCESS(
+            f'已更新 {path}，各worker将在下一次识别请求时加载并切换（见 /recognition/models）'
+        ))
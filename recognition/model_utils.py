@@ -5,10 +5,17 @@ import json
 import os
 import logging
 from pathlib import Path
+import io
+import hashlib
+import threading
 import torchvision.models as models
 import traceback
 import sys
 import torch.nn as nn
+from concurrent.futures import ThreadPoolExecutor
+from .backends import BACKEND_EAGER, load_backend
+from .artifact import is_inference_artifact, load_inference_model, read_sidecar
+from .preprocess import FastPreprocessor
 
 # 配置日志
 logging.basicConfig(
@@ -19,15 +26,19 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 class HerbRecognizer:
-    def __init__(self, model_path, class_names_path):
+    def __init__(self, model_path, class_names_path, backend=BACKEND_EAGER, backend_path=None, fast_preprocess=False):
         """
         初始化识别器
         Args:
             model_path: 模型文件路径
             class_names_path: 类别名称映射文件路径
+            backend: 推理后端，eager / torchscript / onnx / quantized
+            backend_path: 非eager后端使用的导出模型路径
+            fast_preprocess: 是否使用JPEG draft解码的快速预处理
         """
         logger.debug(f"Initializing HerbRecognizer with model_path: {model_path}")
         logger.debug(f"Initializing HerbRecognizer with class_names_path: {class_names_path}")
+        logger.debug(f"Initializing HerbRecognizer with backend: {backend}")
         logger.debug(f"Python version: {sys.version}")
         logger.debug(f"PyTorch version: {torch.__version__}")
         logger.debug(f"CUDA available: {torch.cuda.is_available()}")
@@ -54,34 +65,51 @@ class HerbRecognizer:
                 self.class_names = json.load(f)
             logger.debug(f"Loaded {len(self.class_names)} class names")
             
-            # 加载完整模型
-            logger.debug('Loading complete model...')
-            logger.debug(f"Model file size: {os.path.getsize(model_path) / (1024*1024):.2f} MB")
+            self.model = None
+            self.best_val_acc = None
+            self.model_path = model_path
+            self.backend_name = backend
+            self._model_signature = self._file_signature(model_path)
+            self._model_info = None
+            self._model_info_lock = threading.Lock()
+            if backend == BACKEND_EAGER:
+                # 加载完整模型
+                logger.debug('Loading complete model...')
+                logger.debug(f"Model file size: {os.path.getsize(model_path) / (1024*1024):.2f} MB")
             
-            try:
-                # 加载完整检查点
-                checkpoint = torch.load(model_path, map_location=self.device)
-                
-                # 获取模型
-                self.model = checkpoint['model']
-                self.model = self.model.to(self.device)
-                self.model.eval()
-                
-                # 保存其他训练状态（如果需要）
-                self.optimizer_state = checkpoint.get('optimizer_state_dict')
-                self.scheduler_state = checkpoint.get('scheduler_state_dict')
-                self.best_val_acc = checkpoint.get('best_val_acc')
+                try:
+                    if is_inference_artifact(model_path):
+                        # 加载 convert_model 生成的精简推理文件（内存映射）
+                        self.model, metadata = load_inference_model(model_path, self.device)
+                        self.best_val_acc = metadata.get('best_val_acc')
+                        logger.debug("Inference artifact loaded successfully")
+                    else:
+                        # 加载完整检查点
+                        checkpoint = torch.load(model_path, map_location=self.device)
+                    
+                        # 获取模型
+                        self.model = checkpoint['model']
+                        self.model = self.model.to(self.device)
+                        self.model.eval()
+                        self.best_val_acc = checkpoint.get('best_val_acc')
+                    
+                        # 优化器和学习率调度器状态仅用于训练，不保留在推理实例上
+                        del checkpoint
+                        logger.debug("Complete model loaded successfully")
+                    
+                    logger.debug("Model set to eval mode")
                 
-                logger.debug("Complete model loaded successfully")
-                logger.debug("Model set to eval mode")
-                
-            except Exception as e:
-                logger.error(f"Error loading complete model: {str(e)}")
-                logger.error(f"Exception type: {type(e)}")
-                logger.error(f"Exception args: {e.args}")
-                logger.error("Model loading traceback:")
-                logger.error(traceback.format_exc())
-                raise
+                except Exception as e:
+                    logger.error(f"Error loading complete model: {str(e)}")
+                    logger.error(f"Exception type: {type(e)}")
+                    logger.error(f"Exception args: {e.args}")
+                    logger.error("Model loading traceback:")
+                    logger.error(traceback.format_exc())
+                    raise
+            
+            # 初始化推理后端
+            self.backend = load_backend(backend, model=self.model, path=backend_path, device=self.device)
+            logger.debug(f"Inference backend: {self.backend.name}")
             
             logger.info(f'Model loaded successfully with {len(self.class_names)} classes')
             
@@ -100,7 +128,124 @@ class HerbRecognizer:
             transforms.ToTensor(),
             transforms.Normalize([0.485, 0.456, 0.406], [0.229, 0.224, 0.225])
         ])
-        logger.debug("Image transforms initialized")
+        self.preprocessor = FastPreprocessor() if fast_preprocess else None
+        logger.debug(f"Image transforms initialized (fast_preprocess={fast_preprocess})")
+        
+        # 多图识别时用于并行解码和预处理的线程池（PIL解码时会释放GIL）
+        self._preprocess_pool = ThreadPoolExecutor(
+            max_workers=min(8, os.cpu_count() or 1),
+            thread_name_prefix='recognition-preprocess'
+        )
+    
+    @property
+    def model_version(self):
+        """当前加载的模型版本标识（后端 + 模型文件修改时间和大小），用于缓存失效"""
+        mtime, size = self._model_signature or (0, 0)
+        return f'{self.backend_name}-{mtime}-{size}'
+    
+    def load_image(self, image_file):
+        """
+        打开图片并转换为RGB模式
+        Args:
+            image_file: 图片文件对象、路径或原始字节
+        Returns:
+            PIL.Image: RGB图片
+        """
+        if self.preprocessor is not None:
+            source = image_file.file if hasattr(image_file, 'file') else image_file
+            return self.preprocessor.open(source)
+        
+        if isinstance(image_file, str):
+            image = Image.open(image_file)
+        elif isinstance(image_file, (bytes, bytearray, memoryview)):
+            image = Image.open(io.BytesIO(image_file))
+        elif hasattr(image_file, 'file'):
+            image = Image.open(image_file.file)
+        else:
+            image = Image.open(image_file)
+        
+        # 确保图片是RGB模式
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+        return image
+    
+    def preprocess(self, image_file):
+        """
+        将图片预处理为模型输入张量（不含batch维度）
+        Args:
+            image_file: 图片文件对象或路径
+        Returns:
+            torch.Tensor: 形状为 (3, 224, 224) 的张量
+        """
+        return self.preprocess_image(self.load_image(image_file))
+    
+    def preprocess_image(self, image, out=None):
+        """
+        将已解码的RGB图片预处理为模型输入张量（不含batch维度）
+        Args:
+            image: PIL图片
+            out: 可选的预分配张量，使用快速预处理时结果直接写入其中
+        Returns:
+            torch.Tensor: 形状为 (3, 224, 224) 的张量
+        """
+        if self.preprocessor is not None:
+            return self.preprocessor.to_tensor(image, out=out)
+        tensor = self.transform(image)
+        if out is not None:
+            return out.copy_(tensor)
+        return tensor
+    
+    def forward_batch(self, batch):
+        """
+        对一个batch的张量执行前向推理
+        Args:
+            batch: 形状为 (N, 3, 224, 224) 的张量
+        Returns:
+            torch.Tensor: 形状为 (N, num_classes) 的概率张量（位于CPU）
+        """
+        with torch.no_grad():
+            outputs = self.backend(batch)
+            probabilities = torch.softmax(outputs.float(), dim=1)
+        return probabilities.cpu()
+    
+    def extract_embeddings(self, batch):
+        """
+        提取ResNet50分类层之前的全局池化特征（仅eager后端）
+        Args:
+            batch: 形状为 (N, 3, 224, 224) 的张量
+        Returns:
+            torch.Tensor: 形状为 (N, 2048) 的特征张量（位于CPU）
+        """
+        if self.model is None:
+            raise RuntimeError(f'Embedding extraction requires the eager backend (current: {self.backend_name})')
+        model = self.model
+        with torch.no_grad():
+            x = batch.to(self.device)
+            x = model.maxpool(model.relu(model.bn1(model.conv1(x))))
+            x = model.layer4(model.layer3(model.layer2(model.layer1(x))))
+            x = torch.flatten(model.avgpool(x), 1)
+        return x.cpu()
+    
+    def format_topk(self, probabilities, top_k=5):
+        """
+        将单张图片的概率向量转换为top-k结果
+        Args:
+            probabilities: 形状为 (num_classes,) 的概率张量
+            top_k: 返回前k个预测结果
+        Returns:
+            list: 包含dict的列表，每个dict包含name和similarity
+        """
+        top_prob, top_indices = torch.topk(probabilities, min(top_k, len(self.class_names)))
+        
+        results = []
+        for prob, idx in zip(top_prob, top_indices):
+            class_idx = str(idx.item())
+            if class_idx in self.class_names:
+                results.append({
+                    'name': self.class_names[class_idx],
+                    'similarity': float(prob)
+                })
+        return results
     
     def predict(self, image_file, top_k=5):
         """
@@ -112,44 +257,104 @@ class HerbRecognizer:
             list: 包含dict的列表，每个dict包含name和similarity
         """
         try:
-            # 打开并预处理图片
-            if isinstance(image_file, str):
-                image = Image.open(image_file)
-            else:
-                image = Image.open(image_file.file)
-            
-            # 确保图片是RGB模式
-            if image.mode != 'RGB':
-                image = image.convert('RGB')
-            
             # 转换为tensor并添加batch维度
-            image_tensor = self.transform(image).unsqueeze(0)
-            image_tensor = image_tensor.to(self.device)
+            image_tensor = self.preprocess(image_file).unsqueeze(0)
             
             # 进行预测
-            with torch.no_grad():
-                outputs = self.model(image_tensor)
-                probabilities = torch.softmax(outputs, dim=1)
+            probabilities = self.forward_batch(image_tensor)
             
             # 获取top-k结果
-            top_prob, top_indices = torch.topk(probabilities, min(top_k, len(self.class_names)))
-            
-            # 构建结果列表
-            results = []
-            for prob, idx in zip(top_prob[0], top_indices[0]):
-                class_idx = str(idx.item())
-                if class_idx in self.class_names:
-                    results.append({
-                        'name': self.class_names[class_idx],
-                        'similarity': float(prob)
-                    })
-            
-            return results
+            return self.format_topk(probabilities[0], top_k)
             
         except Exception as e:
             logger.error(f'Error during prediction: {str(e)}')
             return None
     
+    def predict_batch(self, images, top_k=5):
+        """
+        对同一药材的多张图片进行识别，并行预处理后只执行一次前向推理
+        Args:
+            images: 图片文件对象或路径的列表
+            top_k: 每张图片及汇总结果返回前k个预测结果
+        Returns:
+            dict: results 为与输入一一对应的识别结果列表（无法处理的图片对应 None），
+                  consensus 为按平均概率汇总后的top-k结果（所有图片都失败时为 None）
+        """
+        # 预分配batch张量，各线程直接写入自己的切片
+        batch = torch.empty((len(images), 3, 224, 224), dtype=torch.float32)
+        
+        def _safe_preprocess(index):
+            try:
+                self.preprocess_image(self.load_image(images[index]), out=batch[index])
+                return True
+            except Exception as e:
+                logger.error(f'Error preprocessing image: {str(e)}')
+                return False
+        
+        ok = list(self._preprocess_pool.map(_safe_preprocess, range(len(images))))
+        valid = [i for i, success in enumerate(ok) if success]
+        results = [None] * len(images)
+        if not valid:
+            return {'results': results, 'consensus': None}
+        
+        if len(valid) < len(images):
+            batch = batch[valid]
+        probabilities = self.forward_batch(batch)
+        for row, i in zip(probabilities, valid):
+            results[i] = self.format_topk(row, top_k)
+        
+        return {
+            'results': results,
+            'consensus': self.format_topk(probabilities.mean(dim=0), top_k)
+        }
+    
+    @staticmethod
+    def _file_signature(path):
+        """模型文件的 (修改时间, 大小)，用于判断文件是否被替换"""
+        try:
+            stat = os.stat(path)
+            return (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            return None
+    
+    def _compute_model_info(self, signature):
+        """计算模型信息：文件未变化时直接使用已加载的模型，否则重新读取模型文件"""
+        if signature == self._model_signature and self.model is not None:
+            return {
+                'architecture': self.model.__class__.__name__,
+                'file_size': signature[1] / (1024 * 1024),  # MB
+                'num_parameters': sum(p.numel() for p in self.model.parameters()),
+                'device': self.device.type,
+                'best_val_acc': self.best_val_acc if self.best_val_acc is not None else 'N/A'
+            }
+        return self.get_model_info(self.model_path)
+    
+    def model_info(self):
+        """
+        获取缓存的模型信息，仅在模型文件的修改时间或大小变化时重新计算
+        Returns:
+            tuple: (模型信息dict, ETag)，无法获取信息时为 (None, None)
+        """
+        signature = self._file_signature(self.model_path)
+        cached = self._model_info
+        if cached is not None and cached[0] == signature:
+            return cached[1], cached[2]
+        
+        with self._model_info_lock:
+            cached = self._model_info
+            if cached is not None and cached[0] == signature:
+                return cached[1], cached[2]
+            
+            info = self._compute_model_info(signature)
+            if info is None:
+                return None, None
+            info['backend'] = self.backend_name
+            digest = hashlib.sha1(json.dumps(info, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+            etag = f'"{digest}"'
+            self._model_info = (signature, info, etag)
+            logger.debug(f"Model info cached, etag={etag}")
+            return info, etag
+    
     @staticmethod
     def get_model_info(model_path):
         """
@@ -160,6 +365,19 @@ class HerbRecognizer:
             dict: 包含模型信息的字典
         """
         try:
+            if is_inference_artifact(model_path):
+                # 直接读取精简推理文件的元数据，无需加载权重
+                metadata = read_sidecar(model_path)
+                return {
+                    'architecture': metadata.get('architecture'),
+                    'file_size': Path(model_path).stat().st_size / (1024 * 1024),  # MB
+                    'num_parameters': metadata.get('num_parameters'),
+                    'num_classes': metadata.get('num_classes'),
+                    'dtype': metadata.get('dtype'),
+                    'device': 'cuda' if torch.cuda.is_available() else 'cpu',
+                    'best_val_acc': metadata.get('best_val_acc', 'N/A')
+                }
+            
             checkpoint = torch.load(model_path, map_location='cpu')
             model = checkpoint['model']
             info = {
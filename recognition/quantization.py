@@ -0,0 +1,87 @@
+import copy
+import logging
+
+import torch
+import torch.nn as nn
+
+logger = logging.getLogger(__name__)
+
+QUANT_STATIC = 'static'
+QUANT_DYNAMIC = 'dynamic'
+
+
+def _quantization_api():
+    """兼容不同版本PyTorch的量化模块位置"""
+    try:
+        import torch.ao.quantization as tq
+    except ImportError:
+        import torch.quantization as tq
+    return tq
+
+
+def build_quantizable_resnet50(model):
+    """
+    用训练好的ResNet50权重构造可量化版本（带QuantStub/DeQuantStub及可融合的残差相加）
+    Args:
+        model: torchvision ResNet50 模型（分类头可以是自定义模块）
+    Returns:
+        torchvision.models.quantization.QuantizableResNet
+    """
+    from torchvision.models.quantization import resnet50 as quantizable_resnet50
+
+    try:
+        qmodel = quantizable_resnet50(weights=None, quantize=False)
+    except TypeError:
+        # 旧版torchvision使用 pretrained 参数
+        qmodel = quantizable_resnet50(pretrained=False, quantize=False)
+    qmodel.fc = copy.deepcopy(model.fc)
+    missing, unexpected = qmodel.load_state_dict(model.state_dict(), strict=False)
+    if missing or unexpected:
+        raise ValueError(
+            f'Model is not a torchvision ResNet50: missing={missing[:5]}, unexpected={unexpected[:5]}'
+        )
+    return qmodel.cpu().eval()
+
+
+def quantize_static(model, calibration_batches, engine='fbgemm'):
+    """
+    训练后静态量化：融合conv/bn/relu，在校准数据上统计激活范围后转换为INT8
+    Args:
+        model: fp32 ResNet50 模型
+        calibration_batches: 可迭代的 (N, 3, 224, 224) 校准张量
+        engine: 量化后端，x86使用fbgemm，ARM使用qnnpack
+    Returns:
+        量化后的模型
+    """
+    tq = _quantization_api()
+    torch.backends.quantized.engine = engine
+    qmodel = build_quantizable_resnet50(model)
+    qmodel.fuse_model()
+    qmodel.qconfig = tq.get_default_qconfig(engine)
+    tq.prepare(qmodel, inplace=True)
+
+    observed = 0
+    with torch.no_grad():
+        for batch in calibration_batches:
+            qmodel(batch)
+            observed += batch.shape[0]
+    logger.info(f'Calibrated quantization observers on {observed} images')
+
+    tq.convert(qmodel, inplace=True)
+    return qmodel
+
+
+def quantize_dynamic(model):
+    """动态量化：仅将全连接层权重转换为INT8（激活在运行时量化）"""
+    tq = _quantization_api()
+    return tq.quantize_dynamic(copy.deepcopy(model).cpu().eval(), {nn.Linear}, dtype=torch.qint8)
+
+
+def save_quantized(qmodel, path):
+    """将量化模型trace为TorchScript保存，加载时无需模型定义代码"""
+    example = torch.randn(1, 3, 224, 224)
+    with torch.no_grad():
+        traced = torch.jit.trace(qmodel, example)
+        traced = torch.jit.freeze(traced.eval())
+    traced.save(path)
+    return path
@@ -0,0 +1,303 @@
+import json
+import os
+import time
+import queue
+import random
+import logging
+import threading
+from collections import deque
+
+from .evaluation import percentile
+
+logger = logging.getLogger(__name__)
+
+
+class ShadowEvaluator:
+    """
+    影子评估：按采样比例把线上请求的输入交给候选模型在后台线程中推理，
+    记录与线上模型的结果一致率和推理耗时，不影响线上响应
+    """
+
+    def __init__(self, version, recognizer, sample_rate=0.05, queue_size=32, stats_size=1000):
+        self.version = version
+        self.recognizer = recognizer
+        self.sample_rate = max(0.0, min(1.0, float(sample_rate)))
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._stopped = threading.Event()
+        self._lock = threading.Lock()
+        self._recent = deque(maxlen=stats_size)  # (top1_agree, topk_overlap, shadow_ms, primary_ms)
+        self._counters = {'sampled': 0, 'evaluated': 0, 'dropped': 0, 'errors': 0}
+        self._worker = threading.Thread(target=self._run, name=f'recognition-shadow-{version}', daemon=True)
+        self._worker.start()
+
+    def offer(self, image_tensor, primary_results, primary_ms=None):
+        """按采样比例提交一次影子评估，队列满时直接丢弃，不阻塞调用方"""
+        if not primary_results or self._stopped.is_set() or random.random() >= self.sample_rate:
+            return
+        try:
+            self._queue.put_nowait((image_tensor, primary_results, primary_ms))
+            counter = 'sampled'
+        except queue.Full:
+            counter = 'dropped'
+        with self._lock:
+            self._counters[counter] += 1
+
+    def close(self):
+        """
+        停止后台线程，不阻塞调用方（切换影子模型时在请求线程中调用）：
+        队列已满时不放入结束标记，后台线程处理完当前任务后检查停止标志退出
+        """
+        self._stopped.set()
+        try:
+            self._queue.put_nowait(None)
+        except queue.Full:
+            pass
+
+    def _run(self):
+        import torch
+        # 影子推理只占用一个算子线程，避免挤占线上推理
+        torch.set_num_threads(1)
+        while not self._stopped.is_set():
+            item = self._queue.get()
+            if item is None or self._stopped.is_set():
+                return
+            image_tensor, primary_results, primary_ms = item
+            try:
+                started = time.perf_counter()
+                probabilities = self.recognizer.forward_batch(image_tensor.unsqueeze(0))
+                results = self.recognizer.format_topk(probabilities[0], len(primary_results))
+                shadow_ms = (time.perf_counter() - started) * 1000
+                primary_names = [r['name'] for r in primary_results]
+                shadow_names = [r['name'] for r in results]
+                top1 = bool(shadow_names) and shadow_names[0] == primary_names[0]
+                overlap = len(set(primary_names) & set(shadow_names)) / len(primary_names)
+                with self._lock:
+                    self._counters['evaluated'] += 1
+                    self._recent.append((top1, overlap, shadow_ms, primary_ms))
+            except Exception as e:
+                logger.error(f'Shadow evaluation failed for {self.version}: {str(e)}')
+                with self._lock:
+                    self._counters['errors'] += 1
+
+    def stats(self):
+        with self._lock:
+            recent = list(self._recent)
+            counters = dict(self._counters)
+        shadow_ms = sorted(item[2] for item in recent)
+        primary_ms = sorted(item[3] for item in recent if item[3] is not None)
+        return {
+            'version': self.version,
+            'sample_rate': self.sample_rate,
+            **counters,
+            'top1_agreement': sum(item[0] for item in recent) / len(recent) if recent else None,
+            'topk_overlap': sum(item[1] for item in recent) / len(recent) if recent else None,
+            'shadow_ms': {
+                'p50': percentile(shadow_ms, 50),
+                'p95': percentile(shadow_ms, 95),
+                'p99': percentile(shadow_ms, 99),
+            },
+            'primary_ms': {
+                'p50': percentile(primary_ms, 50),
+                'p95': percentile(primary_ms, 95),
+                'p99': percentile(primary_ms, 99),
+            },
+        }
+
+
+class ModelRegistry:
+    """
+    多版本模型注册表
+
+    可同时加载多个版本的识别器，通过替换引用原子地切换线上模型：
+    已经取得旧识别器引用的请求会用旧模型完成，新请求使用新模型。
+    """
+
+    def __init__(self, specs, loader, on_activate=None):
+        """
+        初始化注册表
+        Args:
+            specs: {版本名: 模型配置dict}
+            loader: 加载函数 loader(version, spec) -> HerbRecognizer
+            on_activate: 切换线上模型后的回调 on_activate(version, recognizer)
+        """
+        self.specs = dict(specs)
+        self._loader = loader
+        self._on_activate = on_activate
+        self._models = {}
+        self._loading = set()
+        self._errors = {}
+        self._active_version = None
+        self._shadow = None
+        # 可重入：切换控制文件时在持有锁的情况下调用 activate、load_async、set_shadow
+        self._lock = threading.RLock()
+
+    @property
+    def active(self):
+        """当前线上识别器"""
+        version = self._active_version
+        return self._models.get(version) if version else None
+
+    @property
+    def active_version(self):
+        return self._active_version
+
+    @property
+    def shadow(self):
+        return self._shadow
+
+    def is_loaded(self, version):
+        return version in self._models
+
+    def load(self, version):
+        """加载指定版本（已加载时直接返回）"""
+        if version in self._models:
+            return self._models[version]
+        if version not in self.specs:
+            raise KeyError(f'Unknown model version: {version}')
+        with self._lock:
+            if version in self._loading:
+                raise RuntimeError(f'Model {version} is already loading')
+            self._loading.add(version)
+        try:
+            recognizer = self._loader(version, self.specs[version])
+            with self._lock:
+                self._models[version] = recognizer
+                self._errors.pop(version, None)
+            logger.info(f'Model {version} loaded')
+            return recognizer
+        except Exception as e:
+            with self._lock:
+                self._errors[version] = str(e)
+            raise
+        finally:
+            with self._lock:
+                self._loading.discard(version)
+
+    def load_async(self, version, callback=None):
+        """在后台线程中加载指定版本，完成后调用 callback(version)"""
+        with self._lock:
+            if version in self._loading:
+                return
+
+        def _target():
+            try:
+                self.load(version)
+            except Exception as e:
+                logger.error(f'Failed to load model {version}: {str(e)}')
+                return
+            if callback is not None:
+                callback(version)
+
+        threading.Thread(target=_target, name=f'recognition-load-{version}', daemon=True).start()
+
+    def activate(self, version):
+        """将已加载的版本切换为线上模型"""
+        recognizer = self._models.get(version)
+        if recognizer is None:
+            raise KeyError(f'Model {version} is not loaded')
+        with self._lock:
+            previous = self._active_version
+            self._active_version = version
+        if self._on_activate is not None:
+            self._on_activate(version, recognizer)
+        if previous != version:
+            logger.info(f'Active model switched: {previous} -> {version}')
+
+    def set_shadow(self, version, sample_rate=0.05):
+        """
+        设置影子评估的候选模型（需已加载），version 为 None 时停止影子评估；
+        替换和关闭在锁内完成，并发调用时被替换的评估器都会被关闭
+        """
+        with self._lock:
+            previous = self._shadow
+            if version is None:
+                self._shadow = None
+            else:
+                recognizer = self._models.get(version)
+                if recognizer is None:
+                    raise KeyError(f'Model {version} is not loaded')
+                if previous is not None and previous.version == version and previous.sample_rate == sample_rate:
+                    return
+                self._shadow = ShadowEvaluator(version, recognizer, sample_rate)
+            if previous is not None and previous is not self._shadow:
+                previous.close()
+
+    def unload(self, version):
+        """卸载非线上、非影子的版本"""
+        shadow = self._shadow
+        if version == self._active_version or (shadow is not None and shadow.version == version):
+            raise ValueError(f'Model {version} is in use')
+        with self._lock:
+            self._models.pop(version, None)
+
+    def status(self):
+        shadow = self._shadow
+        return {
+            'active': self._active_version,
+            'versions': {
+                version: {
+                    'loaded': version in self._models,
+                    'loading': version in self._loading,
+                    'error': self._errors.get(version),
+                    'model_version': self._models[version].model_version if version in self._models else None,
+                    'model_path': spec.get('model_path'),
+                    'backend': spec.get('backend', 'eager'),
+                }
+                for version, spec in self.specs.items()
+            },
+            'shadow': shadow.stats() if shadow is not None else None,
+        }
+
+
+class RegistryControl:
+    """
+    读取模型切换控制文件（由 manage.py recognition_models 写入），
+    各个worker进程据此在不重启的情况下切换线上模型和影子模型
+    """
+
+    def __init__(self, path, check_interval=1.0):
+        self.path = path
+        self.check_interval = check_interval
+        self._next_check = 0.0
+        self._mtime = None
+
+    def poll(self):
+        """
+        控制文件有变化时返回其内容，否则返回 None（按 check_interval 限制检查频率）
+        """
+        if not self.path:
+            return None
+        now = time.monotonic()
+        if now < self._next_check:
+            return None
+        self._next_check = now + self.check_interval
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            return None
+        if mtime == self._mtime:
+            return None
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                control = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.error(f'Invalid model control file {self.path}: {str(e)}')
+            return None
+        self._mtime = mtime
+        return control
+
+    @staticmethod
+    def write(path, control):
+        """原子写入控制文件"""
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(control, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def read(path):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
@@ -0,0 +1,429 @@
+import time
+import logging
+import threading
+import traceback
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+STATE_IDLE = 'idle'
+STATE_LOADING = 'loading'
+STATE_READY = 'ready'
+STATE_FAILED = 'failed'
+
+LOAD_MODE_BACKGROUND = 'background'
+LOAD_MODE_LAZY = 'lazy'
+
+
+class RecognitionService:
+    """
+    图像识别服务
+
+    持有识别器及批量推理引擎、识别结果缓存、推理线程池。模型在首次使用时或启动后在后台线程中加载，
+    导入本模块不会导入torch，不提供识别服务的进程（migrate、admin等）不会加载模型。
+    """
+
+    def __init__(self):
+        self.state = STATE_IDLE
+        self.error = None
+        self.registry = None
+        self.control = None
+        self.batch_engine = None
+        self.prediction_cache = None
+        self.inference_executor = None
+        self.embedding_index = None
+        # 控制文件（或配置）最近一次要求的线上版本和影子评估 (版本, 采样率)，后台加载完成时据此判断是否仍需切换
+        self._target_active = None
+        self._target_shadow = None
+        self.tta = None
+        self.load_seconds = None
+        self.warmup_seconds = None
+        self._lock = threading.Lock()
+        self._loaded = threading.Event()
+
+    def start(self, background=True):
+        """开始加载模型（只会执行一次）"""
+        with self._lock:
+            if self.state != STATE_IDLE:
+                return
+            self.state = STATE_LOADING
+        if background:
+            threading.Thread(target=self._load, name='recognition-loader', daemon=True).start()
+        else:
+            self._load()
+
+    def wait(self, timeout=None):
+        """
+        确保模型已开始加载并等待加载完成
+        Args:
+            timeout: 最长等待时间（秒），为 0 时不等待
+        Returns:
+            bool: 模型是否已就绪
+        """
+        self.start()
+        self._loaded.wait(timeout)
+        return self.state == STATE_READY
+
+    @property
+    def ready(self):
+        return self.state == STATE_READY
+
+    @property
+    def recognizer(self):
+        """当前线上识别器"""
+        return self.registry.active if self.registry is not None else None
+
+    def status(self):
+        """就绪状态"""
+        return {
+            'status': self.state,
+            'active_model': self.registry.active_version if self.registry is not None else None,
+            'error': self.error,
+            'load_seconds': self.load_seconds,
+            'warmup_seconds': self.warmup_seconds,
+        }
+
+    def _load(self):
+        started = time.perf_counter()
+        try:
+            from .registry import ModelRegistry, RegistryControl
+
+            self.registry = ModelRegistry(
+                settings.RECOGNITION_MODELS, self._create_recognizer, on_activate=self._on_activate
+            )
+            self.control = RegistryControl(getattr(settings, 'RECOGNITION_MODEL_CONTROL_PATH', None))
+            control = RegistryControl.read(self.control.path) if self.control.path else {}
+            active = control.get('active') or settings.RECOGNITION_ACTIVE_MODEL
+            self._target_active = active
+            self.registry.load(active)
+            self.registry.activate(active)
+            self.load_seconds = time.perf_counter() - started
+            logger.info(f"模型识别器初始化成功（{active}），耗时 {self.load_seconds:.2f}s")
+            self._create_components()
+            self._warmup(self.recognizer)
+
+            shadow = control.get('shadow') or {}
+            shadow_version = shadow.get('version') or getattr(settings, 'RECOGNITION_SHADOW_MODEL', None)
+            if shadow_version:
+                sample_rate = shadow.get('sample_rate', getattr(settings, 'RECOGNITION_SHADOW_SAMPLE_RATE', 0.05))
+                self._target_shadow = (shadow_version, sample_rate)
+                self.registry.load_async(
+                    shadow_version, lambda version: self._apply_shadow(version, sample_rate)
+                )
+            self.state = STATE_READY
+        except Exception as e:
+            logger.error(f"模型识别器初始化失败: {str(e)}")
+            logger.error("初始化失败时的完整堆栈跟踪:")
+            logger.error(traceback.format_exc())
+            self.error = str(e)
+            self.registry = None
+            self.state = STATE_FAILED
+        finally:
+            self._loaded.set()
+
+    def _create_recognizer(self, version, spec):
+        """按 RECOGNITION_MODELS 中的配置创建识别器，已就绪的服务中新加载的模型会先预热"""
+        from .model_utils import HerbRecognizer
+
+        logger.debug(f"Loading model {version}: {spec}")
+        recognizer = HerbRecognizer(
+            spec['model_path'], spec.get('class_names_path', settings.RECOGNITION_CLASS_NAMES_PATH),
+            backend=spec.get('backend', 'eager'),
+            backend_path=spec.get('backend_path'),
+            fast_preprocess=getattr(settings, 'RECOGNITION_FAST_PREPROCESS', False),
+        )
+        cascade_version = getattr(settings, 'RECOGNITION_CASCADE_MODEL', None)
+        if cascade_version and version != cascade_version:
+            # 级联模式：小模型作为注册表中的一个版本加载，与各个完整模型组合
+            from .cascade import CascadeRecognizer
+            recognizer = CascadeRecognizer(
+                self.registry.load(cascade_version), recognizer,
+                threshold=getattr(settings, 'RECOGNITION_CASCADE_THRESHOLD', 0.9),
+                fast_version=cascade_version, full_version=version,
+            )
+        if self.state == STATE_READY:
+            self._warmup(recognizer)
+        return recognizer
+
+    def cascade_stats(self):
+        """线上模型为级联识别器时返回其升级率和耗时统计，否则返回 None"""
+        recognizer = self.recognizer
+        if recognizer is None or not getattr(settings, 'RECOGNITION_CASCADE_MODEL', None):
+            return None
+        from .cascade import CascadeRecognizer
+        return recognizer.stats() if isinstance(recognizer, CascadeRecognizer) else None
+
+    def _on_activate(self, version, recognizer):
+        """切换线上模型后，未指定识别器的批量推理请求使用新模型"""
+        if self.batch_engine is not None:
+            self.batch_engine.recognizer = recognizer
+
+    def sync(self):
+        """
+        检查模型切换控制文件：线上模型或影子模型有变化时在后台加载，加载完成后原子切换，
+        切换过程中旧模型继续处理请求。检查和切换在注册表的锁内进行，多个请求线程同时发现变化时只处理一次
+        """
+        if self.control is None or self.registry is None:
+            return
+        registry = self.registry
+        with registry._lock:
+            control = self.control.poll()
+            if not control:
+                return
+
+            active = control.get('active')
+            if active and active in registry.specs:
+                self._target_active = active
+                if active != registry.active_version:
+                    if registry.is_loaded(active):
+                        registry.activate(active)
+                    else:
+                        logger.info(f"开始加载新的线上模型: {active}")
+                        registry.load_async(active, self._apply_active)
+
+            shadow = control.get('shadow') or {}
+            shadow_version = shadow.get('version')
+            sample_rate = shadow.get('sample_rate', getattr(settings, 'RECOGNITION_SHADOW_SAMPLE_RATE', 0.05))
+            if not shadow_version:
+                self._target_shadow = None
+                registry.set_shadow(None)
+            elif shadow_version in registry.specs:
+                self._target_shadow = (shadow_version, sample_rate)
+                if registry.is_loaded(shadow_version):
+                    registry.set_shadow(shadow_version, sample_rate)
+                else:
+                    registry.load_async(shadow_version, lambda version: self._apply_shadow(version, sample_rate))
+
+    def _apply_active(self, version):
+        """后台加载完成后切换线上模型；加载期间控制文件已改为其他版本时不切换"""
+        with self.registry._lock:
+            if version != self._target_active:
+                logger.info(f"模型 {version} 已加载，但线上模型已改为 {self._target_active}，不切换")
+                return
+            self.registry.activate(version)
+
+    def _apply_shadow(self, version, sample_rate):
+        """后台加载完成后启用影子评估；加载期间控制文件已停止或更换影子模型时不启用"""
+        with self.registry._lock:
+            if (version, sample_rate) != self._target_shadow:
+                logger.info(f"模型 {version} 已加载，但影子评估配置已变化，不启用")
+                return
+            self.registry.set_shadow(version, sample_rate)
+
+    def _create_components(self):
+        """初始化批量推理引擎、测试时增强、识别结果缓存和推理线程池，单个组件失败时降级为不启用"""
+        if getattr(settings, 'RECOGNITION_BATCHING_ENABLED', False):
+            try:
+                from .batching import BatchingEngine
+                self.batch_engine = BatchingEngine(
+                    self.recognizer,
+                    max_batch_size=getattr(settings, 'RECOGNITION_MAX_BATCH_SIZE', 8),
+                    window_ms=getattr(settings, 'RECOGNITION_BATCH_WINDOW_MS', 10),
+                    num_threads=getattr(settings, 'RECOGNITION_BATCH_THREADS', None),
+                )
+            except Exception as e:
+                logger.error(f"批量推理引擎初始化失败: {str(e)}")
+
+        if getattr(settings, 'RECOGNITION_TTA_ENABLED', False):
+            try:
+                from .tta import TestTimeAugmentation
+                views = getattr(settings, 'RECOGNITION_TTA_VIEWS', ('flip', 'five_crop', 'scale'))
+                self.tta = TestTimeAugmentation(
+                    margin=getattr(settings, 'RECOGNITION_TTA_MARGIN', 0.1),
+                    flip='flip' in views,
+                    five_crop='five_crop' in views,
+                    scales=getattr(settings, 'RECOGNITION_TTA_SCALES', (224, 320)) if 'scale' in views else (),
+                )
+            except Exception as e:
+                logger.error(f"测试时增强初始化失败: {str(e)}")
+
+        if getattr(settings, 'RECOGNITION_CACHE_ENABLED', False):
+            try:
+                from .cache import PredictionCache
+                self.prediction_cache = PredictionCache(
+                    max_entries=getattr(settings, 'RECOGNITION_CACHE_MAX_ENTRIES', 1024),
+                    ttl=getattr(settings, 'RECOGNITION_CACHE_TTL', 86400),
+                    shared_path=getattr(settings, 'RECOGNITION_CACHE_SHARED_PATH', None),
+                    phash_distance=getattr(settings, 'RECOGNITION_CACHE_PHASH_DISTANCE', None),
+                )
+                self.prediction_cache.prune(self._cache_version(self.recognizer))
+            except Exception as e:
+                logger.error(f"识别结果缓存初始化失败: {str(e)}")
+
+        if getattr(settings, 'RECOGNITION_EXECUTOR_ENABLED', False):
+            try:
+                from .executor import InferenceExecutor
+                self.inference_executor = InferenceExecutor(
+                    workers=getattr(settings, 'RECOGNITION_EXECUTOR_WORKERS', 2),
+                    queue_size=getattr(settings, 'RECOGNITION_EXECUTOR_QUEUE_SIZE', 16),
+                    threads_per_worker=getattr(settings, 'RECOGNITION_EXECUTOR_THREADS_PER_WORKER', 1),
+                    timeout=getattr(settings, 'RECOGNITION_EXECUTOR_TIMEOUT', 30),
+                )
+            except Exception as e:
+                logger.error(f"推理线程池初始化失败: {str(e)}")
+
+    def _warmup(self, recognizer):
+        """用空白输入执行几次前向推理，避免首个真实请求承担算子初始化开销"""
+        iterations = getattr(settings, 'RECOGNITION_WARMUP_ITERATIONS', 0)
+        if iterations <= 0:
+            return
+        import torch
+
+        started = time.perf_counter()
+        sizes = {1}
+        if self.batch_engine is not None:
+            sizes.add(self.batch_engine.max_batch_size)
+        for size in sorted(sizes):
+            dummy = torch.zeros(size, 3, 224, 224)
+            for _ in range(iterations):
+                recognizer.forward_batch(dummy)
+        self.warmup_seconds = time.perf_counter() - started
+        logger.info(f"模型预热完成（batch大小 {sorted(sizes)}，各 {iterations} 次），耗时 {self.warmup_seconds:.2f}s")
+
+    def run(self, fn, *args, batched=False):
+        """
+        在推理线程池中执行识别任务，未启用线程池时在当前线程执行
+        Args:
+            batched: 任务的前向推理是否交给批量推理引擎（单张图片识别）。启用批量推理时这类任务
+                只经过线程池的准入控制、在当前线程执行，使并发请求能在批量推理引擎中合并
+        """
+        if self.inference_executor is None:
+            return fn(*args), None
+        inline = batched and self.batch_engine is not None
+        return self.inference_executor.run(fn, *args, inline=inline)
+
+    def infer(self, image_tensor, top_k=5, recognizer=None):
+        """对单张预处理后的图片执行推理，启用批量推理时交给批量引擎；按采样比例提交影子评估"""
+        started = time.perf_counter()
+        # 使用调用方取得的识别器：切换线上模型时进行中的请求由旧模型完成，结果与缓存键中的模型版本一致
+        recognizer = recognizer or self.recognizer
+        if self.batch_engine is not None:
+            results = self.batch_engine.submit(image_tensor, top_k, recognizer=recognizer)
+        else:
+            probabilities = recognizer.forward_batch(image_tensor.unsqueeze(0))
+            results = recognizer.format_topk(probabilities[0], top_k)
+        shadow = self.registry.shadow if self.registry is not None else None
+        if shadow is not None:
+            shadow.offer(image_tensor, results, (time.perf_counter() - started) * 1000)
+        return results
+
+    def get_embedding_index(self):
+        """首次使用时加载相似图片检索索引，索引文件不存在时返回 None"""
+        if self.embedding_index is None:
+            path = getattr(settings, 'RECOGNITION_EMBEDDING_INDEX_PATH', None)
+            if not path:
+                return None
+            with self._lock:
+                if self.embedding_index is None:
+                    from .embeddings import EmbeddingIndex
+                    try:
+                        index = EmbeddingIndex.load(path)
+                    except FileNotFoundError:
+                        logger.warning(f"相似图片检索索引不存在: {path}")
+                        return None
+                    recognizer = self.recognizer
+                    if index.model_version and recognizer is not None and index.model_version != recognizer.model_version:
+                        logger.warning(
+                            f"检索索引由 {index.model_version} 生成，与当前模型 {recognizer.model_version} 不一致，"
+                            f"请重新运行 build_embedding_index"
+                        )
+                    self.embedding_index = index
+        return self.embedding_index
+
+    def similar(self, image_file, k=10):
+        """
+        检索与上传图片最相似的参考图片
+        Args:
+            image_file: 上传的图片文件
+            k: 返回数量
+        Returns:
+            list: 按余弦距离升序的参考图片（label、path、distance），索引不可用时返回 None
+        """
+        index = self.get_embedding_index()
+        if index is None:
+            return None
+        recognizer = self.recognizer
+        embedding = recognizer.extract_embeddings(recognizer.preprocess(image_file).unsqueeze(0))[0].numpy()
+        gallery_url = getattr(settings, 'RECOGNITION_GALLERY_URL', None)
+        results = []
+        for position, distance in index.search(embedding, k):
+            path = index.paths[position]
+            results.append({
+                'name': index.labels[position],
+                'path': path,
+                'url': f"{gallery_url.rstrip('/')}/{path}" if gallery_url else None,
+                'distance': round(distance, 6),
+            })
+        return results
+
+    def _cache_version(self, recognizer):
+        """缓存键中的版本：模型版本，启用测试时增强时附加增强配置"""
+        if self.tta is None:
+            return recognizer.model_version
+        return f'{recognizer.model_version}-{self.tta.signature}'
+
+    def infer_image(self, image, top_k=5, recognizer=None):
+        """对已解码的图片执行推理，第一次推理的top-1与top-2概率差过小时再执行一次测试时增强"""
+        recognizer = recognizer or self.recognizer
+        tensor = recognizer.preprocess_image(image)
+        results = self.infer(tensor, top_k, recognizer)
+        tta = self.tta
+        if tta is not None and tta.needs_augmentation(results):
+            # 启用批量推理时增强推理也在批量推理线程中执行，受 RECOGNITION_BATCH_THREADS 限定
+            forward = self.batch_engine.forward if self.batch_engine is not None else None
+            results = tta.refine(recognizer, image, tensor, results, top_k, forward=forward)
+        return results
+
+    @staticmethod
+    def _content_digest(image_file):
+        """计算上传图片内容的哈希；内存中的上传文件直接对缓冲区计算，不复制数据"""
+        from .cache import content_hash
+
+        buffer = getattr(image_file, 'file', image_file)
+        if hasattr(buffer, 'getbuffer'):
+            with buffer.getbuffer() as view:
+                return content_hash(view)
+        data = image_file.read()
+        image_file.seek(0)
+        return content_hash(data)
+
+    def recognize(self, image_file, top_k=5):
+        """识别单张上传图片：先按内容哈希和感知哈希查询缓存，未命中时执行推理并写入缓存"""
+        # 整个请求使用同一个识别器引用，切换线上模型不影响进行中的请求
+        recognizer = self.recognizer
+        cache = self.prediction_cache
+        if cache is None:
+            return self.infer_image(recognizer.load_image(image_file), top_k, recognizer)
+
+        from .cache import perceptual_hash
+
+        digest = self._content_digest(image_file)
+        version = self._cache_version(recognizer)
+        results = cache.get(digest, version, top_k)
+        if results is not None:
+            logger.debug(f"识别结果缓存命中: {digest[:12]}")
+            return results
+
+        image = recognizer.load_image(image_file)
+        phash = perceptual_hash(image) if cache.phash_enabled else None
+        results = cache.get_similar(phash, version, top_k)
+        if results is not None:
+            logger.debug(f"识别结果近似图片缓存命中: {digest[:12]}")
+            cache.set(digest, version, top_k, results)
+            return results
+
+        cache.miss()
+        results = self.infer_image(image, top_k, recognizer)
+        if results is not None:
+            cache.set(digest, version, top_k, results, phash)
+        return results
+
+
+service = RecognitionService()
+
+
+def preload():
+    """服务启动时调用：RECOGNITION_LOAD_MODE=background 时在后台线程中加载模型"""
+    if getattr(settings, 'RECOGNITION_LOAD_MODE', LOAD_MODE_BACKGROUND) == LOAD_MODE_BACKGROUND:
+        service.start(background=True)
@@ -0,0 +1,184 @@
+import time
+import logging
+import threading
+from collections import deque
+
+import torch
+from torchvision import transforms
+from torchvision.transforms import functional as F
+
+from .evaluation import percentile
+from .preprocess import IMAGENET_MEAN, IMAGENET_STD, FastPreprocessor
+
+logger = logging.getLogger(__name__)
+
+
+class TestTimeAugmentation:
+    """
+    低置信度图片的测试时增强
+
+    仅当第一次推理的top-1与top-2概率差小于阈值时触发：由已解码的图片构造
+    四角裁剪、多尺度中心裁剪及它们的水平翻转，与原始输入拼成一个batch执行一次前向推理，
+    按所有视图的平均概率给出结果。
+    """
+
+    def __init__(self, margin=0.1, flip=True, five_crop=True, scales=(224, 320),
+                 resize=256, crop=224, stats_size=1000):
+        """
+        初始化测试时增强
+        Args:
+            margin: top-1与top-2概率差小于该值时触发
+            flip: 是否加入水平翻转视图
+            five_crop: 是否加入四角裁剪视图（与中心裁剪合称五点裁剪）
+            scales: 额外的缩放尺寸（短边缩放到该尺寸后中心裁剪）
+            resize: 基准缩放尺寸，与常规预处理一致
+            crop: 裁剪尺寸
+            stats_size: 统计信息保留的最近增强次数
+        """
+        self.margin = float(margin)
+        self.flip = flip
+        self.five_crop = five_crop
+        self.scales = tuple(int(scale) for scale in scales)
+        self.crop = crop
+        self._base = FastPreprocessor(resize=resize, crop=crop)
+        self._scalers = [FastPreprocessor(resize=scale, crop=crop) for scale in self.scales]
+        # 未启用快速预处理的识别器使用与 HerbRecognizer.transform 相同的常规流程构造视图
+        self._to_tensor = transforms.Compose([
+            transforms.ToTensor(),
+            transforms.Normalize(IMAGENET_MEAN, IMAGENET_STD),
+        ])
+        self._lock = threading.Lock()
+        self._counters = {'requests': 0, 'augmented': 0, 'top1_changed': 0}
+        self._recent = deque(maxlen=stats_size)  # 每次增强的额外耗时（毫秒）
+
+    @property
+    def num_views(self):
+        """每次增强的前向推理视图数（含原始输入）"""
+        views = 1 + (4 if self.five_crop else 0) + len(self._scalers)
+        return views * 2 if self.flip else views
+
+    @property
+    def signature(self):
+        """增强配置标识，用于区分缓存中的识别结果"""
+        return f'tta{self.margin:g}x{self.num_views}'
+
+    def needs_augmentation(self, results):
+        """
+        判断第一次推理结果是否需要增强
+        Args:
+            results: format_topk 返回的top-k结果
+        """
+        with self._lock:
+            self._counters['requests'] += 1
+        if not results:
+            return False
+        second = results[1]['similarity'] if len(results) > 1 else 0.0
+        return results[0]['similarity'] - second < self.margin
+
+    def _corner_boxes(self, width, height):
+        """四角裁剪区域在原图坐标系中的位置"""
+        side = self.crop * min(width, height) / float(self._base.resize)
+        return [
+            (0, 0, side, side),
+            (width - side, 0, width, side),
+            (0, height - side, side, height),
+            (width - side, height - side, width, height),
+        ]
+
+    def build_views(self, image, center, fast=True):
+        """
+        构造全部增强视图
+        Args:
+            image: 已解码的PIL RGB图片
+            center: 第一次推理使用的 (3, crop, crop) 输入张量
+            fast: 是否使用快速预处理，应与第一次推理的预处理方式一致
+        Returns:
+            torch.Tensor: 形状为 (num_views, 3, crop, crop) 的张量
+        """
+        batch = torch.empty((self.num_views, 3, self.crop, self.crop), dtype=torch.float32)
+        batch[0].copy_(center)
+        index = 1
+        if fast:
+            if self.five_crop:
+                for box in self._corner_boxes(*image.size):
+                    self._base.to_tensor(image, out=batch[index], box=box)
+                    index += 1
+            for scaler in self._scalers:
+                scaler.to_tensor(image, out=batch[index])
+                index += 1
+        else:
+            for view in self._standard_views(image):
+                batch[index].copy_(self._to_tensor(view))
+                index += 1
+        if self.flip:
+            batch[index:].copy_(batch[:index].flip(3))
+        return batch
+
+    def _standard_views(self, image):
+        """常规流程（Resize + 裁剪）的四角裁剪和多尺度中心裁剪视图（PIL图片）"""
+        if self.five_crop:
+            resized = F.resize(image, self._base.resize)
+            width, height = resized.size
+            crop = self.crop
+            for box in ((0, 0, crop, crop), (width - crop, 0, width, crop),
+                        (0, height - crop, crop, height), (width - crop, height - crop, width, height)):
+                yield resized.crop(box)
+        for scale in self.scales:
+            yield F.center_crop(F.resize(image, scale), self.crop)
+
+    def refine(self, recognizer, image, center, results, top_k=5, forward=None):
+        """
+        对低置信度图片执行一次增强推理
+        Args:
+            recognizer: 识别器
+            image: 已解码的PIL RGB图片
+            center: 第一次推理使用的输入张量
+            results: 第一次推理的top-k结果
+            top_k: 返回前k个预测结果
+            forward: 执行前向推理的函数 forward(batch, recognizer)，如批量推理引擎的 forward，
+                使增强推理受其线程数限定；为空时在当前线程中直接推理
+        Returns:
+            list: 按所有视图平均概率计算的top-k结果
+        """
+        started = time.perf_counter()
+        views = self.build_views(image, center, fast=getattr(recognizer, 'preprocessor', None) is not None)
+        if forward is not None:
+            probabilities = forward(views, recognizer).mean(dim=0)
+        else:
+            probabilities = recognizer.forward_batch(views).mean(dim=0)
+        refined = recognizer.format_topk(probabilities, top_k)
+        elapsed = (time.perf_counter() - started) * 1000
+        changed = bool(refined) and refined[0]['name'] != results[0]['name']
+        with self._lock:
+            self._counters['augmented'] += 1
+            self._counters['top1_changed'] += int(changed)
+            self._recent.append(elapsed)
+        return refined
+
+    def stats(self):
+        """触发率、top-1改变率及增强带来的额外耗时（毫秒）"""
+        with self._lock:
+            counters = dict(self._counters)
+            recent = sorted(self._recent)
+        requests = counters['requests']
+        augmented = counters['augmented']
+        return {
+            'config': {
+                'margin': self.margin,
+                'flip': self.flip,
+                'five_crop': self.five_crop,
+                'scales': list(self.scales),
+                'views': self.num_views,
+            },
+            **counters,
+            'augmented_rate': augmented / requests if requests else None,
+            'top1_changed_rate': counters['top1_changed'] / augmented if augmented else None,
+            'extra_ms': {
+                'mean': sum(recent) / len(recent) if recent else 0.0,
+                'p50': percentile(recent, 50),
+                'p95': percentile(recent, 95),
+                'p99': percentile(recent, 99),
+            },
+            # 平摊到每个请求的额外耗时
+            'extra_ms_per_request': sum(recent) / len(recent) * augmented / requests if recent and requests else 0.0,
+        }
@@ -0,0 +1,122 @@
+import io
+import functools
+import logging
+
+from django.conf import settings
+from django.core.files.uploadedfile import InMemoryUploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, StopUpload
+from django.http import QueryDict
+from django.utils.datastructures import MultiValueDict
+
+logger = logging.getLogger(__name__)
+
+# 文件头魔数 -> 实际图片类型
+IMAGE_SIGNATURES = (
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+)
+
+# multipart 边界和普通表单字段的余量
+MULTIPART_OVERHEAD = 64 * 1024
+
+
+def sniff_image_type(header):
+    """
+    按文件头判断图片类型
+    Args:
+        header: 文件开头的若干字节
+    Returns:
+        str: image/jpeg 或 image/png，无法识别时返回 None
+    """
+    for signature, content_type in IMAGE_SIGNATURES:
+        if header.startswith(signature):
+            return content_type
+    return None
+
+
+class ImageUploadHandler(FileUploadHandler):
+    """
+    识别接口的上传处理器
+
+    在读取请求体的同时校验：Content-Length 超过上限时不读取请求体直接拒绝；
+    第一个数据块按魔数判断图片类型（不信任客户端的 content_type）；累计大小超过上限时立即停止。
+    图片内容写入内存中的 BytesIO，不产生临时文件，PIL 直接从该缓冲区解码。
+    拒绝原因记录在 request.upload_error 中，由视图返回400。
+    """
+
+    def __init__(self, request=None, max_size=5 * 1024 * 1024, max_files=1):
+        super().__init__(request)
+        self.max_size = max_size
+        self.max_files = max_files
+        self.file_count = 0
+        self.file = None
+        self.sniffed_type = None
+
+    def _reject(self, message):
+        logger.error(f"拒绝上传: {message}")
+        if self.request is not None:
+            self.request.upload_error = message
+        raise StopUpload(connection_reset=False)
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        limit = self.max_size * self.max_files + MULTIPART_OVERHEAD
+        if content_length and content_length > limit:
+            # 不读取请求体，直接返回空的表单数据
+            logger.error(f"请求体过大: {content_length} bytes")
+            if self.request is not None:
+                self.request.upload_error = f'图片大小不能超过{self.max_size // (1024 * 1024)}MB'
+            return QueryDict(encoding=encoding), MultiValueDict()
+        return None
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.file_count += 1
+        if self.file_count > self.max_files:
+            self._reject(f'一次最多上传{self.max_files}张图片')
+        self.file = io.BytesIO()
+        self.sniffed_type = None
+
+    def receive_data_chunk(self, raw_data, start):
+        if start == 0:
+            self.sniffed_type = sniff_image_type(raw_data[:8])
+            if self.sniffed_type is None:
+                self._reject('仅支持JPG/PNG格式图片')
+        if start + len(raw_data) > self.max_size:
+            self._reject(f'图片大小不能超过{self.max_size // (1024 * 1024)}MB')
+        self.file.write(raw_data)
+        return None
+
+    def file_complete(self, file_size):
+        if self.sniffed_type is None:
+            self._reject('仅支持JPG/PNG格式图片')
+        self.file.seek(0)
+        return InMemoryUploadedFile(
+            file=self.file,
+            field_name=self.field_name,
+            name=self.file_name,
+            content_type=self.sniffed_type,
+            size=file_size,
+            charset=self.charset,
+            content_type_extra=self.content_type_extra,
+        )
+
+
+def image_upload(multiple=False):
+    """
+    为识别接口安装 ImageUploadHandler 的视图装饰器，需放在 @api_view 之外，
+    保证在DRF解析请求体之前替换上传处理器
+    Args:
+        multiple: 是否允许一次上传多张图片（上限为 RECOGNITION_MAX_UPLOAD_IMAGES）
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapped(request, *args, **kwargs):
+            max_files = getattr(settings, 'RECOGNITION_MAX_UPLOAD_IMAGES', 10) if multiple else 1
+            request.upload_handlers = [ImageUploadHandler(
+                request,
+                max_size=getattr(settings, 'RECOGNITION_MAX_UPLOAD_SIZE', 5 * 1024 * 1024),
+                max_files=max_files,
+            )]
+            return view(request, *args, **kwargs)
+        return wrapped
+    return decorator
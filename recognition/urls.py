@@ -3,7 +3,25 @@ from . import views
 
 urlpatterns = [
     path('api/upload', views.upload_image, name='upload_image'),
+    path('api/upload-multi', views.upload_images, name='upload_images'),
+    path('api/similar', views.find_similar, name='find_similar'),
     path('api/model-info', views.get_model_info, name='get_model_info'),
+    path('api/ready', views.get_ready, name='get_ready'),
+    path('api/models', views.get_models, name='get_models'),
+    path('api/batch-stats', views.get_batch_stats, name='get_batch_stats'),
+    path('api/cache-stats', views.get_cache_stats, name='get_cache_stats'),
+    path('api/executor-stats', views.get_executor_stats, name='get_executor_stats'),
+    path('api/cascade-stats', views.get_cascade_stats, name='get_cascade_stats'),
+    path('api/tta-stats', views.get_tta_stats, name='get_tta_stats'),
     path('upload', views.upload_image, name='upload_image_mini'),
+    path('upload-multi', views.upload_images, name='upload_images_mini'),
+    path('similar', views.find_similar, name='find_similar_mini'),
     path('model-info', views.get_model_info, name='get_model_info_mini'),
+    path('ready', views.get_ready, name='get_ready_mini'),
+    path('models', views.get_models, name='get_models_mini'),
+    path('batch-stats', views.get_batch_stats, name='get_batch_stats_mini'),
+    path('cache-stats', views.get_cache_stats, name='get_cache_stats_mini'),
+    path('executor-stats', views.get_executor_stats, name='get_executor_stats_mini'),
+    path('cascade-stats', views.get_cascade_stats, name='get_cascade_stats_mini'),
+    path('tta-stats', views.get_tta_stats, name='get_tta_stats_mini'),
 ] 
\ No newline at end of file
@@ -2,12 +2,12 @@ from django.conf import settings
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from rest_framework import status
-import os
 import logging
 import traceback
 import sys
-import torch
-from .model_utils import HerbRecognizer
+from .exceptions import BatchTimeoutError, ExecutorSaturated, ExecutorTimeout
+from .service import service, STATE_FAILED
+from .uploads import image_upload
 
 # 配置日志
 logging.basicConfig(
@@ -17,56 +17,100 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# 初始化模型识别器
-MODEL_PATH = os.path.join(settings.BASE_DIR, 'recognition', 'models', '完整模型_ResNet50模型_epoch_13.pth')
-CLASS_NAMES_PATH = os.path.join(settings.BASE_DIR, 'recognition', 'class_names.json')
-
-logger.debug(f"Model path: {MODEL_PATH}")
-logger.debug(f"Class names path: {CLASS_NAMES_PATH}")
-
-# 检查文件是否存在
-if not os.path.exists(MODEL_PATH):
-    logger.error(f"Model file not found at path: {MODEL_PATH}")
-    logger.error(f"Current working directory: {os.getcwd()}")
-    logger.error(f"Directory contents: {os.listdir(os.path.dirname(MODEL_PATH))}")
-if not os.path.exists(CLASS_NAMES_PATH):
-    logger.error(f"Class names file not found at path: {CLASS_NAMES_PATH}")
-    logger.error(f"Current working directory: {os.getcwd()}")
-    logger.error(f"Directory contents: {os.listdir(os.path.dirname(CLASS_NAMES_PATH))}")
-
-# 尝试加载模型
-try:
-    logger.debug("Attempting to initialize HerbRecognizer")
-    logger.debug(f"Python version: {sys.version}")
-    logger.debug(f"PyTorch version: {torch.__version__}")
-    logger.debug(f"CUDA available: {torch.cuda.is_available()}")
+def _ensure_ready():
+    """
+    确保模型已加载（懒加载模式下首次调用时开始加载）
+    Returns:
+        Response: 模型未就绪时的503响应，就绪时返回 None
+    """
+    if service.wait(getattr(settings, 'RECOGNITION_LOAD_WAIT', 30)):
+        # 检查是否需要切换线上模型或影子模型
+        service.sync()
+        return None
+    if service.state == STATE_FAILED:
+        logger.error("模型未正确加载，无法处理请求")
+        return Response({
+            'success': False,
+            'error': '模型未正确加载，请检查服务器日志'
+        }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+    response = Response({
+        'success': False,
+        'error': '模型加载中，请稍后重试'
+    }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+    response['Retry-After'] = '5'
+    return response
+
+def _busy_response(retry_after=None):
+    """识别服务繁忙时的503响应"""
+    response = Response({
+        'success': False,
+        'error': '识别服务繁忙，请稍后重试'
+    }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+    if retry_after:
+        response['Retry-After'] = str(retry_after)
+    return response
+
+def _with_timing(response, timing):
+    """在响应头中附加本次请求的排队深度、排队等待和执行耗时"""
+    if timing:
+        response['X-Queue-Depth'] = str(timing['queue_depth'])
+        response['X-Queue-Wait-Ms'] = f"{timing.get('queue_wait_ms', 0):.1f}"
+        response['X-Inference-Ms'] = f"{timing.get('exec_ms', 0):.1f}"
+    return response
+
+def _validate_image_file(image_file):
+    """校验上传图片的类型和大小，返回错误信息，校验通过时返回 None"""
+    # 验证文件类型（经 ImageUploadHandler 上传时为按文件头识别的类型）
+    if not image_file.content_type in ['image/jpeg', 'image/png']:
+        logger.error(f"不支持的文件类型: {image_file.content_type}")
+        return '仅支持JPG/PNG格式图片'
+    
+    # 验证文件大小
+    max_size = getattr(settings, 'RECOGNITION_MAX_UPLOAD_SIZE', 5 * 1024 * 1024)
+    if image_file.size > max_size:
+        logger.error(f"文件大小超过限制: {image_file.size} bytes")
+        return f'图片大小不能超过{max_size // (1024 * 1024)}MB'
     
-    recognizer = HerbRecognizer(MODEL_PATH, CLASS_NAMES_PATH)
-    logger.info("模型识别器初始化成功")
-except Exception as e:
-    logger.error(f"模型识别器初始化失败: {str(e)}")
-    logger.error("初始化失败时的完整堆栈跟踪:")
-    logger.error(traceback.format_exc())
-    logger.error(f"Exception type: {type(e)}")
-    logger.error(f"Exception args: {e.args}")
-    recognizer = None
+    return None
+
+def _upload_error_response(request):
+    """上传处理器在读取请求体时拒绝的请求（非JPG/PNG或超过大小限制），返回400响应"""
+    error = getattr(request, 'upload_error', None)
+    if error is None:
+        return None
+    return Response({
+        'success': False,
+        'error': error
+    }, status=status.HTTP_400_BAD_REQUEST)
+
+def _etag_matches(request, etag):
+    """判断请求头 If-None-Match 是否包含当前ETag"""
+    header = request.META.get('HTTP_IF_NONE_MATCH', '')
+    tags = {tag.strip().replace('W/', '', 1) for tag in header.split(',') if tag.strip()}
+    return '*' in tags or etag in tags
 
 @api_view(['GET'])
 def get_model_info(request):
     """获取模型信息"""
     try:
-        if recognizer is None:
-            return Response({
-                'success': False,
-                'error': '模型未正确加载'
-            }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        unavailable = _ensure_ready()
+        if unavailable is not None:
+            return unavailable
         
-        info = HerbRecognizer.get_model_info(MODEL_PATH)
+        info, etag = service.recognizer.model_info()
         if info:
-            return Response({
-                'success': True,
-                'data': info
-            })
+            cache_control = f'public, max-age={getattr(settings, "RECOGNITION_MODEL_INFO_MAX_AGE", 300)}'
+            # 客户端条件请求命中时直接返回304
+            if _etag_matches(request, etag):
+                response = Response(status=status.HTTP_304_NOT_MODIFIED)
+            else:
+                response = Response({
+                    'success': True,
+                    'data': info
+                })
+            response['ETag'] = etag
+            response['Cache-Control'] = cache_control
+            return response
         else:
             return Response({
                 'success': False,
@@ -80,20 +124,21 @@ def get_model_info(request):
             'error': str(e)
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+@image_upload()
 @api_view(['POST'])
 def upload_image(request):
     """处理图片上传和识别请求"""
     try:
         # 检查模型是否正确加载
-        if recognizer is None:
-            logger.error("模型未正确加载，无法处理请求")
-            return Response({
-                'success': False,
-                'error': '模型未正确加载，请检查服务器日志'
-            }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        unavailable = _ensure_ready()
+        if unavailable is not None:
+            return unavailable
         
         # 获取上传的图片
         image_file = request.FILES.get('file')
+        rejected = _upload_error_response(request)
+        if rejected is not None:
+            return rejected
         if not image_file:
             logger.error("未收到图片文件")
             return Response({
@@ -103,25 +148,23 @@ def upload_image(request):
         
         logger.debug(f"收到图片文件: {image_file.name}, 大小: {image_file.size} bytes")
         
-        # 验证文件类型
-        if not image_file.content_type in ['image/jpeg', 'image/png']:
-            logger.error(f"不支持的文件类型: {image_file.content_type}")
+        error = _validate_image_file(image_file)
+        if error:
             return Response({
                 'success': False,
-                'error': '仅支持JPG/PNG格式图片'
-            }, status=status.HTTP_400_BAD_REQUEST)
-        
-        # 验证文件大小（5MB）
-        if image_file.size > 5 * 1024 * 1024:
-            logger.error(f"文件大小超过限制: {image_file.size} bytes")
-            return Response({
-                'success': False,
-                'error': '图片大小不能超过5MB'
+                'error': error
             }, status=status.HTTP_400_BAD_REQUEST)
         
         # 进行预测
         logger.debug("开始进行图片识别")
-        results = recognizer.predict(image_file)
+        try:
+            results, timing = service.run(service.recognize, image_file, batched=True)
+        except ExecutorSaturated as e:
+            logger.warning(f"推理队列已满，拒绝请求: {str(e)}")
+            return _busy_response(e.retry_after)
+        except (BatchTimeoutError, ExecutorTimeout) as e:
+            logger.error(f"识别超时: {str(e)}")
+            return _busy_response()
         if results is None:
             logger.error("识别过程返回空结果")
             return Response({
@@ -130,10 +173,10 @@ def upload_image(request):
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
         
         logger.debug(f"识别成功，返回 {len(results)} 个结果")
-        return Response({
+        return _with_timing(Response({
             'success': True,
             'results': results
-        })
+        }), timing)
         
     except Exception as e:
         logger.error(f"处理图片上传时出错: {str(e)}")
@@ -142,4 +185,238 @@ def upload_image(request):
         return Response({
             'success': False,
             'error': f'服务器内部错误: {str(e)}'
-        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR) 
\ No newline at end of file
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR) 
+
+@image_upload(multiple=True)
+@api_view(['POST'])
+def upload_images(request):
+    """处理多图上传请求，返回每张图片的识别结果及按平均概率汇总的结果"""
+    try:
+        unavailable = _ensure_ready()
+        if unavailable is not None:
+            return unavailable
+        
+        image_files = request.FILES.getlist('file')
+        rejected = _upload_error_response(request)
+        if rejected is not None:
+            return rejected
+        if not image_files:
+            logger.error("未收到图片文件")
+            return Response({
+                'success': False,
+                'error': '未收到图片文件'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        max_images = getattr(settings, 'RECOGNITION_MAX_UPLOAD_IMAGES', 10)
+        if len(image_files) > max_images:
+            logger.error(f"图片数量超过限制: {len(image_files)}")
+            return Response({
+                'success': False,
+                'error': f'一次最多上传{max_images}张图片'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        logger.debug(f"收到 {len(image_files)} 张图片: {[f.name for f in image_files]}")
+        
+        for image_file in image_files:
+            error = _validate_image_file(image_file)
+            if error:
+                return Response({
+                    'success': False,
+                    'error': f'{image_file.name}: {error}'
+                }, status=status.HTTP_400_BAD_REQUEST)
+        
+        logger.debug("开始进行多图识别")
+        try:
+            prediction, timing = service.run(service.recognizer.predict_batch, image_files)
+        except ExecutorSaturated as e:
+            logger.warning(f"推理队列已满，拒绝请求: {str(e)}")
+            return _busy_response(e.retry_after)
+        except ExecutorTimeout as e:
+            logger.error(f"识别超时: {str(e)}")
+            return _busy_response()
+        if prediction['consensus'] is None:
+            logger.error("所有图片均识别失败")
+            return Response({
+                'success': False,
+                'error': '识别过程出错'
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        
+        return _with_timing(Response({
+            'success': True,
+            'results': [
+                {
+                    'file': image_file.name,
+                    'success': results is not None,
+                    'results': results if results is not None else []
+                }
+                for image_file, results in zip(image_files, prediction['results'])
+            ],
+            'consensus': prediction['consensus']
+        }), timing)
+        
+    except Exception as e:
+        logger.error(f"处理多图上传时出错: {str(e)}")
+        logger.error("错误堆栈跟踪:")
+        logger.error(traceback.format_exc())
+        return Response({
+            'success': False,
+            'error': f'服务器内部错误: {str(e)}'
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+@image_upload()
+@api_view(['POST'])
+def find_similar(request):
+    """检索与上传图片最相似的参考图库图片，返回药材名称、图片路径和余弦距离"""
+    try:
+        unavailable = _ensure_ready()
+        if unavailable is not None:
+            return unavailable
+        
+        image_file = request.FILES.get('file')
+        rejected = _upload_error_response(request)
+        if rejected is not None:
+            return rejected
+        if not image_file:
+            logger.error("未收到图片文件")
+            return Response({
+                'success': False,
+                'error': '未收到图片文件'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        error = _validate_image_file(image_file)
+        if error:
+            return Response({
+                'success': False,
+                'error': error
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        max_k = getattr(settings, 'RECOGNITION_SIMILAR_MAX_K', 50)
+        try:
+            k = int(request.data.get('k', 10))
+        except (TypeError, ValueError):
+            k = 10
+        k = max(1, min(k, max_k))
+        
+        if service.recognizer.model is None:
+            return Response({
+                'success': False,
+                'error': '当前推理后端不支持特征提取，请使用eager后端'
+            }, status=status.HTTP_501_NOT_IMPLEMENTED)
+        
+        try:
+            results, timing = service.run(service.similar, image_file, k)
+        except ExecutorSaturated as e:
+            logger.warning(f"推理队列已满，拒绝请求: {str(e)}")
+            return _busy_response(e.retry_after)
+        except ExecutorTimeout as e:
+            logger.error(f"检索超时: {str(e)}")
+            return _busy_response()
+        if results is None:
+            return Response({
+                'success': False,
+                'error': '相似图片检索索引未生成'
+            }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        
+        return _with_timing(Response({
+            'success': True,
+            'results': results
+        }), timing)
+        
+    except Exception as e:
+        logger.error(f"相似图片检索时出错: {str(e)}")
+        logger.error("错误堆栈跟踪:")
+        logger.error(traceback.format_exc())
+        return Response({
+            'success': False,
+            'error': f'服务器内部错误: {str(e)}'
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+@api_view(['GET'])
+def get_batch_stats(request):
+    """获取批量推理统计信息"""
+    if service.batch_engine is None:
+        return Response({
+            'success': False,
+            'error': '批量推理未启用'
+        }, status=status.HTTP_404_NOT_FOUND)
+    return Response({
+        'success': True,
+        'data': service.batch_engine.stats()
+    })
+
+@api_view(['GET'])
+def get_cache_stats(request):
+    """获取识别结果缓存的命中统计"""
+    if service.prediction_cache is None:
+        return Response({
+            'success': False,
+            'error': '识别结果缓存未启用'
+        }, status=status.HTTP_404_NOT_FOUND)
+    return Response({
+        'success': True,
+        'data': service.prediction_cache.stats()
+    })
+
+@api_view(['GET'])
+def get_executor_stats(request):
+    """获取推理线程池的队列深度、等待时间和执行时间统计"""
+    if service.inference_executor is None:
+        return Response({
+            'success': False,
+            'error': '推理线程池未启用'
+        }, status=status.HTTP_404_NOT_FOUND)
+    return Response({
+        'success': True,
+        'data': service.inference_executor.stats()
+    })
+
+@api_view(['GET'])
+def get_cascade_stats(request):
+    """获取级联推理的升级率及相对完整模型节省的耗时"""
+    stats = service.cascade_stats()
+    if stats is None:
+        return Response({
+            'success': False,
+            'error': '级联推理未启用'
+        }, status=status.HTTP_404_NOT_FOUND)
+    return Response({
+        'success': True,
+        'data': stats
+    })
+
+@api_view(['GET'])
+def get_tta_stats(request):
+    """获取测试时增强的触发率、top-1改变率及额外耗时"""
+    if service.tta is None:
+        return Response({
+            'success': False,
+            'error': '测试时增强未启用'
+        }, status=status.HTTP_404_NOT_FOUND)
+    return Response({
+        'success': True,
+        'data': service.tta.stats()
+    })
+
+@api_view(['GET'])
+def get_ready(request):
+    """模型就绪状态：loading / ready / failed，未就绪时返回503"""
+    # 懒加载模式下，就绪检查也会触发加载
+    service.start()
+    return Response(
+        {'success': service.ready, 'data': service.status()},
+        status=status.HTTP_200_OK if service.ready else status.HTTP_503_SERVICE_UNAVAILABLE
+    )
+
+@api_view(['GET'])
+def get_models(request):
+    """获取已配置的模型版本、线上模型及影子评估统计"""
+    if service.registry is None:
+        return Response({
+            'success': False,
+            'error': '模型未加载'
+        }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+    service.sync()
+    return Response({
+        'success': True,
+        'data': service.registry.status()
+    })